@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from django.conf import settings
+from .sources import open_fixture, write_fixture_batch
+
+SUFFIX = '.jsonl.gz'
+PARTIAL_SUFFIX = '.part'
+# A full run holds the whole catalog; partial runs (incremental syncs, resumes, shards) only what they fetched
+FULL, PARTIAL = 'full', 'partial'
+
+def archive_dir(game):
+    return Path(settings.INGESTION_ARCHIVE_DIR) / game
+
+def archive_path(game, kind=FULL):
+    """
+    A new archive file for one run of `game`. Names sort in the order the runs started.
+    """
+    started = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    return archive_dir(game) / f'{started}-{kind}-{uuid.uuid4().hex[:8]}{SUFFIX}'
+
+class RunArchive:
+    """
+    The raw upstream batches of one sync run, saved as gzip JSON lines in the format
+    FixtureSource replays (one {"data": records} line per batch). Use it as a context manager
+    and pass every source of the run through record(). The file is written under a .part name
+    and only renamed when the run exits cleanly, so a failed run never leaves a replayable archive.
+    """
+
+    def __init__(self, game, kind=FULL, enabled=True):
+        self.enabled = enabled and getattr(settings, 'INGESTION_ARCHIVE_DIR', None) is not None
+        self.path = archive_path(game, kind) if self.enabled else None
+        self.file = None
+
+    @property
+    def partial_path(self):
+        return self.path.with_name(self.path.name + PARTIAL_SUFFIX)
+
+    def record(self, source):
+        return self.write(source) if self.enabled else source
+
+    def write(self, source):
+        for batch in source:
+            if self.file is None:
+                self.file = open_fixture(self.partial_path)
+            write_fixture_batch(self.file, batch)
+            yield batch
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        if exc_type is None:
+            self.partial_path.rename(self.path)
+
+def archive_runs(game):
+    """
+    The archives needed to rebuild `game`, oldest first: the latest full run and every
+    partial run after it, or every partial run when no full run was archived yet.
+    """
+    runs = sorted(archive_dir(game).glob(f'*{SUFFIX}'))
+    full_runs = [index for index, path in enumerate(runs) if f'-{FULL}-' in path.name]
+    return runs[full_runs[-1]:] if full_runs else runs
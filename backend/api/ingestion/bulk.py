@@ -0,0 +1,12 @@
+def replace_links(relation, source_ids, links):
+    """
+    Replace the M2M rows of `relation` for the given source objects with `links` ((source_id, target_id) pairs).
+    """
+    through = relation.through
+    source_column = relation.field.m2m_column_name()
+    target_column = relation.field.m2m_reverse_name()
+    through.objects.filter(**{f'{source_column}__in': source_ids}).delete()
+    through.objects.bulk_create(
+        [through(**{source_column: source_id, target_column: target_id}) for source_id, target_id in links],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,36 @@
+from django.utils import timezone
+from ..models import IngestionCheckpoint
+
+def start_checkpoint(source, run, resume=False):
+    """
+    Return the checkpoint for a sync of `source`.
+    With resume=True an unfinished checkpoint is reused when it was started for the same
+    `run` parameters (e.g. page size or bulk file); otherwise a fresh one replaces it.
+    """
+    if resume:
+        checkpoint = IngestionCheckpoint.objects.filter(source=source, completed_at__isnull=True).first()
+        if checkpoint and checkpoint.cursor.get('run') == run:
+            return checkpoint
+
+    checkpoint, _ = IngestionCheckpoint.objects.update_or_create(
+        source=source,
+        defaults={
+            'cursor': {'run': run},
+            'batch_id': 0,
+            'started_at': timezone.now(),
+            'completed_at': None,
+        }
+    )
+    return checkpoint
+
+def advance_checkpoint(checkpoint, **progress):
+    """
+    Record a committed batch. Call inside the batch's transaction so the two commit together.
+    """
+    checkpoint.cursor = {**checkpoint.cursor, **progress}
+    checkpoint.batch_id += 1
+    checkpoint.save(update_fields=['cursor', 'batch_id', 'updated_at'])
+
+def complete_checkpoint(checkpoint):
+    checkpoint.completed_at = timezone.now()
+    checkpoint.save(update_fields=['completed_at', 'updated_at'])
@@ -0,0 +1,198 @@
+import contextvars
+import datetime
+import io
+import json
+from contextlib import contextmanager
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection
+from .hashing import rewrite_unchanged
+
+# Staging tables number their rows in COPY order, so a key staged twice resolves to its last row
+SEQUENCE_COLUMN = 'staging_seq'
+
+# Live table name -> table the COPY loaders should write instead (see ShadowCatalog)
+table_overrides = contextvars.ContextVar('table_overrides', default={})
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+def table_name(model):
+    return table_overrides.get().get(model._meta.db_table, model._meta.db_table)
+
+@contextmanager
+def redirect_tables(mapping):
+    """
+    Make StagingTable merges (and table_name) target other tables, e.g. shadow copies.
+    """
+    token = table_overrides.set({**table_overrides.get(), **mapping})
+    try:
+        yield
+    finally:
+        table_overrides.reset(token)
+
+def escape(text):
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def array_literal(values):
+    items = []
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        else:
+            items.append('"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"')
+    return '{' + ','.join(items) + '}'
+
+def copy_value(field, value):
+    """
+    Render one value in COPY text format.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(field, ArrayField):
+        text = array_literal(value)
+    elif field.get_internal_type() == 'JSONField':
+        text = json.dumps(value)
+    elif isinstance(value, bool):
+        text = 't' if value else 'f'
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return escape(text)
+
+class LineStream(io.RawIOBase):
+    """
+    Readable byte stream over an iterator of text lines, so COPY consumes rows as they are built.
+    """
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line.encode('utf-8')
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def copy_lines(cursor, table, columns, lines):
+    sql = f"COPY {quote(table)} ({', '.join(quote(column) for column in columns)}) FROM STDIN"
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, LineStream(lines))
+    else:
+        # psycopg 3
+        with raw.copy(sql) as copy:
+            for line in lines:
+                copy.write(line)
+
+class StagingTable:
+    """
+    A temporary table holding some columns of `model`'s table, filled with COPY ... FROM STDIN
+    and merged into the real table with one set-based statement. Temporary tables belong to
+    the session, so concurrent loads of the same table never see each other's rows, and a
+    crashed load leaves nothing behind. They are kept across transactions until dropped.
+
+    `extra` adds (name, SQL type) columns that only exist in the staging table; their values
+    are read from instance attributes of the same name. Every staged row also gets a
+    SEQUENCE_COLUMN numbering it in the order it was copied.
+    """
+
+    def __init__(self, model, fields, extra=()):
+        self.model = model
+        self.target = table_name(model)
+        self.name = f'staging_{model._meta.db_table}'
+        self.fields = [model._meta.get_field(name) for name in fields]
+        self.columns = [field.column for field in self.fields]
+        self.extra = list(extra)
+        self.rows = 0
+
+    def create(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS pg_temp.{quote(self.name)}')
+        cursor.execute(
+            f"CREATE TEMP TABLE {quote(self.name)} AS "
+            f"SELECT {', '.join(quote(column) for column in self.columns)} FROM {quote(self.target)} WITH NO DATA"
+        )
+        for column, kind in [*self.extra, (SEQUENCE_COLUMN, 'bigint GENERATED ALWAYS AS IDENTITY')]:
+            cursor.execute(f'ALTER TABLE {quote(self.name)} ADD COLUMN {quote(column)} {kind}')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS pg_temp.{quote(self.name)}')
+
+    def copy(self, cursor, instances):
+        def lines():
+            for instance in instances:
+                values = [copy_value(field, field.value_from_object(instance)) for field in self.fields]
+                values += ['\\N' if getattr(instance, column) is None else escape(str(getattr(instance, column))) for column, _ in self.extra]
+                self.rows += 1
+                yield '\t'.join(values) + '\n'
+
+        copy_lines(cursor, self.name, self.columns + [column for column, _ in self.extra], lines())
+
+    def discard_unchanged(self, cursor, key='id'):
+        """
+        Drop staged rows whose content_hash matches the stored row; returns how many were dropped.
+        Nothing is dropped inside hashing.rewriting().
+        """
+        if rewrite_unchanged.get():
+            return 0
+        cursor.execute(
+            f"DELETE FROM {quote(self.name)} AS staged USING {quote(self.target)} AS stored "
+            f"WHERE stored.{quote(key)} = staged.{quote(key)} AND stored.content_hash = staged.content_hash"
+        )
+        return cursor.rowcount
+
+    def upsert(self, cursor, unique_fields, update_fields, columns=None, select=None):
+        """
+        INSERT ... SELECT ... ON CONFLICT DO UPDATE from the staging table, keeping the last
+        staged row per key. `columns`/`select` override the target columns and the SELECT list
+        (e.g. to resolve foreign keys with joins); the staging table is aliased `staged`, and a
+        custom SELECT must also return staged.staging_seq. Returns (inserted, updated).
+        """
+        opts = self.model._meta
+        columns = columns or self.columns
+        unique = ', '.join(quote(opts.get_field(name).column) for name in unique_fields)
+        staged_unique = ', '.join(f'staged.{quote(opts.get_field(name).column)}' for name in unique_fields)
+        updates = ', '.join(
+            f'{quote(column)} = EXCLUDED.{quote(column)}'
+            for column in (opts.get_field(name).column for name in update_fields)
+        )
+        select = select or (
+            f"SELECT {', '.join(f'staged.{quote(column)}' for column in [*columns, SEQUENCE_COLUMN])} "
+            f"FROM {quote(self.name)} AS staged"
+        )
+        cursor.execute(f"""
+            WITH merged AS (
+                INSERT INTO {quote(self.target)} ({', '.join(quote(column) for column in columns)})
+                SELECT {', '.join(f'latest.{quote(column)}' for column in columns)}
+                FROM (
+                    SELECT DISTINCT ON ({unique}) * FROM ({select}) AS staged
+                    ORDER BY {staged_unique}, staged.{SEQUENCE_COLUMN} DESC
+                ) AS latest
+                ON CONFLICT ({unique}) DO UPDATE SET {updates}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged
+        """)
+        return cursor.fetchone()
+
+    def replace_children(self, cursor, parent_field, parents):
+        """
+        Replace the stored rows belonging to the parents staged in `parents` with the staged rows.
+        """
+        parent_column = quote(self.model._meta.get_field(parent_field).column)
+        parent_ids = f'SELECT {quote(parents.columns[0])} FROM {quote(parents.name)}'
+        columns = ', '.join(quote(column) for column in self.columns)
+        cursor.execute(f'DELETE FROM {quote(self.target)} WHERE {parent_column} IN ({parent_ids})')
+        cursor.execute(
+            f'INSERT INTO {quote(self.target)} ({columns}) SELECT {columns} FROM {quote(self.name)} '
+            f'WHERE {parent_column} IN ({parent_ids}) ON CONFLICT DO NOTHING'
+        )
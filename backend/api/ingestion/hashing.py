@@ -0,0 +1,81 @@
+import contextvars
+import hashlib
+import json
+from contextlib import contextmanager
+from .stats import WriteStats
+
+# Set while records must be written even when their hash matches the stored one (see rewriting)
+rewrite_unchanged = contextvars.ContextVar('rewrite_unchanged', default=False)
+
+@contextmanager
+def rewriting():
+    """
+    Write every record inside the block, as if its stored hash were stale: a rebuild after a
+    transform fix must rewrite rows whose upstream payload did not change.
+    """
+    token = rewrite_unchanged.set(True)
+    try:
+        yield
+    finally:
+        rewrite_unchanged.reset(token)
+
+def content_hash(record):
+    """
+    Stable SHA-256 of an upstream record: keys are sorted and separators fixed, so the
+    same payload always hashes the same regardless of key order or whitespace.
+    """
+    payload = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def with_content_hash(instance, record):
+    instance.content_hash = content_hash(record)
+    return instance
+
+def stored_hashes(model, keys, key_field='pk'):
+    """
+    Return key -> stored content_hash for the rows of `model` matching `keys`, in one query.
+    `key_field` may be a tuple of fields for natural keys; the keys are then tuples too.
+    """
+    if not keys:
+        return {}
+    if isinstance(key_field, str):
+        return dict(model.objects.filter(**{f'{key_field}__in': keys}).values_list(key_field, 'content_hash'))
+
+    # Filter on each column separately and drop the cross-product rows that aren't requested
+    filters = {f'{field}__in': {key[index] for key in keys} for index, field in enumerate(key_field)}
+    wanted = set(keys)
+    return {
+        tuple(row[:-1]): row[-1]
+        for row in model.objects.filter(**filters).values_list(*key_field, 'content_hash')
+        if tuple(row[:-1]) in wanted
+    }
+
+def split_unchanged(model, records, key, key_field='pk'):
+    """
+    Compare a batch of upstream records with the stored hashes in one query.
+    Returns (pending, hashes, stats): `pending` maps key -> record for the new and
+    changed records only, `hashes` maps every key to its new hash, and `stats`
+    counts inserted/changed/unchanged records. Later duplicates of a key are dropped.
+    Inside rewriting(), records with a matching hash are pending too and count as changed.
+    """
+    hashes = {}
+    records_by_key = {}
+    for record in records:
+        record_key = key(record)
+        if record_key not in records_by_key:
+            records_by_key[record_key] = record
+            hashes[record_key] = content_hash(record)
+
+    stored = stored_hashes(model, list(records_by_key.keys()), key_field)
+    stats = WriteStats()
+    pending = {}
+    for record_key, record in records_by_key.items():
+        if record_key not in stored:
+            stats.inserted += 1
+        elif stored[record_key] != hashes[record_key] or rewrite_unchanged.get():
+            stats.changed += 1
+        else:
+            stats.unchanged += 1
+            continue
+        pending[record_key] = record
+    return pending, hashes, stats
@@ -0,0 +1,212 @@
+from datetime import timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from .copy import SEQUENCE_COLUMN, copy_lines, escape
+from .prices import CENT, YUGIOH_PRICE_COLUMNS, to_decimal
+
+TABLE = 'api_pricehistory'
+MARKET = 'market'
+# numeric(12, 2) holds prices below this
+MAX_PRICE = 10 ** 10
+
+def pokemon_sources(card_data):
+    """
+    The TCGPlayer market price of each printing and the Cardmarket trend and average sell prices.
+    """
+    sources = []
+    for variant, prices in ((card_data.get('tcgplayer') or {}).get('prices') or {}).items():
+        if isinstance(prices, dict):
+            sources.append((f'tcgplayer.{variant}', prices.get('market') or prices.get('mid')))
+    cardmarket_prices = (card_data.get('cardmarket') or {}).get('prices') or {}
+    sources.append(('cardmarket.trend', cardmarket_prices.get('trendPrice')))
+    sources.append(('cardmarket.average', cardmarket_prices.get('averageSellPrice')))
+    return sources
+
+def yugioh_sources(card_data):
+    # ygoprodeck sends a one-element card_prices list; only the first entry is kept, as in CardPrice
+    price_info = (card_data.get('card_prices') or [{}])[0]
+    return [(column.removesuffix('_price'), price_info.get(column)) for column in YUGIOH_PRICE_COLUMNS]
+
+def mtg_sources(card_data):
+    return list((card_data.get('prices') or {}).items())
+
+# The upstream prices kept per game, next to the stored market price. lorcana-api has no prices.
+GAME_SOURCES = {
+    'pokemon': pokemon_sources,
+    'yugioh': yugioh_sources,
+    'mtg': mtg_sources,
+}
+
+def history_rows(game, cards, cards_data, day):
+    """
+    One (game, card_id, source, day, price) row per positive price of each card: the card's
+    market_price and every upstream price of its record (`cards` and `cards_data` in the same order).
+    """
+    rows = {}
+    for card, card_data in zip(cards, cards_data):
+        for source, value in [(MARKET, card.market_price), *GAME_SOURCES[game](card_data)]:
+            price = to_decimal(value)
+            if price is not None and price.is_finite() and 0 < price < MAX_PRICE:
+                rows[(str(card.pk), source)] = (game, str(card.pk), source, day, price.quantize(CENT))
+    return list(rows.values())
+
+def month_start(day):
+    return day.replace(day=1)
+
+def next_month(day):
+    return (month_start(day) + timedelta(days=32)).replace(day=1)
+
+def partition_name(day):
+    return f'{TABLE}_p{day:%Y%m}'
+
+# Months whose partition is known to exist, so the write path checks the catalog only once per process
+known_partitions = set()
+
+def ensure_partitions(cursor, days):
+    """
+    Create the monthly partitions holding `days` if they don't exist yet. Partitions are created
+    ahead of time (see create_upcoming_partitions), so this only finds them in pg_class; the
+    advisory lock that keeps concurrent workers from racing on the same CREATE is only taken
+    when one is missing. Months are remembered once their partition is committed.
+    """
+    months = {month_start(day) for day in days} - known_partitions
+    if not months:
+        return
+    names = {partition_name(month): month for month in months}
+    cursor.execute('SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NULL', [list(names)])
+    missing = sorted(names[name] for name, in cursor.fetchall())
+    if missing:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [TABLE])
+        for month in missing:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, next_month(month)],
+            )
+    transaction.on_commit(lambda: known_partitions.update(months))
+
+def create_upcoming_partitions(months_ahead=2):
+    """
+    Create the partitions of the current month and the next `months_ahead` months, so the
+    writers never have to.
+    """
+    month = month_start(timezone.localdate())
+    months = [month]
+    for _ in range(months_ahead):
+        months.append(next_month(months[-1]))
+    with transaction.atomic(), connection.cursor() as cursor:
+        ensure_partitions(cursor, months)
+    return months
+
+def record_price_history(game, cards, cards_data, day=None, batch_size=1000):
+    """
+    Append today's prices of freshly written cards to the price history with multi-row inserts.
+    The batch writers only call this for new and changed cards, so a price that doesn't move adds
+    no rows: a series holds a point per day the card's prices were written and carries forward
+    between them (COPY loads, meant for cold starts, record every card they stage through
+    StagedPriceHistory). A card written twice on the same day keeps the later price. Returns the
+    number of rows written.
+    """
+    if game not in GAME_SOURCES:
+        return 0
+    day = day or timezone.localdate()
+    rows = history_rows(game, cards, cards_data, day)
+    if not rows:
+        return 0
+
+    placeholders = '(%s, %s, %s, %s, %s)'
+    with connection.cursor() as cursor:
+        ensure_partitions(cursor, [day])
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {TABLE} (game, card_id, source, day, price) VALUES {', '.join([placeholders] * len(chunk))} "
+                f"ON CONFLICT (game, card_id, source, day) DO UPDATE SET price = EXCLUDED.price "
+                f"WHERE {TABLE}.price IS DISTINCT FROM EXCLUDED.price",
+                [value for row in chunk for value in row],
+            )
+    return len(rows)
+
+class StagedPriceHistory:
+    """
+    The price history of a COPY load: each batch's rows are copied into a temporary table next to
+    the loader's staging tables, and merge() writes them with one INSERT ... SELECT. Call merge()
+    in the loader's merge transaction, so history only lands for prices that were stored.
+    """
+
+    name = 'staging_api_pricehistory'
+    columns = ['game', 'card_id', 'source', 'day', 'price']
+
+    def __init__(self, game, day=None):
+        self.game = game
+        self.day = day or timezone.localdate()
+
+    def create(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS pg_temp.{self.name}')
+        cursor.execute(f"CREATE TEMP TABLE {self.name} AS SELECT {', '.join(self.columns)} FROM {TABLE} WITH NO DATA")
+        cursor.execute(f'ALTER TABLE {self.name} ADD COLUMN {SEQUENCE_COLUMN} bigint GENERATED ALWAYS AS IDENTITY')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS pg_temp.{self.name}')
+
+    def copy(self, cursor, cards, cards_data):
+        rows = history_rows(self.game, cards, cards_data, self.day)
+        copy_lines(cursor, self.name, self.columns, ('\t'.join(escape(str(value)) for value in row) + '\n' for row in rows))
+
+    def merge(self, cursor):
+        """
+        Write the staged rows to the history; a card staged more than once keeps its last staged
+        price, as the card upsert does. Returns the number of rows written.
+        """
+        columns = ', '.join(self.columns)
+        ensure_partitions(cursor, [self.day])
+        cursor.execute(
+            f"INSERT INTO {TABLE} ({columns}) "
+            f"SELECT DISTINCT ON (game, card_id, source, day) {columns} FROM {self.name} "
+            f"ORDER BY game, card_id, source, day, {SEQUENCE_COLUMN} DESC "
+            f"ON CONFLICT (game, card_id, source, day) DO UPDATE SET price = EXCLUDED.price "
+            f"WHERE {TABLE}.price IS DISTINCT FROM EXCLUDED.price"
+        )
+        return cursor.rowcount
+
+def price_series(game, card_id, start, end, points, sources=None):
+    """
+    The price history of one card between `start` and `end` (inclusive dates), downsampled in the
+    database to at most `points` buckets per source. Each bucket spans `interval` days and reports
+    the average, low and high of the prices recorded in it; buckets without a recorded price are
+    left out, since the price didn't move. The last price before `start` opens each series, so a
+    card whose price was stable over the whole range still has a point. Only the partitions
+    covering the range are scanned.
+
+    Returns (interval, {source: [(bucket_start, price, low, high)]}).
+    """
+    interval = max(1, -(-((end - start).days + 1) // points))
+    source_filter = 'AND source = ANY(%(sources)s)' if sources else ''
+    params = {'game': game, 'card_id': str(card_id), 'start': start, 'end': end, 'interval': interval, 'sources': sources}
+    series = {}
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT DISTINCT ON (source) source, price
+            FROM {TABLE}
+            WHERE game = %(game)s AND card_id = %(card_id)s AND day < %(start)s {source_filter}
+            ORDER BY source, day DESC
+        """, params)
+        opening = dict(cursor.fetchall())
+
+        cursor.execute(f"""
+            SELECT source,
+                   %(start)s::date + (day - %(start)s::date) / %(interval)s * %(interval)s AS bucket,
+                   round(avg(price), 2), min(price), max(price)
+            FROM {TABLE}
+            WHERE game = %(game)s AND card_id = %(card_id)s AND day BETWEEN %(start)s AND %(end)s {source_filter}
+            GROUP BY source, bucket
+            ORDER BY source, bucket
+        """, params)
+        for source, bucket, price, low, high in cursor.fetchall():
+            series.setdefault(source, []).append((bucket, price, low, high))
+
+    for source, price in opening.items():
+        points_of_source = series.setdefault(source, [])
+        if not points_of_source or points_of_source[0][0] != start:
+            points_of_source.insert(0, (start, price, price, price))
+    return interval, dict(sorted(series.items()))
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Chunk size used to drain the rest of a cached body
+READ_SIZE = 1024 * 1024
+
+def http_cache_dir():
+    return Path(settings.INGESTION_CACHE_DIR) / 'http'
+
+def build_session(headers=None, pool_size=10, retries=5, backoff_factor=1.0, cache_dir=None):
+    """
+    Create a keep-alive session whose connection pool fits `pool_size` concurrent requests.
+    Failed requests are retried with exponential backoff, honouring Retry-After on 429/503.
+    With `cache_dir`, GET responses go through an on-disk conditional-request cache (see HttpCache).
+    """
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+    )
+    if cache_dir:
+        session.http_cache = HttpCache(cache_dir)
+        adapter = CachingAdapter(session.http_cache, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class HttpCache:
+    """
+    On-disk store of upstream GET bodies with their ETag/Last-Modified validators, one body
+    and one metadata file per URL. An entry is marked ingested once its body has been
+    committed to the database, so a 304 only short-circuits work that actually landed.
+    Bodies are written while the caller streams them (see CachingStream), never held in memory.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.lock = threading.Lock()
+
+    def key(self, url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def paths(self, key):
+        return self.directory / f'{key}.body', self.directory / f'{key}.json'
+
+    def partial_path(self, key):
+        return self.directory / f'{key}.body.part'
+
+    def load(self, key):
+        body_path, meta_path = self.paths(key)
+        if not (body_path.exists() and meta_path.exists()):
+            return None
+        return json.loads(meta_path.read_text())
+
+    def open_body(self, key):
+        return self.paths(key)[0].open('rb')
+
+    def open_partial(self, key):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return self.partial_path(key).open('wb')
+
+    def store(self, key, url, headers):
+        """
+        Commit the body written to the partial file of `key` together with its validators.
+        """
+        body_path, meta_path = self.paths(key)
+        os.replace(self.partial_path(key), body_path)
+        meta = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'content_type': headers.get('Content-Type'),
+            'ingested': False,
+        }
+        meta_path.write_text(json.dumps(meta))
+
+    def discard_partial(self, key):
+        self.partial_path(key).unlink(missing_ok=True)
+
+    def mark_ingested(self, key):
+        with self.lock:
+            meta = self.load(key)
+            if meta is not None and not meta['ingested']:
+                meta['ingested'] = True
+                self.paths(key)[1].write_text(json.dumps(meta))
+
+class CachingStream:
+    """
+    Stands in for a 200 response's raw stream: every decoded chunk the caller reads is also
+    written to the cache's partial file, and the entry is stored once the body has been read to
+    the end. A response closed before that leaves no entry. Reading through it keeps streaming
+    callers at constant memory.
+    """
+
+    def __init__(self, raw, cache, key, url, headers):
+        self.raw = raw
+        self.cache = cache
+        self.key = key
+        self.url = url
+        self.headers = headers
+        self.file = cache.open_partial(key)
+        self.stored = False
+
+    def read(self, size=-1, **kwargs):
+        if self.stored:
+            return b''
+        if hasattr(self.raw, 'stream'):
+            # urllib3: cache and hand out the decoded body, as requests itself would
+            data = self.raw.read(None if size is None or size < 0 else size, decode_content=True)
+        else:
+            data = self.raw.read(size)
+        if data:
+            self.file.write(data)
+        elif size != 0:
+            self.file.close()
+            self.cache.store(self.key, self.url, self.headers)
+            self.stored = True
+        return data
+
+    def finish(self):
+        """
+        Read whatever the caller left unread (e.g. the closing brace after a streamed array), so
+        the entry is stored.
+        """
+        while not self.stored:
+            self.read(READ_SIZE)
+
+    def close(self):
+        if not self.stored and not self.file.closed:
+            self.file.close()
+            self.cache.discard_partial(self.key)
+        self.raw.close()
+
+    def release_conn(self):
+        release_conn = getattr(self.raw, 'release_conn', None)
+        if release_conn is not None:
+            release_conn()
+
+class CachedBody:
+    """
+    A cached body served as a 304's raw stream. The file is closed once it has been read to the
+    end, or when the response is closed, since requests leaves a consumed body's stream open.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def read(self, size=-1, **kwargs):
+        if self.file.closed:
+            return b''
+        data = self.file.read(-1 if size is None else size)
+        if not data and size != 0:
+            self.file.close()
+        return data
+
+    def close(self):
+        self.file.close()
+
+    def release_conn(self):
+        self.close()
+
+class CachingAdapter(HTTPAdapter):
+    """
+    Send If-None-Match/If-Modified-Since for cached URLs and answer a 304 with the cached body.
+
+    Every response gets `cache_key` and `unchanged`; `unchanged` is True only when upstream
+    answered 304 and the cached body was already ingested, which lets callers skip the work.
+    """
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        key = self.cache.key(request.url)
+        meta = self.cache.load(key)
+        if meta:
+            if meta['etag']:
+                request.headers['If-None-Match'] = meta['etag']
+            if meta['last_modified']:
+                request.headers['If-Modified-Since'] = meta['last_modified']
+
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and meta:
+            response = self.cached_response(request, response, key, meta)
+        elif response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            response.raw = CachingStream(response.raw, self.cache, key, request.url, response.headers)
+            response.unchanged = False
+        else:
+            response.unchanged = False
+        response.cache_key = key
+        return response
+
+    def cached_response(self, request, not_modified, key, meta):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK (not modified)'
+        response.url = request.url
+        response.request = request
+        response.headers['Content-Type'] = meta.get('content_type') or 'application/json'
+        response.raw = CachedBody(self.cache.open_body(key))
+        response.encoding = not_modified.encoding or 'utf-8'
+        response.unchanged = meta['ingested']
+        not_modified.close()
+        return response
+
+def is_unchanged(response):
+    return getattr(response, 'unchanged', False) is True
+
+def mark_ingested(session, response):
+    """
+    Record that `response`'s body is now in the database, so the next 304 can skip it.
+    """
+    cache = getattr(session, 'http_cache', None)
+    key = getattr(response, 'cache_key', None)
+    if cache is not None and isinstance(key, str):
+        if isinstance(response.raw, CachingStream):
+            response.raw.finish()
+        cache.mark_ingested(key)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class PageFetchError(Exception):
+    pass
+
+class ConcurrentPageFetcher:
+    """
+    Fetch every page of a paged JSON API concurrently.
+
+    The first page is fetched on the calling thread to read `totalCount`; the remaining pages are
+    planned up front and fetched by a bounded thread pool, rate limited by a shared token bucket.
+    Results are handed back through a bounded queue, so at most `queue_size` pages wait in memory
+    and the workers pause while the consumer (usually the database writer) catches up.
+    """
+
+    def __init__(self, session, url, params=None, page_size=250, workers=4, rate=4.0, queue_size=8, skip_pages=()):
+        self.session = session
+        self.url = url
+        self.params = params or {}
+        self.page_size = page_size
+        self.workers = workers
+        self.bucket = TokenBucket(rate)
+        self.queue_size = queue_size
+        self.skip_pages = set(skip_pages)
+        self.total_count = None
+        # Pages upstream reported as not modified since they were last ingested, and every page's response
+        self.unchanged_pages = set()
+        self.responses = {}
+
+    def fetch(self, page):
+        self.bucket.acquire()
+        response = self.session.get(self.url, params={**self.params, 'page': page, 'pageSize': self.page_size})
+        if response.status_code != 200:
+            raise PageFetchError(f'Page {page} returned HTTP {response.status_code}')
+        self.responses[page] = response
+        if is_unchanged(response):
+            self.unchanged_pages.add(page)
+        return response.json()
+
+    def plan(self, first_page):
+        self.total_count = first_page.get('totalCount', len(first_page.get('data', [])))
+        last_page = math.ceil(self.total_count / self.page_size)
+        return [page for page in range(2, last_page + 1) if page not in self.skip_pages]
+
+    def __iter__(self):
+        """
+        Yield (page_number, payload) pairs; pages after the first arrive in completion order.
+        Pages in `skip_pages` are not yielded (page 1 is still fetched to read totalCount).
+        """
+        first_page = self.fetch(1)
+        pages = self.plan(first_page)
+        if 1 not in self.skip_pages:
+            yield 1, first_page
+        if not pages:
+            return
+
+        results = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def worker(page):
+            if stop.is_set():
+                return
+            try:
+                item = (page, self.fetch(page), None)
+            except Exception as exc:
+                item = (page, None, exc)
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for page in pages:
+                executor.submit(worker, page)
+            for _ in pages:
+                page, payload, error = results.get()
+                if error is not None:
+                    raise PageFetchError(f'Failed to fetch page {page}: {error}') from error
+                yield page, payload
+        finally:
+            stop.set()
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,32 @@
+class InternCache:
+    """
+    In-memory map from a content key to the id of a row in a small dimension table.
+
+    The whole table is loaded once; after that, `resolve` only touches the database to
+    bulk insert rows whose key has never been seen. The cache is meant to live for one
+    ingestion run: if a batch rolls back, the run should be aborted with it, since ids
+    inserted by that batch stay cached.
+    """
+
+    def __init__(self, model, key, build, fields):
+        self.model = model
+        self.key = key
+        self.build = build
+        self.ids = {}
+        for row in model.objects.order_by('id').values('id', *fields):
+            self.ids.setdefault(key(row), row['id'])
+
+    def resolve(self, items):
+        """
+        Return the row id for each item, inserting all unseen items in one statement.
+        """
+        keys = [self.key(self.build(item)) for item in items]
+        missing = {}
+        for item, item_key in zip(items, keys):
+            if item_key not in self.ids and item_key not in missing:
+                missing[item_key] = item
+        if missing:
+            rows = self.model.objects.bulk_create([self.model(**self.build(item)) for item in missing.values()])
+            for item_key, row in zip(missing.keys(), rows):
+                self.ids[item_key] = row.id
+        return [self.ids[item_key] for item_key in keys]
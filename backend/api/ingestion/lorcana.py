@@ -0,0 +1,53 @@
+from django.db import transaction
+from .hashing import split_unchanged
+from .price_changes import record_price_changes
+from .prices import with_market_prices
+from ..models import LorcanaCardData
+
+CARD_UPDATE_FIELDS = [
+    'artist', 'set_name', 'set_num', 'color', 'image', 'cost', 'inkable', 'name', 'type', 'rarity',
+    'flavor_text', 'body_text', 'content_hash', 'market_price', 'price_updated_at'
+]
+UNIQUE_FIELDS = ('set_id', 'card_num')
+
+def card_key(card_data):
+    return (card_data['Set_ID'], card_data['Card_Num'])
+
+def card_fields(card_data):
+    return {
+        'artist': card_data['Artist'],
+        'set_name': card_data['Set_Name'],
+        'set_num': card_data['Set_Num'],
+        'color': card_data['Color'],
+        'image': card_data['Image'],
+        'cost': card_data['Cost'],
+        'inkable': card_data['Inkable'],
+        'name': card_data['Name'],
+        'type': card_data['Type'],
+        'rarity': card_data['Rarity'],
+        'flavor_text': card_data.get('Flavor_Text', ''),
+        'card_num': card_data['Card_Num'],
+        'body_text': card_data.get('Body_Text', ''),
+        'set_id': card_data['Set_ID']
+    }
+
+@transaction.atomic
+def write_cards(cards_data):
+    """
+    Write a batch of lorcana-api cards keyed by (set_id, card_num), skipping cards whose
+    payload hash is unchanged. New and changed cards go through a single upsert. Returns WriteStats.
+    """
+    pending, hashes, stats = split_unchanged(LorcanaCardData, cards_data, key=card_key, key_field=UNIQUE_FIELDS)
+    if not pending:
+        return stats
+
+    cards = [LorcanaCardData(**card_fields(card_data), content_hash=hashes[key]) for key, card_data in pending.items()]
+    with_market_prices('lorcana', cards, pending.values())
+    record_price_changes('lorcana', cards, key_field=UNIQUE_FIELDS)
+    LorcanaCardData.objects.bulk_create(
+        cards,
+        update_conflicts=True,
+        unique_fields=list(UNIQUE_FIELDS),
+        update_fields=CARD_UPDATE_FIELDS,
+    )
+    return stats
@@ -0,0 +1,179 @@
+from django.db import connection, transaction
+from .bulk import replace_links
+from .copy import StagingTable
+from .hashing import split_unchanged, with_content_hash
+from .history import StagedPriceHistory, record_price_history
+from .price_changes import record_price_changes, record_staged_price_changes
+from .prices import with_market_prices
+from .stats import WriteStats
+from ..models import MTGCardFace, MTGCardsData, MTGRelatedCard
+
+CARD_UPDATE_FIELDS = [
+    'oracle_id', 'name', 'lang', 'released_at', 'uri', 'layout', 'image_uris', 'cmc', 'type_line',
+    'color_identity', 'keywords', 'legalities', 'games', 'set', 'set_name', 'set_type', 'rarity',
+    'artist', 'prices', 'related_uris', 'content_hash', 'market_price', 'price_updated_at'
+]
+RELATED_UPDATE_FIELDS = ['component', 'name', 'type_line', 'uri']
+
+def card_oracle_id(card_data):
+    # Reversible cards only carry an oracle_id on their faces
+    if card_data.get('oracle_id'):
+        return card_data['oracle_id']
+    for face_data in card_data.get('card_faces', []):
+        if face_data.get('oracle_id'):
+            return face_data['oracle_id']
+    return None
+
+def build_card(card_data):
+    return MTGCardsData(
+        id=card_data['id'],
+        oracle_id=card_oracle_id(card_data),
+        name=card_data['name'],
+        lang=card_data.get('lang', 'en'),
+        released_at=card_data.get('released_at'),
+        uri=card_data['uri'],
+        layout=card_data.get('layout') or '',
+        image_uris=card_data.get('image_uris', {}),
+        cmc=card_data.get('cmc', 0),
+        type_line=card_data.get('type_line') or '',
+        color_identity=card_data.get('color_identity', []),
+        keywords=card_data.get('keywords', []),
+        legalities=card_data.get('legalities', {}),
+        games=card_data.get('games', []),
+        set=card_data.get('set') or '',
+        set_name=card_data.get('set_name') or '',
+        set_type=card_data.get('set_type') or '',
+        rarity=card_data.get('rarity') or '',
+        artist=card_data.get('artist') or '',
+        prices=card_data.get('prices', {}),
+        related_uris=card_data.get('related_uris', {}),
+    )
+
+def build_faces(card_data):
+    # Scryfall faces have no id of their own, so they are keyed by card id and position
+    return [
+        MTGCardFace(
+            id=face_data.get('id') or f"{card_data['id']}-{index}",
+            card_id=card_data['id'],
+            oracle_id=face_data.get('oracle_id') or card_oracle_id(card_data),
+            name=face_data['name'],
+            mana_cost=face_data.get('mana_cost', ''),
+            type_line=face_data.get('type_line', ''),
+            oracle_text=face_data.get('oracle_text', ''),
+            colors=face_data.get('colors', []),
+            power=face_data.get('power', ''),
+            toughness=face_data.get('toughness', ''),
+            artist=face_data.get('artist', ''),
+            image_uris=face_data.get('image_uris', {}),
+        )
+        for index, face_data in enumerate(card_data.get('card_faces', []))
+    ]
+
+def build_related(part_data):
+    return MTGRelatedCard(
+        id=part_data['id'],
+        component=part_data.get('component', ''),
+        name=part_data['name'],
+        type_line=part_data.get('type_line', ''),
+        uri=part_data.get('uri', '')
+    )
+
+@transaction.atomic
+def write_chunk(cards_data):
+    """
+    Write a chunk of Scryfall card objects with one upsert per table, skipping cards
+    whose payload hash is unchanged. Faces and all_parts links of the written cards are
+    replaced wholesale. Cards without any oracle_id are counted as skipped.
+    """
+    usable = [card_data for card_data in cards_data if card_oracle_id(card_data) is not None]
+    cards, hashes, stats = split_unchanged(MTGCardsData, usable, key=lambda card_data: card_data['id'])
+    stats.skipped = len(cards_data) - len(usable)
+    if not cards:
+        return stats
+
+    rows = []
+    for card_data in cards.values():
+        card = build_card(card_data)
+        card.content_hash = hashes[card.id]
+        rows.append(card)
+    with_market_prices('mtg', rows, cards.values())
+    record_price_changes('mtg', rows)
+    MTGCardsData.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=CARD_UPDATE_FIELDS,
+    )
+    record_price_history('mtg', rows, cards.values())
+
+    card_ids = list(cards.keys())
+    MTGCardFace.objects.filter(card_id__in=card_ids).delete()
+    MTGCardFace.objects.bulk_create([face for card_data in cards.values() for face in build_faces(card_data)])
+
+    related = {}
+    for card_data in cards.values():
+        for part_data in card_data.get('all_parts', []):
+            related[part_data['id']] = build_related(part_data)
+    if related:
+        # Concurrent shards share related cards; upserting them in key order keeps their row locks from deadlocking
+        MTGRelatedCard.objects.bulk_create(
+            [related[related_id] for related_id in sorted(related)],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=RELATED_UPDATE_FIELDS,
+        )
+    replace_links(MTGCardsData.all_parts, card_ids, [
+        (card_data['id'], part_data['id'])
+        for card_data in cards.values() for part_data in card_data.get('all_parts', [])
+    ])
+
+    return stats
+
+def copy_load(batches):
+    """
+    Load whole batches of Scryfall cards through COPY into temporary staging tables, then merge
+    cards and related cards with one INSERT ... ON CONFLICT each and replace the faces and
+    all_parts links of new and changed cards. Meant for cold starts and rebuilds; returns WriteStats.
+    """
+    through = MTGCardsData.all_parts.through
+    card_field = MTGCardsData.all_parts.field.m2m_field_name()
+    part_field = MTGCardsData.all_parts.field.m2m_reverse_field_name()
+    cards = StagingTable(MTGCardsData, ['id', *CARD_UPDATE_FIELDS])
+    faces = StagingTable(MTGCardFace, [field.name for field in MTGCardFace._meta.concrete_fields])
+    related = StagingTable(MTGRelatedCard, ['id', *RELATED_UPDATE_FIELDS])
+    links = StagingTable(through, [card_field, part_field])
+    history = StagedPriceHistory('mtg')
+    tables = [cards, faces, related, links, history]
+    skipped = 0
+
+    with connection.cursor() as cursor:
+        for table in tables:
+            table.create(cursor)
+        try:
+            for batch in batches:
+                cards_data = [card_data for card_data in batch.records if card_oracle_id(card_data) is not None]
+                skipped += len(batch.records) - len(cards_data)
+                rows = with_market_prices('mtg', [with_content_hash(build_card(card_data), card_data) for card_data in cards_data], cards_data)
+                cards.copy(cursor, rows)
+                history.copy(cursor, rows, cards_data)
+                faces.copy(cursor, (face for card_data in cards_data for face in build_faces(card_data)))
+                parts = [(card_data['id'], part_data) for card_data in cards_data for part_data in card_data.get('all_parts', [])]
+                related.copy(cursor, (build_related(part_data) for _, part_data in parts))
+                links.copy(cursor, (
+                    through(**{f'{card_field}_id': card_id, f'{part_field}_id': part_data['id']})
+                    for card_id, part_data in parts
+                ))
+
+            with transaction.atomic():
+                unchanged = cards.discard_unchanged(cursor)
+                record_staged_price_changes(cursor, 'mtg', cards)
+                inserted, changed = cards.upsert(cursor, ['id'], CARD_UPDATE_FIELDS)
+                faces.replace_children(cursor, 'card', cards)
+                related.upsert(cursor, ['id'], RELATED_UPDATE_FIELDS)
+                links.replace_children(cursor, card_field, cards)
+                history.merge(cursor)
+        finally:
+            for table in tables:
+                table.drop(cursor)
+
+    return WriteStats(inserted=inserted, changed=changed, unchanged=unchanged, skipped=skipped)
@@ -0,0 +1,113 @@
+import logging
+import time
+from functools import partial
+from django.db import transaction
+from . import lorcana, mtg, pokemon, yugioh
+from .checkpoints import advance_checkpoint, complete_checkpoint
+from .stats import WriteStats
+
+logger = logging.getLogger(__name__)
+
+def game_writer(game):
+    """
+    Return the batch writer for `game`: a callable taking a list of upstream records and
+    returning WriteStats. Each game module owns its transformation into model rows.
+    """
+    if game == 'pokemon':
+        # Nested rows are interned for the lifetime of the writer, i.e. one run
+        return partial(pokemon.write_page, dimensions=pokemon.PokemonDimensions())
+    writers = {
+        'yugioh': yugioh.write_chunk,
+        'mtg': mtg.write_chunk,
+        'lorcana': lorcana.write_cards,
+    }
+    if game not in writers:
+        raise ValueError(f'Unknown game: {game}')
+    return writers[game]
+
+class IngestionMetrics:
+    """
+    Throughput counters reported the same way by every catalog command.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.batches = 0
+        self.errors = 0
+        self.stats = WriteStats()
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __iadd__(self, other):
+        # Combine consecutive runs (e.g. one per set); elapsed keeps counting from the first
+        self.rows += other.rows
+        self.batches += other.batches
+        self.errors += other.errors
+        self.stats += other.stats
+        self.finished = other.finished
+        return self
+
+    def __str__(self):
+        return (
+            f'{self.stats}; {self.rows} rows in {self.batches} batches, '
+            f'{self.rows_per_second:.0f} rows/s, {self.errors} errors'
+        )
+
+class DatabaseSink:
+    """
+    Write each batch in its own transaction; with a checkpoint, the batch's cursor is
+    committed in the same transaction so an interrupted run resumes after the last batch.
+    Batches marked unchanged are counted without being written.
+    """
+
+    def __init__(self, write, checkpoint=None):
+        self.write = write
+        self.checkpoint = checkpoint
+
+    def __call__(self, batch):
+        with transaction.atomic():
+            if batch.unchanged:
+                # Upstream answered 304 for records that were already ingested
+                stats = WriteStats(unchanged=len(batch.records))
+            else:
+                stats = self.write(batch.records)
+            if self.checkpoint is not None:
+                advance_checkpoint(self.checkpoint, **batch.cursor)
+        if batch.on_commit:
+            batch.on_commit()
+        return stats
+
+    def close(self):
+        if self.checkpoint is not None:
+            complete_checkpoint(self.checkpoint)
+
+def run_pipeline(source, sink, progress=None):
+    """
+    Drain `source` into `sink` one batch at a time and return IngestionMetrics.
+    `progress(batch, metrics)` is called after every committed batch. A failing batch is
+    rolled back, counted and re-raised; the checkpoint still points at the last good batch.
+    """
+    metrics = IngestionMetrics()
+    try:
+        for batch in source:
+            metrics.stats += sink(batch)
+            metrics.rows += len(batch.records)
+            metrics.batches += 1
+            if progress:
+                progress(batch, metrics)
+    except Exception:
+        metrics.errors += 1
+        metrics.finished = time.monotonic()
+        logger.error(f'Ingestion stopped after {metrics}')
+        raise
+    sink.close()
+    metrics.finished = time.monotonic()
+    return metrics
@@ -0,0 +1,297 @@
+import datetime
+from django.db import connection, transaction
+from django.utils import timezone
+from .bulk import replace_links
+from .copy import SEQUENCE_COLUMN, StagingTable, quote, table_name
+from .hashing import split_unchanged, with_content_hash
+from .stats import WriteStats
+from .interning import InternCache
+from .prices import combined_average_price, with_market_prices
+from .history import StagedPriceHistory, record_price_history
+from .price_changes import record_price_changes, record_staged_price_changes
+from ..models import (
+    PokemonCardData, PokemonAttack, PokemonWeakness, PokemonCardSet,
+    PokemonAbility, PokemonTcgplayer, PokemonCardmarket
+)
+
+SET_UPDATE_FIELDS = ['name', 'series', 'printedTotal', 'total', 'legalities', 'ptcgoCode', 'releaseDate', 'updatedAt', 'images']
+PRICE_UPDATE_FIELDS = ['updatedAt', 'prices']
+CARD_UPDATE_FIELDS = [
+    'name', 'supertype', 'subtypes', 'level', 'hp', 'types', 'evolvesFrom', 'retreatCost',
+    'convertedRetreatCost', 'number', 'artist', 'rarity', 'flavorText', 'nationalPokedexNumbers',
+    'legalities', 'images', 'set', 'rules', 'tcgplayer', 'cardmarket', 'content_hash', 'market_price', 'price_updated_at',
+    'combined_average_price'
+]
+
+# Helper function to convert date format
+def convert_date_format(date_str, is_datetime=False):
+    if date_str:
+        try:
+            if is_datetime:
+                return timezone.make_aware(
+                    datetime.datetime.strptime(date_str, '%Y/%m/%d %H:%M:%S'),
+                    timezone.get_default_timezone()
+                )
+            else:
+                return datetime.datetime.strptime(date_str, '%Y/%m/%d').strftime('%Y-%m-%d')
+        except ValueError:
+            return None
+    return None
+
+def build_set(card_set_data):
+    return PokemonCardSet(
+        id=card_set_data.get('id', ''),
+        name=card_set_data.get('name', ''),
+        series=card_set_data.get('series', ''),
+        printedTotal=card_set_data.get('printedTotal', 0),
+        total=card_set_data.get('total', 0),
+        legalities=card_set_data.get('legalities', {}),
+        ptcgoCode=card_set_data.get('ptcgoCode', ''),
+        releaseDate=convert_date_format(card_set_data.get('releaseDate', '')),
+        updatedAt=convert_date_format(card_set_data.get('updatedAt', ''), is_datetime=True),
+        images=card_set_data.get('images', {})
+    )
+
+def build_price_row(model, price_data):
+    return model(
+        url=price_data.get('url', ''),
+        updatedAt=convert_date_format(price_data.get('updatedAt', None), is_datetime=True),
+        prices=price_data.get('prices', {})
+    )
+
+def build_card(card_data):
+    return PokemonCardData(
+        id=card_data['id'],
+        name=card_data.get('name', ''),
+        supertype=card_data.get('supertype', ''),
+        subtypes=card_data.get('subtypes', []),
+        level=card_data.get('level', ''),
+        hp=card_data.get('hp', ''),
+        types=card_data.get('types', []),
+        evolvesFrom=card_data.get('evolvesFrom', ''),
+        retreatCost=card_data.get('retreatCost', []),
+        convertedRetreatCost=card_data.get('convertedRetreatCost', 0),
+        number=card_data.get('number', ''),
+        artist=card_data.get('artist', ''),
+        rarity=card_data.get('rarity', ''),
+        flavorText=card_data.get('flavorText', ''),
+        nationalPokedexNumbers=card_data.get('nationalPokedexNumbers', []),
+        legalities=card_data.get('legalities', {}),
+        images=card_data.get('images', {}),
+        set_id=card_data.get('set', {}).get('id', ''),
+        rules=card_data.get('rules', []),
+        combined_average_price=combined_average_price(card_data),
+    )
+
+def upsert_price_rows(model, rows):
+    """
+    Upsert tcgplayer/cardmarket rows keyed by url and return a url -> id map.
+    """
+    if not rows:
+        return {}
+    created = model.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=['url'],
+        update_fields=PRICE_UPDATE_FIELDS,
+    )
+    return {row.url: row.id for row in created}
+
+def ability_fields(data):
+    return {
+        'name': data['name'],
+        'text': data.get('text') or '',
+        'type': data.get('type') or '',
+    }
+
+def attack_fields(data):
+    return {
+        'name': data['name'],
+        'cost': data.get('cost') or [],
+        'convertedEnergyCost': data.get('convertedEnergyCost') or 0,
+        'damage': data.get('damage') or '',
+        'text': data.get('text') or '',
+    }
+
+def weakness_fields(data):
+    return {
+        'type': data['type'],
+        'value': data.get('value') or '',
+    }
+
+class PokemonDimensions:
+    """
+    Interned abilities, attacks and weaknesses, keyed by their full content rather than by
+    name, since the same attack name appears with different costs, damage and text.
+    """
+
+    def __init__(self):
+        self.abilities = InternCache(
+            PokemonAbility,
+            key=lambda row: (row['name'], row['text'] or '', row['type'] or ''),
+            build=ability_fields,
+            fields=['name', 'text', 'type'],
+        )
+        self.attacks = InternCache(
+            PokemonAttack,
+            key=lambda row: (row['name'], tuple(row['cost'] or []), row['convertedEnergyCost'], row['damage'] or '', row['text'] or ''),
+            build=attack_fields,
+            fields=['name', 'cost', 'convertedEnergyCost', 'damage', 'text'],
+        )
+        self.weaknesses = InternCache(
+            PokemonWeakness,
+            key=lambda row: (row['type'], row['value'] or ''),
+            build=weakness_fields,
+            fields=['type', 'value'],
+        )
+
+def card_links(cards_data, nested_key, cache):
+    """
+    Resolve one nested list (abilities, attacks or weaknesses) of every card to (card_id, row_id) pairs.
+    """
+    owners = []
+    items = []
+    for card_data in cards_data:
+        for item in card_data.get(nested_key) or []:
+            owners.append(card_data['id'])
+            items.append(item)
+    return list(zip(owners, cache.resolve(items)))
+
+@transaction.atomic
+def write_page(cards_data, dimensions=None):
+    """
+    Write one API page of Pokemon cards as a single unit.
+    Cards whose payload hashes the same as the stored content_hash are skipped. For the
+    rest, sets, price rows and cards are upserted with one statement per table, and the
+    ability/attack/weakness links are rewritten in bulk. Pass the run's PokemonDimensions
+    so nested rows are resolved in memory instead of reloading the tables for every page.
+    """
+    pending, hashes, stats = split_unchanged(PokemonCardData, cards_data, key=lambda card_data: card_data['id'])
+    cards_data = list(pending.values())
+    if not cards_data:
+        return stats
+
+    sets = {}
+    tcgplayers = {}
+    cardmarkets = {}
+    for card_data in cards_data:
+        card_set = build_set(card_data.get('set', {}))
+        sets[card_set.id] = card_set
+        if card_data.get('tcgplayer'):
+            row = build_price_row(PokemonTcgplayer, card_data['tcgplayer'])
+            tcgplayers[row.url] = row
+        if card_data.get('cardmarket'):
+            row = build_price_row(PokemonCardmarket, card_data['cardmarket'])
+            cardmarkets[row.url] = row
+
+    PokemonCardSet.objects.bulk_create(
+        sets.values(),
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=SET_UPDATE_FIELDS,
+    )
+    tcgplayer_ids = upsert_price_rows(PokemonTcgplayer, tcgplayers)
+    cardmarket_ids = upsert_price_rows(PokemonCardmarket, cardmarkets)
+
+    cards = {}
+    for card_data in cards_data:
+        card = build_card(card_data)
+        card.content_hash = hashes[card.id]
+        card.tcgplayer_id = tcgplayer_ids.get(card_data.get('tcgplayer', {}).get('url', ''))
+        card.cardmarket_id = cardmarket_ids.get(card_data.get('cardmarket', {}).get('url', ''))
+        cards[card.id] = card
+    with_market_prices('pokemon', cards.values(), cards_data)
+    record_price_changes('pokemon', cards.values())
+
+    PokemonCardData.objects.bulk_create(
+        cards.values(),
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=CARD_UPDATE_FIELDS,
+    )
+    record_price_history('pokemon', cards.values(), cards_data)
+
+    dimensions = dimensions or PokemonDimensions()
+    card_ids = list(cards.keys())
+    replace_links(PokemonCardData.abilities, card_ids, card_links(cards_data, 'abilities', dimensions.abilities))
+    replace_links(PokemonCardData.attacks, card_ids, card_links(cards_data, 'attacks', dimensions.attacks))
+    replace_links(PokemonCardData.weaknesses, card_ids, card_links(cards_data, 'weaknesses', dimensions.weaknesses))
+
+    return stats
+
+def copy_load(batches, dimensions=None):
+    """
+    Load whole batches of Pokemon cards through COPY into temporary staging tables, then merge
+    sets, price rows and cards with one INSERT ... ON CONFLICT each (cards pick up their price
+    row ids by url in the same statement) and replace the ability/attack/weakness links of new
+    and changed cards. Meant for cold starts and rebuilds; returns WriteStats.
+    """
+    dimensions = dimensions or PokemonDimensions()
+    card_fields = ['id', *(name for name in CARD_UPDATE_FIELDS if name not in ('tcgplayer', 'cardmarket'))]
+    cards = StagingTable(PokemonCardData, card_fields, extra=[('tcgplayer_url', 'varchar(255)'), ('cardmarket_url', 'varchar(255)')])
+    sets = StagingTable(PokemonCardSet, ['id', *SET_UPDATE_FIELDS])
+    tcgplayers = StagingTable(PokemonTcgplayer, ['url', *PRICE_UPDATE_FIELDS])
+    cardmarkets = StagingTable(PokemonCardmarket, ['url', *PRICE_UPDATE_FIELDS])
+    links = {
+        nested_key: (relation, StagingTable(relation.through, [relation.field.m2m_field_name(), relation.field.m2m_reverse_field_name()]), cache)
+        for nested_key, relation, cache in (
+            ('abilities', PokemonCardData.abilities, dimensions.abilities),
+            ('attacks', PokemonCardData.attacks, dimensions.attacks),
+            ('weaknesses', PokemonCardData.weaknesses, dimensions.weaknesses),
+        )
+    }
+    history = StagedPriceHistory('pokemon')
+    tables = [cards, sets, tcgplayers, cardmarkets, *(table for _, table, _ in links.values()), history]
+
+    with connection.cursor() as cursor:
+        for table in tables:
+            table.create(cursor)
+        try:
+            for batch in batches:
+                cards_data = list({card_data['id']: card_data for card_data in batch.records}.values())
+                rows = []
+                for card_data in cards_data:
+                    card = with_content_hash(build_card(card_data), card_data)
+                    card.tcgplayer_url = (card_data.get('tcgplayer') or {}).get('url')
+                    card.cardmarket_url = (card_data.get('cardmarket') or {}).get('url')
+                    rows.append(card)
+                with_market_prices('pokemon', rows, cards_data)
+                cards.copy(cursor, rows)
+                history.copy(cursor, rows, cards_data)
+                sets.copy(cursor, (build_set(card_data.get('set', {})) for card_data in cards_data))
+                tcgplayers.copy(cursor, (build_price_row(PokemonTcgplayer, card_data['tcgplayer']) for card_data in cards_data if card_data.get('tcgplayer')))
+                cardmarkets.copy(cursor, (build_price_row(PokemonCardmarket, card_data['cardmarket']) for card_data in cards_data if card_data.get('cardmarket')))
+                for nested_key, (relation, table, cache) in links.items():
+                    table.copy(cursor, (
+                        relation.through(**{relation.field.m2m_column_name(): card_id, relation.field.m2m_reverse_name(): row_id})
+                        for card_id, row_id in card_links(cards_data, nested_key, cache)
+                    ))
+
+            with transaction.atomic():
+                sets.upsert(cursor, ['id'], SET_UPDATE_FIELDS)
+                tcgplayers.upsert(cursor, ['url'], PRICE_UPDATE_FIELDS)
+                cardmarkets.upsert(cursor, ['url'], PRICE_UPDATE_FIELDS)
+                unchanged = cards.discard_unchanged(cursor)
+                record_staged_price_changes(cursor, 'pokemon', cards)
+                columns = cards.columns + ['tcgplayer_id', 'cardmarket_id']
+                inserted, changed = cards.upsert(
+                    cursor,
+                    ['id'],
+                    CARD_UPDATE_FIELDS,
+                    columns=columns,
+                    select=(
+                        f"SELECT {', '.join(f'staged.{quote(column)}' for column in cards.columns)}, "
+                        f"tcgplayer.id AS tcgplayer_id, cardmarket.id AS cardmarket_id, staged.{SEQUENCE_COLUMN} "
+                        f"FROM {quote(cards.name)} AS staged "
+                        f"LEFT JOIN {quote(table_name(PokemonTcgplayer))} AS tcgplayer ON tcgplayer.url = staged.tcgplayer_url "
+                        f"LEFT JOIN {quote(table_name(PokemonCardmarket))} AS cardmarket ON cardmarket.url = staged.cardmarket_url"
+                    ),
+                )
+                for relation, table, _ in links.values():
+                    table.replace_children(cursor, relation.field.m2m_field_name(), cards)
+                history.merge(cursor)
+        finally:
+            for table in tables:
+                table.drop(cursor)
+
+    return WriteStats(inserted=inserted, changed=changed, unchanged=unchanged)
@@ -0,0 +1,76 @@
+from django.db import connection
+from .copy import SEQUENCE_COLUMN, quote
+from ..models import ListCard, PriceChange
+from ..pricing import STRATEGIES, apply_price_changes
+
+def record_price_changes(game, cards, key_field='id'):
+    """
+    Record a PriceChange for every card in `cards` (about to be upserted) whose market_price
+    differs from the stored one, with one INSERT ... SELECT joining the new prices to the stored
+    rows, and move the lists holding those cards (see apply_price_changes). Must run before the
+    upsert, in its transaction. New cards are not in any list yet, so they find no stored row and
+    are left out. `key_field` may be a tuple of fields for natural keys, as in stored_hashes.
+    """
+    cards = list(cards)
+    if not cards:
+        return 0
+    model = type(cards[0])
+    fields = [model._meta.get_field(name) for name in ((key_field,) if isinstance(key_field, str) else key_field)]
+    row = ', '.join([*(f'%s::{field.db_type(connection)}' for field in fields), '%s::numeric'])
+    params = [value for card in cards for value in (*(getattr(card, field.attname) for field in fields), card.market_price)]
+    keys = [quote(field.column) for field in fields]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {quote(PriceChange._meta.db_table)} (game, card_id, old_price, new_price, recorded_at)
+            SELECT %s, stored.id::text, stored.market_price, pending.market_price, now()
+            FROM (VALUES {', '.join(f'({row})' for _ in cards)}) AS pending ({', '.join([*keys, 'market_price'])})
+            JOIN {quote(model._meta.db_table)} AS stored ON {' AND '.join(f'stored.{key} = pending.{key}' for key in keys)}
+            WHERE stored.market_price IS DISTINCT FROM pending.market_price
+        """, [game, *params])
+        recorded = cursor.rowcount
+    if recorded:
+        apply_price_changes()
+    return recorded
+
+def record_staged_price_changes(cursor, game, staging):
+    """
+    Record a PriceChange for every staged card (see copy.StagingTable) whose market_price differs
+    from the stored row, with one INSERT ... SELECT, and move the lists holding those cards. A card
+    staged twice is compared by its last staged row, the one StagingTable.upsert keeps. Must run
+    before the staging table is merged, in the merge transaction.
+    """
+    cursor.execute(f"""
+        INSERT INTO {quote(PriceChange._meta.db_table)} (game, card_id, old_price, new_price, recorded_at)
+        SELECT DISTINCT ON (staged.id) %s, staged.id::text, stored.market_price, staged.market_price, now()
+        FROM {quote(staging.name)} AS staged
+        JOIN {quote(staging.target)} AS stored ON stored.id = staged.id
+        WHERE stored.market_price IS DISTINCT FROM staged.market_price
+        ORDER BY staged.id, staged.{SEQUENCE_COLUMN} DESC
+    """, [game])
+    recorded = cursor.rowcount
+    if recorded:
+        apply_price_changes()
+    return recorded
+
+def record_rebuilt_price_changes(cursor, game, rebuilt):
+    """
+    Record a PriceChange for every listed card of `game` whose market_price differs in `rebuilt`,
+    a rebuilt copy of the card table about to be swapped in, and move the lists holding those
+    cards. Cards missing from `rebuilt` count as 0.00, the value of the list entries the swap
+    detaches. Must run in the swap transaction, before the entries are detached.
+    """
+    model = STRATEGIES[game].model
+    relation = ListCard._meta.get_field(STRATEGIES[game].relation).column
+    cursor.execute(f"""
+        INSERT INTO {quote(PriceChange._meta.db_table)} (game, card_id, old_price, new_price, recorded_at)
+        SELECT %s, live.id::text, live.market_price, coalesce(rebuilt.market_price, 0), now()
+        FROM {quote(model._meta.db_table)} AS live
+        LEFT JOIN {quote(rebuilt)} AS rebuilt ON rebuilt.id = live.id
+        WHERE live.market_price IS DISTINCT FROM coalesce(rebuilt.market_price, 0)
+          AND EXISTS (SELECT 1 FROM {quote(ListCard._meta.db_table)} AS list_card WHERE list_card.{quote(relation)} = live.id)
+    """, [game])
+    recorded = cursor.rowcount
+    if recorded:
+        apply_price_changes()
+    return recorded
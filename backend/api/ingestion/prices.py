@@ -0,0 +1,222 @@
+from decimal import Decimal, InvalidOperation
+import numpy as np
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+YUGIOH_PRICE_COLUMNS = ['cardmarket_price', 'ebay_price', 'amazon_price', 'tcgplayer_price', 'coolstuffinc_price']
+# average_prices works in integer cents; bounds are compared at 16x a price, well inside float64 and int64
+MAX_CENTS = 2 ** 48
+MAX_PRICE_LENGTH = 15
+# Price columns are numeric(10, 2)
+MAX_STORED_PRICE = Decimal('99999999.99')
+
+def calculate_average_price(prices):
+    """
+    Calculate the average price of a card by filtering outliers based on IQR (Interquartile Range).
+    Returns Decimal('0.00') if no valid prices are available.
+    """
+    # Sort prices to calculate Q1 (first quartile) and Q3 (third quartile)
+    prices = sorted(Decimal(str(price)) for price in prices if price)
+    if not prices:
+        return Decimal('0.00')
+    mid_index = len(prices) // 2
+    Q1 = prices[mid_index // 2] if len(prices) % 2 else (prices[mid_index // 2 - 1] + prices[mid_index // 2]) / 2
+    Q3 = prices[-(mid_index // 2) - 1] if len(prices) % 2 else (prices[-(mid_index // 2) - 1] + prices[-(mid_index // 2)]) / 2
+    IQR = Q3 - Q1  # Interquartile Range
+
+    # Define lower and upper bounds for filtering prices
+    lower_bound = Q1 - (Decimal('1.5') * IQR)
+    upper_bound = Q3 + (Decimal('1.5') * IQR)
+    filtered_prices = [price for price in prices if lower_bound <= price <= upper_bound]
+
+    # Calculate average price
+    try:
+        average = sum(filtered_prices) / Decimal(len(filtered_prices))
+    except (InvalidOperation, ZeroDivisionError, TypeError):
+        average = Decimal('0.00')
+
+    return average
+
+def average_prices(price_lists):
+    """
+    calculate_average_price for a whole batch of cards at once: `price_lists` holds one sequence
+    of raw upstream prices (strings, numbers or Decimals) per card, and one Decimal per card comes
+    back, equal to what calculate_average_price returns for the same prices.
+
+    The prices are parsed into one flat array with a ragged per-card index and scaled to integer
+    cents, so sorting, quartiles, IQR bounds, the outlier filter and the sums are exact integer
+    arithmetic in NumPy; only the final division happens in Decimal. Cards holding a price that
+    is not a whole number of cents (or cannot be parsed) go through calculate_average_price.
+    """
+    price_lists = [[price for price in prices if price] for prices in price_lists]
+    flat = [price for prices in price_lists for price in prices]
+    lengths = np.array([len(prices) for prices in price_lists], dtype=np.int64)
+    owner = np.repeat(np.arange(len(price_lists)), lengths)
+    try:
+        parsed = np.array(flat, dtype=np.float64)
+    except (TypeError, ValueError):
+        return [exact_average_price(prices) for prices in price_lists]
+
+    # A float only stands in for a price when it round-trips to a whole number of cents
+    cents = np.rint(parsed * 100)
+    exact = np.isfinite(parsed) & (np.abs(cents) < MAX_CENTS) & (cents / 100 == parsed)
+    exact &= precise(flat)
+    inexact = np.unique(owner[~exact])
+
+    # Zero prices are dropped, as calculate_average_price drops falsy prices
+    keep = exact & (cents != 0) & ~np.isin(owner, inexact)
+    owner = owner[keep]
+    values = cents[keep].astype(np.int64)
+    lengths = np.bincount(owner, minlength=len(price_lists))
+
+    # Sorted by card, then by price within each card
+    values = values[np.lexsort((values, owner))]
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    # The quartile picks of calculate_average_price, including its Python negative indexing
+    count = np.maximum(lengths, 1)
+    half = lengths // 2 // 2
+    odd = lengths % 2 == 1
+    last = max(len(values) - 1, 0)
+
+    def at(index):
+        if not len(values):
+            return np.zeros(len(lengths), dtype=np.int64)
+        return values[np.minimum(offsets + index % count, last)]
+
+    # Quartiles are kept doubled and bounds quadrupled so every midpoint stays an integer
+    q1 = at(np.where(odd, half, half - 1)) + at(half)
+    q3 = at(lengths - 1 - half) + at(np.where(odd, lengths - 1 - half, lengths - half))
+    iqr = q3 - q1
+    within = (4 * values >= (2 * q1 - 3 * iqr)[owner]) & (4 * values <= (2 * q3 + 3 * iqr)[owner])
+
+    ends = offsets + lengths
+    kept_sums = np.concatenate(([0], np.cumsum(np.where(within, values, 0))))
+    kept_counts = np.concatenate(([0], np.cumsum(within)))
+    sums = (kept_sums[ends] - kept_sums[offsets]).tolist()
+    counts = (kept_counts[ends] - kept_counts[offsets]).tolist()
+
+    averages = [Decimal(total).scaleb(-2) / kept if kept else Decimal('0.00') for total, kept in zip(sums, counts)]
+    for card in inexact.tolist():
+        averages[card] = exact_average_price(price_lists[card])
+    return averages
+
+def precise(prices):
+    """
+    Which float parses of `prices` can be trusted to the cent: numbers, short strings and Decimals
+    with at most two decimal places. Long strings may carry digits a float would drop.
+    """
+    kinds = set(map(type, prices))
+    if kinds <= {int, float}:
+        return np.ones(len(prices), dtype=bool)
+    if kinds == {str}:
+        return np.fromiter(map(len, prices), dtype=np.int64, count=len(prices)) <= MAX_PRICE_LENGTH
+    return np.array([
+        len(price) <= MAX_PRICE_LENGTH if isinstance(price, str)
+        else price.is_finite() and price.as_tuple().exponent >= -2 if isinstance(price, Decimal)
+        else True
+        for price in prices
+    ], dtype=bool)
+
+def exact_average_price(prices):
+    return calculate_average_price([price for price in map(to_decimal, prices) if price is not None])
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value)) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+def price_value(value):
+    """
+    An upstream price string as a column value: a Decimal rounded to the cent, or None when the
+    price is missing, unparsable or too large for the column.
+    """
+    price = to_decimal(value)
+    if price is None or not price.is_finite():
+        return None
+    price = price.quantize(CENT)
+    return price if abs(price) <= MAX_STORED_PRICE else None
+
+def pokemon_prices(card_data):
+    """
+    The TCGPlayer trend prices and the Cardmarket average sell price.
+    """
+    price_values = []
+    tcgplayer_prices = (card_data.get('tcgplayer') or {}).get('prices')
+    cardmarket_prices = (card_data.get('cardmarket') or {}).get('prices')
+    if tcgplayer_prices:
+        price_values.append(tcgplayer_prices.get('trendPrice', 0))
+        price_values.append(tcgplayer_prices.get('reverseHoloTrend', 0))
+    if cardmarket_prices:
+        price_values.append(cardmarket_prices.get('averageSellPrice', 0))
+    return price_values
+
+def combined_average_price(card_data):
+    """
+    The Pokemon catalog's price sort key: the TCGPlayer market price (holofoil, else normal) plus
+    the Cardmarket trend (reverse holo, else overall), each counting 0 when missing.
+    """
+    tcgplayer_prices = (card_data.get('tcgplayer') or {}).get('prices') or {}
+    cardmarket_prices = (card_data.get('cardmarket') or {}).get('prices') or {}
+    variants = [tcgplayer_prices.get(variant) for variant in ('holofoil', 'normal')]
+    total = first_price(*(prices.get('market') for prices in variants if isinstance(prices, dict)))
+    total += first_price(cardmarket_prices.get('reverseHoloTrend'), cardmarket_prices.get('trendPrice'))
+    return min(total, MAX_STORED_PRICE)
+
+def first_price(*values):
+    return next((price for price in map(price_value, values) if price is not None), Decimal('0.00'))
+
+def yugioh_prices(card_data):
+    """
+    Every vendor price ygoprodeck lists for the card.
+    """
+    return [
+        price_info.get(column)
+        for price_info in card_data.get('card_prices', [])
+        for column in YUGIOH_PRICE_COLUMNS
+    ]
+
+def mtg_prices(card_data):
+    """
+    Scryfall's USD price; cards without one (foil-only, digital) are worth 0.
+    """
+    return [(card_data.get('prices') or {}).get('usd')]
+
+def lorcana_prices(card_data):
+    """
+    lorcana-api has no prices, so Lorcana cards are valued by their ink cost.
+    """
+    return [card_data.get('Cost')]
+
+# The prices each game's market price averages (a single price averages to itself)
+GAME_PRICES = {
+    'pokemon': pokemon_prices,
+    'yugioh': yugioh_prices,
+    'mtg': mtg_prices,
+    'lorcana': lorcana_prices,
+}
+
+def market_prices(game, cards_data):
+    """
+    Market prices of a batch of upstream card records, rounded as the column stores them, or None
+    for a price too large for the column (see price_value).
+    """
+    return [price_value(price) for price in average_prices([GAME_PRICES[game](card_data) for card_data in cards_data])]
+
+def stored_market_prices(game, cards_data):
+    """
+    market_prices as the market_price columns store them: they aren't nullable, so a price they
+    can't hold counts as unpriced.
+    """
+    return [Decimal('0.00') if price is None else price for price in market_prices(game, cards_data)]
+
+def with_market_prices(game, cards, cards_data):
+    """
+    Store freshly computed market prices on card instances built from `cards_data` (same order).
+    """
+    now = timezone.now()
+    for card, price in zip(cards, stored_market_prices(game, cards_data)):
+        card.market_price = price
+        card.price_updated_at = now
+    return cards
@@ -0,0 +1,124 @@
+from django.db import connection, transaction
+from .copy import quote, redirect_tables
+
+FOREIGN_KEYS_SQL = """
+    SELECT constraint_def.conname, source.relname, target.relname, pg_get_constraintdef(constraint_def.oid),
+           source_column.attname, source_column.attnotnull, target_column.attname
+    FROM pg_constraint AS constraint_def
+    JOIN pg_class AS source ON source.oid = constraint_def.conrelid
+    JOIN pg_class AS target ON target.oid = constraint_def.confrelid
+    JOIN pg_attribute AS source_column ON source_column.attrelid = constraint_def.conrelid AND source_column.attnum = constraint_def.conkey[1]
+    JOIN pg_attribute AS target_column ON target_column.attrelid = constraint_def.confrelid AND target_column.attnum = constraint_def.confkey[1]
+    WHERE constraint_def.contype = 'f' AND (source.relname = ANY(%s) OR target.relname = ANY(%s))
+"""
+
+SERIAL_SEQUENCES_SQL = """
+    SELECT table_def.relname, column_def.attname, pg_get_serial_sequence(quote_ident(table_def.relname), column_def.attname)
+    FROM pg_class AS table_def
+    JOIN pg_attribute AS column_def ON column_def.attrelid = table_def.oid
+    WHERE table_def.relname = ANY(%s) AND column_def.attnum > 0 AND NOT column_def.attisdropped
+      AND column_def.attidentity = '' AND pg_get_serial_sequence(quote_ident(table_def.relname), column_def.attname) IS NOT NULL
+"""
+
+RENAMEABLE_SQL = r"""
+    SELECT 'i', index_def.relname
+    FROM pg_index
+    JOIN pg_class AS index_def ON index_def.oid = pg_index.indexrelid
+    JOIN pg_class AS table_def ON table_def.oid = pg_index.indrelid
+    WHERE table_def.relname = ANY(%(tables)s) AND index_def.relname LIKE 'shadow\_%%'
+    UNION
+    SELECT 'S', sequence_def.relname
+    FROM pg_class AS sequence_def
+    JOIN pg_depend AS dependency ON dependency.objid = sequence_def.oid
+    JOIN pg_class AS table_def ON table_def.oid = dependency.refobjid
+    WHERE sequence_def.relkind = 'S' AND table_def.relname = ANY(%(tables)s) AND sequence_def.relname LIKE 'shadow\_%%'
+"""
+
+def catalog_tables(models):
+    return [model._meta.db_table for model in models]
+
+class ShadowCatalog:
+    """
+    Build a new version of some catalog tables next to the live ones and swap it in.
+
+    `create` makes empty `shadow_<table>` copies (columns, defaults and indexes), `redirect`
+    points the COPY loaders at them, and `swap` exchanges the tables by renaming them inside
+    one short transaction, so readers only ever see the complete old or new catalog. Foreign
+    keys touching the swapped tables are re-created against the new tables; rows elsewhere
+    (e.g. list entries) that reference cards missing from the new catalog are detached first,
+    like deleting those cards would.
+    """
+
+    def __init__(self, models, lock_timeout='5s'):
+        self.tables = catalog_tables(models)
+        self.shadows = {table: f'shadow_{table}' for table in self.tables}
+        self.lock_timeout = lock_timeout
+
+    def create(self):
+        with connection.cursor() as cursor:
+            for table, shadow in self.shadows.items():
+                cursor.execute(f'DROP TABLE IF EXISTS {quote(shadow)}')
+                cursor.execute(f'CREATE TABLE {quote(shadow)} (LIKE {quote(table)} INCLUDING ALL)')
+
+    def redirect(self):
+        return redirect_tables(self.shadows)
+
+    def discard(self):
+        with connection.cursor() as cursor:
+            for shadow in self.shadows.values():
+                cursor.execute(f'DROP TABLE IF EXISTS {quote(shadow)}')
+
+    def swap(self, before_swap=None):
+        """
+        Swap the shadow tables in, then validate the re-created foreign keys and drop the old tables.
+        Only the renames hold exclusive locks; lock_timeout keeps them from queueing behind long readers.
+        `before_swap` is called with the cursor inside the swap transaction, while both versions of
+        the catalog and every list entry are still in place.
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL lock_timeout = '{self.lock_timeout}'")
+            # Tables with pending deferred FK checks can't be altered, so run those checks now
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            if before_swap is not None:
+                before_swap(cursor)
+            cursor.execute(FOREIGN_KEYS_SQL, [self.tables, self.tables])
+            foreign_keys = cursor.fetchall()
+            cursor.execute(SERIAL_SEQUENCES_SQL, [self.tables])
+            sequences = cursor.fetchall()
+
+            for name, table, target, _, column, not_null, target_column in foreign_keys:
+                cursor.execute(f'ALTER TABLE {quote(table)} DROP CONSTRAINT {quote(name)}')
+                if table not in self.shadows:
+                    self.detach_missing(cursor, table, column, not_null, self.shadows[target], target_column)
+
+            for table, shadow in self.shadows.items():
+                cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(f"retired_{table}")}')
+                cursor.execute(f'ALTER TABLE {quote(shadow)} RENAME TO {quote(table)}')
+            # Shadow copies of serial columns share the live sequence; keep it alive when the old table goes
+            for table, column, sequence in sequences:
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.{quote(column)}')
+
+            for name, table, _, definition, *_ in foreign_keys:
+                cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition} NOT VALID')
+
+        with connection.cursor() as cursor:
+            for name, table, *_ in foreign_keys:
+                cursor.execute(f'ALTER TABLE {quote(table)} VALIDATE CONSTRAINT {quote(name)}')
+            for table in self.tables:
+                cursor.execute(f'DROP TABLE {quote(f"retired_{table}")}')
+            # Postgres named the copied indexes and identity sequences after the shadow tables;
+            # drop the prefix now that the old names are free
+            cursor.execute(RENAMEABLE_SQL, {'tables': self.tables})
+            for kind, relation in cursor.fetchall():
+                keyword = 'SEQUENCE' if kind == 'S' else 'INDEX'
+                cursor.execute(f'ALTER {keyword} {quote(relation)} RENAME TO {quote(relation[len("shadow_"):])}')
+
+    def detach_missing(self, cursor, table, column, not_null, shadow, target_column):
+        missing = (
+            f'{quote(table)}.{quote(column)} IS NOT NULL AND NOT EXISTS '
+            f'(SELECT 1 FROM {quote(shadow)} AS shadow WHERE shadow.{quote(target_column)} = {quote(table)}.{quote(column)})'
+        )
+        if not_null:
+            cursor.execute(f'DELETE FROM {quote(table)} WHERE {missing}')
+        else:
+            cursor.execute(f'UPDATE {quote(table)} SET {quote(column)} = NULL WHERE {missing}')
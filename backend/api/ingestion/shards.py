@@ -0,0 +1,90 @@
+import math
+from .archive import RunArchive, FULL, PARTIAL
+from .http import build_session, http_cache_dir, is_unchanged, mark_ingested
+from .pipeline import game_writer, run_pipeline, DatabaseSink, IngestionMetrics
+from .sources import HttpNextPageSource, HttpPageSource, StreamSource
+from .upstream import (
+    LORCANA_URL, MTG_SEARCH_URL, POKEMON_CARDS_URL, POKEMON_SETS_URL, SCRYFALL_HEADERS, YUGIOH_URL,
+    changed_pokemon_sets, pokemon_headers, pokemon_set_params, pokemon_set_updates, sync_pokemon_set,
+)
+
+MTG_PAGE_SIZE = 175
+
+GAMES = ['pokemon', 'yugioh', 'mtg', 'lorcana']
+
+def session_for(game):
+    if game == 'pokemon':
+        return build_session(pokemon_headers(), cache_dir=http_cache_dir())
+    return build_session(SCRYFALL_HEADERS if game == 'mtg' else None, cache_dir=http_cache_dir())
+
+def plan_shards(game, shard_size=None, incremental=False):
+    """
+    Split one game's sync into independent shards (plain dicts, so they travel as task arguments):
+    Pokemon by set, Yu-Gi-Oh! by offset range, MTG by search page range, Lorcana as a single shard.
+    """
+    if game == 'pokemon':
+        with session_for(game) as session:
+            upstream = pokemon_set_updates(HttpPageSource(session, POKEMON_SETS_URL))
+        set_ids = changed_pokemon_sets(upstream) if incremental else list(upstream)
+        return [{'game': game, 'set_id': set_id, 'updated_at': upstream[set_id]} for set_id in set_ids]
+
+    if game == 'yugioh':
+        shard_size = shard_size or 2000
+        with session_for(game) as session:
+            response = session.get(YUGIOH_URL, params={'num': 1, 'offset': 0})
+        response.raise_for_status()
+        total = response.json()['meta']['total_rows']
+        return [{'game': game, 'offset': offset, 'num': shard_size} for offset in range(0, total, shard_size)]
+
+    if game == 'mtg':
+        shard_size = shard_size or 20
+        with session_for(game) as session:
+            response = session.get(MTG_SEARCH_URL, params={'q': '', 'page': 1})
+        response.raise_for_status()
+        pages = math.ceil(response.json()['total_cards'] / MTG_PAGE_SIZE)
+        return [
+            {'game': game, 'first_page': first, 'last_page': min(first + shard_size - 1, pages)}
+            for first in range(1, pages + 1, shard_size)
+        ]
+
+    if game == 'lorcana':
+        return [{'game': game}]
+
+    raise ValueError(f'Unknown game: {game}')
+
+def run_shard(shard):
+    """
+    Fetch and write one shard; returns its IngestionMetrics. Single-payload shards that
+    upstream reports as unchanged since they were last ingested are skipped. A Pokemon set's
+    watermark only advances once the whole set is committed. Each shard archives its raw
+    pages as its own run.
+    """
+    game = shard['game']
+    with session_for(game) as session:
+        if game == 'pokemon':
+            source = HttpPageSource(session, POKEMON_CARDS_URL, params=pokemon_set_params(shard['set_id']))
+            with RunArchive(game, PARTIAL) as archive:
+                return sync_pokemon_set(source, shard['set_id'], shard['updated_at'], game_writer(game), archive)
+        if game == 'mtg':
+            source = HttpNextPageSource(session, MTG_SEARCH_URL, params={'q': ''}, first_page=shard['first_page'], last_page=shard['last_page'])
+            with RunArchive(game, PARTIAL) as archive:
+                return run_pipeline(archive.record(source), DatabaseSink(game_writer(game)))
+
+        if game == 'yugioh':
+            response = session.get(YUGIOH_URL, params={'num': shard['num'], 'offset': shard['offset']}, stream=True)
+        else:
+            response = session.get(LORCANA_URL, stream=True)
+        with response:
+            response.raise_for_status()
+            if is_unchanged(response):
+                return IngestionMetrics()
+            response.raw.decode_content = True
+            source = StreamSource(response.raw, key='data' if game == 'yugioh' else None)
+            # Lorcana's single shard is the whole catalog
+            with RunArchive(game, FULL if game == 'lorcana' else PARTIAL) as archive:
+                metrics = run_pipeline(archive.record(source), DatabaseSink(game_writer(game)))
+            mark_ingested(session, response)
+        return metrics
+
+def shard_label(shard):
+    return ' '.join(f'{key}={value}' for key, value in shard.items() if key != 'updated_at')
@@ -0,0 +1,178 @@
+import gzip
+import json
+import mmap
+from itertools import islice
+from pathlib import Path
+from functools import partial
+from .http import ConcurrentPageFetcher, is_unchanged, mark_ingested
+from .streaming import iter_json_array, chunked
+
+class Batch:
+    """
+    A unit of work handed from a source to a sink: the upstream records plus the checkpoint
+    cursor that is true once they are committed.
+    """
+
+    def __init__(self, records, cursor, label=None, unchanged=False, on_commit=None):
+        self.records = records
+        self.cursor = cursor
+        self.label = label
+        # Set when upstream reported the records as not modified since they were last ingested
+        self.unchanged = unchanged
+        self.on_commit = on_commit
+
+class StreamSource:
+    """
+    Batches of records streamed from a JSON array in any readable stream (an HTTP body, an
+    open file). The cursor counts committed records, so a resumed run parses past them.
+    """
+
+    def __init__(self, stream, key=None, batch_size=1000, cursor=None):
+        self.stream = stream
+        self.key = key
+        self.batch_size = batch_size
+        self.processed = (cursor or {}).get('items', 0)
+
+    def records(self):
+        return iter_json_array(self.stream, key=self.key)
+
+    def __iter__(self):
+        if self.processed:
+            records = islice(self.records(), self.processed, None)
+        else:
+            records = self.records()
+        for chunk in chunked(records, self.batch_size):
+            self.processed += len(chunk)
+            yield Batch(chunk, {'items': self.processed}, label=f'{self.processed} records')
+
+class FileSource(StreamSource):
+    """
+    StreamSource over a local file, read through a read-only memory map.
+    """
+
+    def __init__(self, path, key=None, batch_size=1000, cursor=None):
+        super().__init__(None, key=key, batch_size=batch_size, cursor=cursor)
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, 'rb') as source_file, mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            self.stream = mapped
+            yield from super().__iter__()
+
+class FixtureSource:
+    """
+    Replay a recorded fixture: a gzip file of JSON lines, one upstream page payload per line.
+    Each page becomes one batch, exactly as it did when it was fetched.
+    """
+
+    def __init__(self, path, key='data', cursor=None):
+        self.path = path
+        self.key = key
+        self.done = set((cursor or {}).get('pages', []))
+
+    def __iter__(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as fixture:
+            for page, line in enumerate(fixture, start=1):
+                if page in self.done:
+                    continue
+                payload = json.loads(line)
+                self.done.add(page)
+                records = payload.get(self.key, []) if self.key else payload
+                yield Batch(records, {'pages': sorted(self.done)}, label=f'Page {page}')
+
+class RecordingSource:
+    """
+    Pass the batches of `source` through unchanged while saving them as a fixture that
+    FixtureSource replays offline.
+    """
+
+    def __init__(self, source, path):
+        self.source = source
+        self.path = Path(path)
+
+    def __iter__(self):
+        with open_fixture(self.path) as fixture:
+            for batch in self.source:
+                write_fixture_batch(fixture, batch)
+                yield batch
+
+def open_fixture(path):
+    """
+    Open a new fixture file for writing, creating its directory.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return gzip.open(path, 'wt', encoding='utf-8')
+
+def write_fixture_batch(fixture, batch):
+    """
+    Append one batch to an open fixture, as the {"data": records} line FixtureSource replays.
+    """
+    fixture.write(json.dumps({'data': batch.records}) + '\n')
+
+def recorded(source, path=None):
+    """
+    Apply a command's --record option: wrap `source` in a RecordingSource when a path is given.
+    """
+    return RecordingSource(source, path) if path else source
+
+class HttpPageSource:
+    """
+    Pages of a totalCount-paged JSON API fetched concurrently; one batch per page.
+    Pages complete out of order, so the cursor is the set of committed pages.
+    """
+
+    def __init__(self, session, url, params=None, key='data', cursor=None, **fetch_options):
+        self.session = session
+        self.key = key
+        self.done = set((cursor or {}).get('pages', []))
+        self.fetcher = ConcurrentPageFetcher(session, url, params=params, skip_pages=self.done, **fetch_options)
+
+    @property
+    def total_pages(self):
+        if self.fetcher.total_count is None:
+            return None
+        return -(-self.fetcher.total_count // self.fetcher.page_size)
+
+    def __iter__(self):
+        for page, payload in self.fetcher:
+            self.done.add(page)
+            response = self.fetcher.responses.pop(page, None)
+            yield Batch(
+                payload.get(self.key, []),
+                {'pages': sorted(self.done)},
+                label=f'Page {page} of {self.total_pages}',
+                unchanged=page in self.fetcher.unchanged_pages,
+                on_commit=partial(mark_ingested, self.session, response),
+            )
+
+class HttpNextPageSource:
+    """
+    Pages of a JSON API that signals more results with `has_more`, fetched in order,
+    optionally limited to pages first_page..last_page. The cursor is the next page to request.
+    """
+
+    def __init__(self, session, url, params=None, key='data', cursor=None, first_page=1, last_page=None):
+        self.session = session
+        self.url = url
+        self.params = params or {}
+        self.key = key
+        self.page = (cursor or {}).get('page', first_page)
+        self.last_page = last_page
+
+    def __iter__(self):
+        while self.last_page is None or self.page <= self.last_page:
+            response = self.session.get(self.url, params={**self.params, 'page': self.page})
+            response.raise_for_status()
+            payload = response.json()
+            page = self.page
+            self.page += 1
+            yield Batch(
+                payload.get(self.key, []),
+                {'page': self.page},
+                label=f'Page {page}',
+                unchanged=is_unchanged(response),
+                on_commit=partial(mark_ingested, self.session, response),
+            )
+            if not payload.get('has_more'):
+                return
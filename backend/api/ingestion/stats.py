@@ -0,0 +1,28 @@
+class WriteStats:
+    """
+    Row counts reported by the ingestion writers.
+    """
+
+    def __init__(self, inserted=0, changed=0, unchanged=0, skipped=0):
+        self.inserted = inserted
+        self.changed = changed
+        self.unchanged = unchanged
+        self.skipped = skipped
+
+    @property
+    def written(self):
+        return self.inserted + self.changed
+
+    @property
+    def total(self):
+        return self.inserted + self.changed + self.unchanged + self.skipped
+
+    def __iadd__(self, other):
+        self.inserted += other.inserted
+        self.changed += other.changed
+        self.unchanged += other.unchanged
+        self.skipped += other.skipped
+        return self
+
+    def __str__(self):
+        return f'{self.inserted} inserted, {self.changed} changed, {self.unchanged} unchanged, {self.skipped} skipped'
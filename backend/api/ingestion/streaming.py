@@ -0,0 +1,119 @@
+import codecs
+import json
+from itertools import islice
+
+READ_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+class JsonStreamReader:
+    """
+    Incrementally decode the items of a JSON array from a file-like object without
+    loading the whole document. `key` selects an array under a top-level object
+    (e.g. {"data": [...]}); with key=None the document itself must be an array.
+    """
+
+    def __init__(self, stream, key=None, read_size=READ_SIZE):
+        self.stream = stream
+        self.key = key
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """
+        Append the next chunk of the stream to the buffer. Returns False at end of stream.
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            self.buffer += self.text_decoder.decode(b'', final=True)
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self.text_decoder.decode(chunk)
+        # Drop what has already been consumed so the buffer never grows past one item plus a chunk
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON stream')
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f'Expected {char!r} at offset {self.pos} of JSON stream')
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _seek_array(self):
+        if self.key is None:
+            self._expect('[')
+            return True
+
+        self._expect('{')
+        if self._peek() == '}':
+            return False
+        while True:
+            name = self._value()
+            self._expect(':')
+            if name == self.key:
+                self._expect('[')
+                return True
+            self._value()
+            if self._peek() == ',':
+                self.pos += 1
+                continue
+            self._expect('}')
+            return False
+
+    def __iter__(self):
+        if not self._seek_array():
+            return
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ',':
+                self.pos += 1
+                continue
+            self._expect(']')
+            return
+
+def iter_json_array(stream, key=None, read_size=READ_SIZE):
+    return iter(JsonStreamReader(stream, key=key, read_size=read_size))
+
+def chunked(iterable, size):
+    """
+    Yield lists of at most `size` items from `iterable`.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
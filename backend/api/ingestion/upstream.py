@@ -0,0 +1,80 @@
+from pathlib import Path
+from decouple import Config, RepositoryEnv
+from django.conf import settings
+from .http import build_session
+from .pipeline import run_pipeline, DatabaseSink
+from .pokemon import convert_date_format
+from .watermarks import changed_keys, save_watermarks
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+env_file = BASE_DIR / '.env'
+config = Config(RepositoryEnv(env_file))
+
+POKEMON_CARDS_URL = 'https://api.pokemontcg.io/v2/cards'
+POKEMON_SETS_URL = 'https://api.pokemontcg.io/v2/sets'
+YUGIOH_URL = 'https://db.ygoprodeck.com/api/v7/cardinfo.php'
+MTG_SEARCH_URL = 'https://api.scryfall.com/cards/search'
+MTG_BULK_DATA_URL = 'https://api.scryfall.com/bulk-data'
+LORCANA_URL = 'https://api.lorcana-api.com/cards/fetch'
+SCRYFALL_HEADERS = {'User-Agent': 'DeckDirectory/1.0', 'Accept': 'application/json'}
+
+def pokemon_headers():
+    return {'X-Api-Key': config('REACT_APP_POKEMON_TCG_API_KEY')}
+
+def pokemon_set_updates(source):
+    """
+    Map every Pokemon set id to its upstream updatedAt, read from a source over the sets
+    endpoint. The timestamps are kept as sent, so they travel as task arguments.
+    """
+    return {set_data['id']: set_data.get('updatedAt') for batch in source for set_data in batch.records}
+
+def changed_pokemon_sets(updates):
+    """
+    The ids of the sets in `updates` (see pokemon_set_updates) whose updatedAt moved since
+    their cards were last synced.
+    """
+    return changed_keys('pokemon', {
+        set_id: convert_date_format(updated_at, is_datetime=True) for set_id, updated_at in updates.items()
+    })
+
+def pokemon_set_params(set_id):
+    # The cards endpoint's query for one set
+    return {'q': f'set.id:{set_id}'}
+
+def sync_pokemon_set(source, set_id, updated_at, write, archive, progress=None):
+    """
+    Write the cards of one Pokemon set from `source` (the cards endpoint queried with
+    pokemon_set_params) and only advance the set's watermark once every page is committed.
+    """
+    metrics = run_pipeline(archive.record(source), DatabaseSink(write), progress)
+    save_watermarks('pokemon', {set_id: convert_date_format(updated_at, is_datetime=True)})
+    return metrics
+
+def download_bulk_file(session, bulk_type, download_uri=None):
+    """
+    Resolve the current download for a Scryfall bulk-data type and cache it on disk.
+    Scryfall stamps each export in its file name, so an unchanged export is never downloaded twice.
+    `session` is a session with SCRYFALL_HEADERS, e.g. from build_session.
+    """
+    if download_uri is None:
+        response = session.get(f'{MTG_BULK_DATA_URL}/{bulk_type}')
+        response.raise_for_status()
+        download_uri = response.json()['download_uri']
+
+    cache_dir = Path(settings.INGESTION_CACHE_DIR) / 'scryfall'
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / download_uri.rsplit('/', 1)[-1]
+    if path.exists():
+        return path
+
+    partial = path.with_name(path.name + '.part')
+    # The export is kept under its stamped name above, so it bypasses the HTTP cache instead of
+    # being stored twice; it still gets the shared retry policy
+    with build_session(SCRYFALL_HEADERS, pool_size=1) as download_session, \
+            download_session.get(download_uri, stream=True) as download:
+        download.raise_for_status()
+        with open(partial, 'wb') as out:
+            for block in download.iter_content(chunk_size=1024 * 1024):
+                out.write(block)
+    partial.rename(path)
+    return path
@@ -0,0 +1,33 @@
+from ..models import SyncWatermark
+
+def load_watermarks(source):
+    """
+    Return the stored key -> watermark map for an ingestion source.
+    """
+    return dict(SyncWatermark.objects.filter(source=source).values_list('key', 'watermark'))
+
+def save_watermarks(source, watermarks):
+    """
+    Upsert key -> watermark pairs for `source` in one statement.
+    """
+    rows = [
+        SyncWatermark(source=source, key=key, watermark=watermark)
+        for key, watermark in watermarks.items()
+        if watermark is not None
+    ]
+    SyncWatermark.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['source', 'key'],
+        update_fields=['watermark', 'synced_at'],
+    )
+
+def changed_keys(source, candidates):
+    """
+    Return the keys of `candidates` (key -> upstream watermark) that are new or moved past the stored watermark.
+    """
+    stored = load_watermarks(source)
+    return [
+        key for key, watermark in candidates.items()
+        if key not in stored or watermark is None or watermark > stored[key]
+    ]
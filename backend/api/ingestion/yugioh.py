@@ -0,0 +1,244 @@
+from django.db import connection, transaction
+from .copy import StagingTable, quote
+from .hashing import split_unchanged, with_content_hash
+from .history import StagedPriceHistory, record_price_history
+from .price_changes import record_price_changes, record_staged_price_changes
+from .prices import price_value, stored_market_prices, with_market_prices
+from .stats import WriteStats
+from ..models import YugiohCard, CardSet, CardImage, CardPrice
+
+PRICE_COLUMNS = ['cardmarket_price', 'tcgplayer_price', 'ebay_price', 'amazon_price', 'coolstuffinc_price']
+CARD_UPDATE_FIELDS = ['name', 'card_type', 'frame_type', 'description', 'attack', 'defense', 'level', 'race', 'attribute', 'content_hash', 'market_price', 'price_updated_at']
+
+def build_card(card_data):
+    return YugiohCard(
+        id=card_data['id'],
+        name=card_data['name'],
+        card_type=card_data.get('type', ''),
+        frame_type=card_data.get('frameType', ''),
+        description=card_data.get('desc', ''),
+        attack=card_data.get('atk') or 0,
+        defense=card_data.get('def') or 0,
+        level=card_data.get('level') or 0,
+        race=card_data.get('race', ''),
+        attribute=card_data.get('attribute', '')
+    )
+
+def build_sets(card_data):
+    return [
+        CardSet(
+            yugioh_card_id=card_data['id'],
+            set_name=set_info['set_name'],
+            set_code=set_info['set_code'],
+            set_rarity=set_info['set_rarity'],
+            set_rarity_code=set_info['set_rarity_code'],
+            set_price=set_info['set_price']
+        )
+        for set_info in card_data.get('card_sets', [])
+    ]
+
+def build_images(card_data):
+    return [
+        CardImage(
+            yugioh_card_id=card_data['id'],
+            image_url=image_info['image_url'],
+            image_url_small=image_info['image_url_small'],
+            image_url_cropped=image_info['image_url_cropped']
+        )
+        for image_info in card_data.get('card_images', [])
+    ]
+
+def build_prices(card_data):
+    return [
+        CardPrice(
+            yugioh_card_id=card_data['id'],
+            **{column: price_value(price_info.get(column)) for column in PRICE_COLUMNS}
+        )
+        for price_info in card_data.get('card_prices', [])
+    ]
+
+@transaction.atomic
+def write_chunk(cards_data):
+    """
+    Write a chunk of ygoprodeck cards, skipping cards whose payload hash is unchanged.
+    New and changed cards are upserted in one statement, and their set, image and
+    price rows are replaced with bulk deletes and inserts. Returns WriteStats.
+    """
+    pending, hashes, stats = split_unchanged(YugiohCard, cards_data, key=lambda card_data: card_data['id'])
+    if not pending:
+        return stats
+
+    cards = []
+    for card_data in pending.values():
+        card = build_card(card_data)
+        card.content_hash = hashes[card.id]
+        cards.append(card)
+    with_market_prices('yugioh', cards, pending.values())
+    record_price_changes('yugioh', cards)
+    YugiohCard.objects.bulk_create(
+        cards,
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=CARD_UPDATE_FIELDS,
+    )
+    record_price_history('yugioh', cards, pending.values())
+
+    card_ids = list(pending.keys())
+    for model in (CardSet, CardImage, CardPrice):
+        model.objects.filter(yugioh_card_id__in=card_ids).delete()
+    CardSet.objects.bulk_create([row for card_data in pending.values() for row in build_sets(card_data)])
+    CardImage.objects.bulk_create([row for card_data in pending.values() for row in build_images(card_data)])
+    CardPrice.objects.bulk_create([row for card_data in pending.values() for row in build_prices(card_data)])
+
+    return stats
+
+def price_rows(cards_data):
+    # ygoprodeck sends a one-element card_prices list; only the first entry is kept per card
+    rows = {}
+    for card_data in cards_data:
+        for price_info in card_data.get('card_prices', [])[:1]:
+            rows[card_data['id']] = CardPrice(
+                yugioh_card_id=card_data['id'],
+                **{column: price_value(price_info.get(column)) for column in PRICE_COLUMNS}
+            )
+    return list(rows.values())
+
+def market_price_rows(cards_data):
+    cards_data = list({card_data['id']: card_data for card_data in cards_data}.values())
+    return [
+        YugiohCard(id=card_data['id'], market_price=price)
+        for card_data, price in zip(cards_data, stored_market_prices('yugioh', cards_data))
+    ]
+
+def set_price_rows(cards_data):
+    return [
+        CardSet(
+            yugioh_card_id=card_data['id'],
+            set_code=set_info['set_code'],
+            set_rarity=set_info['set_rarity'],
+            set_price=set_info['set_price']
+        )
+        for card_data in cards_data
+        for set_info in card_data.get('card_sets', [])
+    ]
+
+def refresh_prices(cards_data):
+    """
+    Refresh CardPrice rows, CardSet.set_price and the stored market price for cards that already
+    exist, leaving every other column and table alone. The chunk is copied into temporary staging
+    tables and merged with one set-based UPDATE per table, touching only rows whose price actually
+    moved; existing cards without a price row get one. Cards whose prices moved get a point in the
+    price history, and the lists holding cards whose market price moved are revalued. Unknown cards are counted as
+    skipped. Returns WriteStats.
+    """
+    prices = StagingTable(CardPrice, ['yugioh_card', *PRICE_COLUMNS])
+    set_prices = StagingTable(CardSet, ['yugioh_card', 'set_code', 'set_rarity', 'set_price'])
+    market_prices = StagingTable(YugiohCard, ['id', 'market_price'])
+    tables = [prices, set_prices, market_prices]
+    staged = ', '.join(f'staged.{column}' for column in PRICE_COLUMNS)
+    records = {card_data['id']: card_data for card_data in cards_data}
+    market_rows = market_price_rows(cards_data)
+
+    with connection.cursor() as cursor:
+        for table in tables:
+            table.create(cursor)
+        try:
+            prices.copy(cursor, price_rows(cards_data))
+            set_prices.copy(cursor, set_price_rows(cards_data))
+            market_prices.copy(cursor, market_rows)
+
+            with transaction.atomic():
+                cursor.execute(f"""
+                    UPDATE {quote(prices.target)} AS price
+                    SET {', '.join(f'{column} = staged.{column}' for column in PRICE_COLUMNS)}
+                    FROM {quote(prices.name)} AS staged
+                    WHERE price.yugioh_card_id = staged.yugioh_card_id
+                      AND ({', '.join(f'price.{column}' for column in PRICE_COLUMNS)}) IS DISTINCT FROM ({staged})
+                    RETURNING price.yugioh_card_id
+                """)
+                changed = {row[0] for row in cursor.fetchall()}
+
+                cursor.execute(f"""
+                    INSERT INTO {quote(prices.target)} (yugioh_card_id, {', '.join(PRICE_COLUMNS)})
+                    SELECT staged.yugioh_card_id, {staged}
+                    FROM {quote(prices.name)} AS staged
+                    JOIN {quote(market_prices.target)} AS card ON card.id = staged.yugioh_card_id
+                    WHERE NOT EXISTS (SELECT 1 FROM {quote(prices.target)} AS price WHERE price.yugioh_card_id = staged.yugioh_card_id)
+                    RETURNING yugioh_card_id
+                """)
+                changed.update(row[0] for row in cursor.fetchall())
+
+                cursor.execute(f"""
+                    UPDATE {quote(set_prices.target)} AS card_set
+                    SET set_price = staged.set_price
+                    FROM {quote(set_prices.name)} AS staged
+                    WHERE card_set.yugioh_card_id = staged.yugioh_card_id
+                      AND card_set.set_code = staged.set_code
+                      AND card_set.set_rarity = staged.set_rarity
+                      AND card_set.set_price IS DISTINCT FROM staged.set_price
+                    RETURNING card_set.yugioh_card_id
+                """)
+                changed.update(row[0] for row in cursor.fetchall())
+
+                record_staged_price_changes(cursor, 'yugioh', market_prices)
+                cursor.execute(f"""
+                    UPDATE {quote(market_prices.target)} AS card
+                    SET market_price = staged.market_price, price_updated_at = now()
+                    FROM {quote(market_prices.name)} AS staged
+                    WHERE card.id = staged.id
+                      AND card.market_price IS DISTINCT FROM staged.market_price
+                    RETURNING card.id
+                """)
+                changed.update(row[0] for row in cursor.fetchall())
+
+                moved = [card for card in market_rows if card.id in changed]
+                record_price_history('yugioh', moved, [records[card.id] for card in moved])
+        finally:
+            for table in tables:
+                table.drop(cursor)
+
+    card_ids = set(records)
+    known = set(YugiohCard.objects.filter(id__in=card_ids).values_list('id', flat=True))
+    return WriteStats(changed=len(changed), unchanged=len(known - changed), skipped=len(card_ids - known))
+
+def copy_load(batches):
+    """
+    Load whole batches of ygoprodeck cards through COPY into temporary staging tables, then
+    merge cards with one INSERT ... ON CONFLICT and replace the set, image and price rows of
+    new and changed cards with one DELETE and one INSERT per table. Meant for cold starts
+    and rebuilds; returns WriteStats.
+    """
+    cards = StagingTable(YugiohCard, ['id', *CARD_UPDATE_FIELDS])
+    children = [
+        StagingTable(CardSet, ['yugioh_card', 'set_name', 'set_code', 'set_rarity', 'set_rarity_code', 'set_price']),
+        StagingTable(CardImage, ['yugioh_card', 'image_url', 'image_url_small', 'image_url_cropped']),
+        StagingTable(CardPrice, ['yugioh_card', *PRICE_COLUMNS]),
+    ]
+    builders = [build_sets, build_images, build_prices]
+    history = StagedPriceHistory('yugioh')
+    tables = [cards, *children, history]
+
+    with connection.cursor() as cursor:
+        for table in tables:
+            table.create(cursor)
+        try:
+            for batch in batches:
+                cards_data = {card_data['id']: card_data for card_data in batch.records}.values()
+                rows = with_market_prices('yugioh', [with_content_hash(build_card(card_data), card_data) for card_data in cards_data], cards_data)
+                cards.copy(cursor, rows)
+                history.copy(cursor, rows, cards_data)
+                for table, build in zip(children, builders):
+                    table.copy(cursor, (row for card_data in cards_data for row in build(card_data)))
+
+            with transaction.atomic():
+                unchanged = cards.discard_unchanged(cursor)
+                record_staged_price_changes(cursor, 'yugioh', cards)
+                inserted, changed = cards.upsert(cursor, ['id'], CARD_UPDATE_FIELDS)
+                for table in children:
+                    table.replace_children(cursor, 'yugioh_card', cards)
+                history.merge(cursor)
+        finally:
+            for table in tables:
+                table.drop(cursor)
+
+    return WriteStats(inserted=inserted, changed=changed, unchanged=unchanged)
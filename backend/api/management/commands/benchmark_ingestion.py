@@ -0,0 +1,58 @@
+import tracemalloc
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from api.ingestion.pipeline import game_writer, run_pipeline, DatabaseSink
+from api.ingestion.sources import FixtureSource
+
+GAMES = ['pokemon', 'yugioh', 'mtg', 'lorcana']
+
+class Command(BaseCommand):
+    help = 'Replay recorded ingestion fixtures and report throughput, statement counts and peak memory per game'
+
+    def add_arguments(self, parser):
+        parser.add_argument('games', nargs='*', help=f"Games to benchmark (default: every game with a fixture): {', '.join(GAMES)}")
+        parser.add_argument('--fixtures-dir', default=Path(settings.INGESTION_CACHE_DIR) / 'fixtures', help='Directory holding <game>.jsonl.gz fixtures recorded with --record')
+        parser.add_argument('--keep', action='store_true', help='Commit the loaded rows instead of rolling them back')
+
+    def handle(self, *args, **options):
+        fixtures_dir = Path(options['fixtures_dir'])
+        games = options['games'] or [game for game in GAMES if (fixtures_dir / f'{game}.jsonl.gz').exists()]
+        if not games:
+            raise CommandError(f'No fixtures found in {fixtures_dir}; record some with the --record option of the catalog commands')
+
+        for game in games:
+            if game not in GAMES:
+                raise CommandError(f'Unknown game: {game}')
+            path = fixtures_dir / f'{game}.jsonl.gz'
+            if not path.exists():
+                raise CommandError(f'Missing fixture {path}')
+            metrics, statements, peak = self.benchmark(game, path, options['keep'])
+            self.stdout.write(
+                f'{game}: {metrics.rows} rows in {metrics.batches} batches, {metrics.rows_per_second:.0f} rows/s, '
+                f'{statements} statements, peak {peak / (1024 * 1024):.1f} MiB ({metrics.stats})'
+            )
+
+    def benchmark(self, game, path, keep=False):
+        """
+        Load one fixture inside a transaction, counting statements with an execute wrapper
+        and tracing Python allocations for the peak. The rows are rolled back unless `keep` is set.
+        """
+        statements = 0
+
+        def count_statement(execute, sql, params, many, context):
+            nonlocal statements
+            statements += 1
+            return execute(sql, params, many, context)
+
+        tracemalloc.start()
+        try:
+            with connection.execute_wrapper(count_statement), transaction.atomic():
+                metrics = run_pipeline(FixtureSource(path), DatabaseSink(game_writer(game)))
+                if not keep:
+                    transaction.set_rollback(True)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return metrics, statements, peak
@@ -1,63 +1,57 @@
 from django.core.management.base import BaseCommand, CommandError
-from backend.api.models import YugiohCard, CardSet, CardImage, CardPrice
+from api.ingestion.archive import RunArchive
+from api.ingestion.http import build_session, http_cache_dir, is_unchanged, mark_ingested
+from api.ingestion.pipeline import game_writer, run_pipeline, DatabaseSink
+from api.ingestion.sources import FileSource, FixtureSource, StreamSource, recorded
+from api.ingestion.upstream import YUGIOH_URL
+from api.ingestion.yugioh import refresh_prices
 import requests
 
 class Command(BaseCommand):
     help = 'Updates the Yugioh cards in the database'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help='Read a saved cardinfo.php dump instead of downloading it')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Cards written per batch')
+        parser.add_argument('--prices-only', action='store_true', help='Only refresh CardPrice rows and set prices of existing cards')
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the conditional-request HTTP cache and refetch everything')
+        parser.add_argument('--no-archive', action='store_true', help='Do not save the raw cards of this run to the payload archive')
+        parser.add_argument('--record', help='Also save the fetched batches to this gzip fixture file')
+        parser.add_argument('--replay', help='Load a fixture saved with --record instead of fetching')
+
     def handle(self, *args, **options):
+        self.write = refresh_prices if options['prices_only'] else game_writer('yugioh')
+        self.record = options['record']
         try:
-            url = 'https://db.ygoprodeck.com/api/v7/cardinfo.php'
-            response = requests.get(url)
-            response.raise_for_status()
-            cards_data = response.json().get('data', [])
-
-            for card_data in cards_data:
-                yugioh_card, created = YugiohCard.objects.get_or_create(
-                    id=card_data['id'],
-                    defaults={
-                        'name': card_data['name'],
-                        'card_type': card_data.get('type', ''),
-                        'frame_type': card_data.get('race', ''),
-                        'description': card_data.get('desc', ''),
-                        'attack': card_data.get('atk', 0),
-                        'defense': card_data.get('def', 0),
-                        'level': card_data.get('level', 0),
-                        'race': card_data.get('race', ''),
-                        'attribute': card_data.get('attribute', '')
-                    }
-                )
-
-                if created:
-                    for set_info in card_data.get('card_sets', []):
-                        CardSet.objects.create(
-                            yugioh_card=yugioh_card,
-                            set_name=set_info['set_name'],
-                            set_code=set_info['set_code'],
-                            set_rarity=set_info['set_rarity'],
-                            set_rarity_code=set_info['set_rarity_code'],
-                            set_price=set_info['set_price']
-                        )
-
-                    for image_info in card_data.get('card_images', []):
-                        CardImage.objects.create(
-                            yugioh_card=yugioh_card,
-                            image_url=image_info['image_url'],
-                            image_url_small=image_info['image_url_small'],
-                            image_url_cropped=image_info['image_url_cropped']
-                        )
-
-                    for price_info in card_data.get('card_prices', []):
-                        CardPrice.objects.create(
-                            yugioh_card=yugioh_card,
-                            cardmarket_price=price_info.get('cardmarket_price', ''),
-                            tcgplayer_price=price_info.get('tcgplayer_price', ''),
-                            ebay_price=price_info.get('ebay_price', ''),
-                            amazon_price=price_info.get('amazon_price', ''),
-                            coolstuffinc_price=price_info.get('coolstuffinc_price', '')
-                        )
-
-            self.stdout.write(self.style.SUCCESS('Successfully updated Yugioh cards'))
+            if options['replay']:
+                metrics = self.ingest(FixtureSource(options['replay']))
+            elif options['file']:
+                metrics = self.ingest(FileSource(options['file'], key='data', batch_size=options['chunk_size']))
+            else:
+                with build_session(cache_dir=None if options['no_cache'] else http_cache_dir()) as session, \
+                        session.get(YUGIOH_URL, stream=True) as response:
+                    response.raise_for_status()
+                    if is_unchanged(response):
+                        self.stdout.write(self.style.SUCCESS('Yugioh cards unchanged upstream since the last sync'))
+                        return
+                    # Let urllib3 undo any gzip transfer encoding while we stream the body
+                    response.raw.decode_content = True
+                    # Price-only runs still download the whole payload, so they archive a full run too
+                    with RunArchive('yugioh', enabled=not options['no_archive']) as archive:
+                        metrics = self.ingest(archive.record(StreamSource(response.raw, key='data', batch_size=options['chunk_size'])))
+                    # A price-only run skips card fields, so only a full run may short-circuit the next one
+                    if not options['prices_only']:
+                        mark_ingested(session, response)
+
+            self.stdout.write(self.style.SUCCESS(f'Successfully updated Yugioh cards ({metrics})'))
 
         except requests.RequestException as e:
-            raise CommandError(f'Error updating cards: {e}')
\ No newline at end of file
+            raise CommandError(f'Error updating cards: {e}')
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Error reading card data: {e}')
+
+    def ingest(self, source):
+        """
+        Stream the `data` array and write it in fixed-size chunks so only one chunk is held in memory.
+        """
+        return run_pipeline(recorded(source, self.record), DatabaseSink(self.write))
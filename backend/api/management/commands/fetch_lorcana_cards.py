@@ -1,42 +1,40 @@
 from django.core.management.base import BaseCommand, CommandError
 import requests
-from backend.api.models import LorcanaCardData
+from api.ingestion.archive import RunArchive
+from api.ingestion.http import build_session, http_cache_dir, is_unchanged, mark_ingested
+from api.ingestion.pipeline import game_writer, run_pipeline, DatabaseSink
+from api.ingestion.sources import FixtureSource, StreamSource, recorded
+from api.ingestion.upstream import LORCANA_URL
 
 class Command(BaseCommand):
     help = 'Fetches and updates Lorcana cards in the database'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Cards written per upsert')
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the conditional-request HTTP cache and refetch everything')
+        parser.add_argument('--no-archive', action='store_true', help='Do not save the raw cards of this run to the payload archive')
+        parser.add_argument('--record', help='Also save the fetched batches to this gzip fixture file')
+        parser.add_argument('--replay', help='Load a fixture saved with --record instead of fetching')
+
     def handle(self, *args, **options):
         try:
-            url = 'https://api.lorcana-api.com/cards/fetch'
-            response = requests.get(url)
-            response.raise_for_status()
-            cards_data = response.json()
-            print(card_data)
-
-            for card_data in cards_data:
-                lorcana_card, created = LorcanaCardData.objects.get_or_create(
-                    name=card_data['Name'],
-                    defaults={
-                        'artist': card_data['Artist'],
-                        'set_name': card_data['Set_Name'],
-                        'set_num': card_data['Set_Num'],
-                        'color': card_data['Color'],
-                        'image': card_data['Image'],
-                        'cost': card_data['Cost'],
-                        'inkable': card_data['Inkable'],
-                        'type': card_data['Type'],
-                        'rarity': card_data['Rarity'],
-                        'flavor_text': card_data.get('Flavor_Text', ''),
-                        'card_num': card_data['Card_Num'],
-                        'body_text': card_data.get('Body_Text', ''),
-                        'set_id': card_data['Set_ID']
-                    }
-                )
-
-                if created:
-                    self.stdout.write(self.style.SUCCESS(f'Added new card: {lorcana_card.name}'))
-                else:
-                    self.stdout.write(f'Card already exists: {lorcana_card.name}')
+            if options['replay']:
+                metrics = run_pipeline(FixtureSource(options['replay']), DatabaseSink(game_writer('lorcana')))
+            else:
+                with build_session(cache_dir=None if options['no_cache'] else http_cache_dir()) as session, \
+                        session.get(LORCANA_URL, stream=True) as response:
+                    response.raise_for_status()
+                    if is_unchanged(response):
+                        self.stdout.write(self.style.SUCCESS('Lorcana cards unchanged upstream since the last sync'))
+                        return
+                    response.raw.decode_content = True
+                    with RunArchive('lorcana', enabled=not options['no_archive']) as archive:
+                        source = recorded(archive.record(StreamSource(response.raw, batch_size=options['batch_size'])), options['record'])
+                        metrics = run_pipeline(source, DatabaseSink(game_writer('lorcana')))
+                    mark_ingested(session, response)
+            self.stdout.write(self.style.SUCCESS(f'Successfully updated Lorcana cards ({metrics})'))
 
         except requests.RequestException as e:
             raise CommandError(f'Error fetching Lorcana cards: {e}')
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Error reading Lorcana cards: {e}')
@@ -0,0 +1,92 @@
+import time
+from functools import partial
+from django.core.management.base import BaseCommand, CommandError
+import requests
+from api.ingestion import mtg, pokemon, yugioh
+from api.ingestion.http import build_session, http_cache_dir, PageFetchError
+from api.ingestion.price_changes import record_rebuilt_price_changes
+from api.ingestion.shadow import ShadowCatalog
+from api.ingestion.sources import FileSource, FixtureSource, HttpPageSource, StreamSource
+from api.ingestion.upstream import POKEMON_CARDS_URL, SCRYFALL_HEADERS, YUGIOH_URL, download_bulk_file, pokemon_headers
+from api.ingestion.watermarks import save_watermarks
+from api.models import (
+    PokemonCardSet, PokemonCardData, PokemonTcgplayer, PokemonCardmarket,
+    YugiohCard, CardSet, CardImage, CardPrice, MTGCardsData, MTGCardFace, MTGRelatedCard
+)
+from api.pricing import card_model
+
+LOADERS = {
+    'pokemon': pokemon.copy_load,
+    'yugioh': yugioh.copy_load,
+    'mtg': mtg.copy_load,
+}
+# Tables rebuilt by --swap; shared lookup rows (abilities, attacks, weaknesses) stay live
+SWAP_MODELS = {
+    'pokemon': [
+        PokemonCardSet, PokemonTcgplayer, PokemonCardmarket, PokemonCardData,
+        PokemonCardData.abilities.through, PokemonCardData.attacks.through, PokemonCardData.weaknesses.through,
+    ],
+    'yugioh': [YugiohCard, CardSet, CardImage, CardPrice],
+    'mtg': [MTGCardsData, MTGCardFace, MTGRelatedCard, MTGCardsData.all_parts.through],
+}
+# Where the card array sits in a saved dump of each API
+FILE_KEYS = {'pokemon': 'data', 'yugioh': 'data', 'mtg': None}
+
+class Command(BaseCommand):
+    help = 'Bulk load a whole card catalog with COPY into staging tables (for new environments and rebuilds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('game', choices=sorted(LOADERS))
+        parser.add_argument('--file', help='Load a saved JSON dump instead of downloading')
+        parser.add_argument('--replay', help='Load a fixture saved with --record')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Cards transformed and copied per batch')
+        parser.add_argument('--swap', action='store_true', help='Build the catalog in shadow tables and swap them in atomically, so readers never see a half-loaded catalog')
+
+    def handle(self, *args, **options):
+        game = options['game']
+        started = time.monotonic()
+        try:
+            if options['swap']:
+                shadow = ShadowCatalog(SWAP_MODELS[game])
+                shadow.create()
+                try:
+                    with shadow.redirect():
+                        stats = self.load(game, options)
+                    # Lists holding cards whose price moved (or that are gone) follow the swap
+                    rebuilt = shadow.shadows[card_model(game)._meta.db_table]
+                    shadow.swap(before_swap=partial(record_rebuilt_price_changes, game=game, rebuilt=rebuilt))
+                finally:
+                    shadow.discard()
+            else:
+                stats = self.load(game, options)
+        except (PageFetchError, requests.RequestException) as e:
+            raise CommandError(f'Error fetching {game} cards: {e}')
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Error reading {game} cards: {e}')
+
+        if game == 'pokemon':
+            # Every set was just loaded, so incremental syncs can start from here
+            save_watermarks('pokemon', dict(PokemonCardSet.objects.values_list('id', 'updatedAt')))
+        self.stdout.write(self.style.SUCCESS(f'Loaded {game} catalog in {time.monotonic() - started:.1f}s ({stats})'))
+
+    def load(self, game, options):
+        if options['replay']:
+            return LOADERS[game](FixtureSource(options['replay']))
+        if options['file']:
+            return LOADERS[game](FileSource(options['file'], key=FILE_KEYS[game], batch_size=options['batch_size']))
+        return self.load_live(game, options['batch_size'])
+
+    def load_live(self, game, batch_size):
+        # The whole catalog is reloaded even when upstream reports it unchanged, and a --swap load
+        # isn't live until the swap, so responses are never marked ingested here
+        if game == 'mtg':
+            with build_session(SCRYFALL_HEADERS, pool_size=1, cache_dir=http_cache_dir()) as session:
+                path = download_bulk_file(session, 'default_cards')
+            return mtg.copy_load(FileSource(path, batch_size=batch_size))
+        if game == 'yugioh':
+            with build_session(cache_dir=http_cache_dir()) as session, session.get(YUGIOH_URL, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                return yugioh.copy_load(StreamSource(response.raw, key='data', batch_size=batch_size))
+        with build_session(pokemon_headers(), cache_dir=http_cache_dir()) as session:
+            return pokemon.copy_load(HttpPageSource(session, POKEMON_CARDS_URL))
@@ -0,0 +1,50 @@
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from api.ingestion.archive import archive_runs
+from api.ingestion.hashing import rewriting
+from api.ingestion.pipeline import game_writer, run_pipeline, DatabaseSink, IngestionMetrics
+from api.ingestion.shards import GAMES
+from api.ingestion.sources import FixtureSource
+
+LATEST = 'latest'
+
+class Command(BaseCommand):
+    help = 'Rebuild a card catalog offline by replaying archived upstream payloads through the normal write path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('game', choices=GAMES)
+        parser.add_argument(
+            '--from-archive', nargs='?', const=LATEST, required=True, metavar='FILE',
+            help='Replay this archive file; without one, replay the latest full run and every partial run after it',
+        )
+        parser.add_argument(
+            '--rewrite', action='store_true',
+            help='Rewrite every archived card, even when its payload hashes the same as the stored row (e.g. after a transform fix)',
+        )
+
+    def handle(self, *args, **options):
+        game = options['game']
+        if options['from_archive'] == LATEST:
+            runs = archive_runs(game)
+            if not runs:
+                raise CommandError(f'No archived {game} runs to rebuild from')
+        else:
+            runs = [Path(options['from_archive'])]
+
+        started = time.monotonic()
+        # One writer for the whole rebuild, so Pokemon lookup rows stay interned across runs
+        write = game_writer(game)
+        metrics = IngestionMetrics()
+        try:
+            with rewriting() if options['rewrite'] else nullcontext():
+                for path in runs:
+                    self.stdout.write(f'Replaying {path.name}')
+                    metrics += run_pipeline(FixtureSource(path), DatabaseSink(write))
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Error reading archive {path}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {game} catalog from {len(runs)} archived runs in {time.monotonic() - started:.1f}s ({metrics})'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from api.ingestion.shards import GAMES
+from api.tasks import refresh_catalogs
+
+class Command(BaseCommand):
+    help = 'Queue a catalog refresh that is sharded across the Celery workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('games', nargs='*', choices=GAMES, help='Games to refresh (default: all)')
+        parser.add_argument('--incremental', action='store_true', help='Only refresh Pokemon sets whose updatedAt moved since the last sync')
+        parser.add_argument('--shard-size', type=int, help='Yu-Gi-Oh! cards or MTG search pages per shard')
+
+    def handle(self, *args, **options):
+        result = refresh_catalogs.delay(options['games'] or None, options['incremental'], options['shard_size'])
+        self.stdout.write(self.style.SUCCESS(f'Queued catalog refresh (task {result.id})'))
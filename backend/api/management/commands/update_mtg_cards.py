@@ -1,95 +1,85 @@
-from django.core.management.base import BaseCommand
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
 import requests
-from django.db import transaction
-from django.http import JsonResponse
-from backend.api.models import MTGCardFace, MTGCardsData, MTGRelatedCard
+from api.ingestion.archive import RunArchive, FULL, PARTIAL
+from api.ingestion.checkpoints import start_checkpoint
+from api.ingestion.http import build_session, http_cache_dir, is_unchanged, mark_ingested
+from api.ingestion.pipeline import game_writer, run_pipeline, DatabaseSink
+from api.ingestion.sources import FileSource, FixtureSource, HttpNextPageSource, recorded
+from api.ingestion.upstream import MTG_BULK_DATA_URL, MTG_SEARCH_URL, SCRYFALL_HEADERS, download_bulk_file
+SOURCE = 'mtg'
 
 class Command(BaseCommand):
-    help = 'Updates the Yugioh cards in the database'
+    help = 'Updates the MTG cards in the database'
 
-    def handle(self, *args, **options):
-        base_url = 'https://api.scryfall.com/cards/search'
-        page = 1
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk-file', help='Load a downloaded Scryfall bulk-data JSON file instead of paging the search API')
+        parser.add_argument('--bulk-type', help='Download (or reuse a cached copy of) this Scryfall bulk-data file, e.g. default_cards')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Cards written per batch in bulk-file mode')
+        parser.add_argument('--resume', action='store_true', help='Continue an interrupted sync from its last committed batch')
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the conditional-request HTTP cache and refetch everything')
+        parser.add_argument('--no-archive', action='store_true', help='Do not save the raw cards of this run to the payload archive')
+        parser.add_argument('--record', help='Also save the fetched batches to this gzip fixture file')
+        parser.add_argument('--replay', help='Load a fixture saved with --record instead of fetching')
 
+    def handle(self, *args, **options):
+        self.options = options
         try:
-            while True:
-                url = f'{base_url}?q=&page={page}'
-                response = requests.get(url)
-                response.raise_for_status()
-                data = response.json()
+            if options['replay']:
+                metrics = run_pipeline(FixtureSource(options['replay']), DatabaseSink(game_writer(SOURCE)), self.progress)
+            elif options['bulk_file']:
+                metrics = self.load_bulk_file(Path(options['bulk_file']), options['batch_size'], options['resume'])
+            elif options['bulk_type']:
+                with self.session() as session:
+                    metadata = session.get(f"{MTG_BULK_DATA_URL}/{options['bulk_type']}")
+                    metadata.raise_for_status()
+                    if is_unchanged(metadata):
+                        self.stdout.write(self.style.SUCCESS('MTG bulk data unchanged upstream since the last sync'))
+                        return
+                    path = download_bulk_file(session, options['bulk_type'], metadata.json()['download_uri'])
+                    with self.archive(PARTIAL if options['resume'] else FULL) as archive:
+                        metrics = self.load_bulk_file(path, options['batch_size'], options['resume'], archive)
+                    mark_ingested(session, metadata)
+            else:
+                metrics = self.load_search_pages(options['resume'])
+        except requests.RequestException as e:
+            raise CommandError(f'Error fetching MTG cards: {e}')
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Error reading MTG bulk data: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully updated MTG cards ({metrics})'))
+
+    def session(self):
+        return build_session(SCRYFALL_HEADERS, pool_size=1, cache_dir=None if self.options['no_cache'] else http_cache_dir())
 
-                with transaction.atomic():
-                    for card_data in data.get('data', []):
-                        defaults = {
-                            'oracle_id': card_data.get('oracle_id'),
-                            'name': card_data['name'],
-                            'lang': card_data.get('lang', 'en'),
-                            'released_at': card_data.get('released_at'),
-                            'uri': card_data['uri'],
-                            'layout': card_data.get('layout'),
-                            'image_uris': card_data.get('image_uris', {}),
-                            'cmc': card_data.get('cmc', 0),
-                            'type_line': card_data.get('type_line'),
-                            'color_identity': card_data.get('color_identity', []),
-                            'keywords': card_data.get('keywords', []),
-                            'legalities': card_data.get('legalities', {}),
-                            'games': card_data.get('games', []),
-                            'set': card_data.get('set'),
-                            'set_name': card_data.get('set_name'),
-                            'set_type': card_data.get('set_type'),
-                            'rarity': card_data.get('rarity'),
-                            'artist': card_data.get('artist'),
-                            'prices': card_data.get('prices', {}),
-                            'related_uris': card_data.get('related_uris', {}),
-                        }
-                        card, _ = MTGCardsData.objects.update_or_create(
-                            id=card_data['id'],
-                            defaults=defaults
-                        )
+    def archive(self, kind):
+        return RunArchive(SOURCE, kind, enabled=not self.options['no_archive'])
 
-                        if 'card_faces' in card_data:
-                            for face_data in card_data['card_faces']:
-                                face_id = face_data.get('id')
-                                if not face_id:
-                                    continue
-                                face, _ = MTGCardFace.objects.update_or_create(
-                                    card=card,
-                                    name=face_data['name'],
-                                    defaults={
-                                        'mana_cost': face_data.get('mana_cost', ''),
-                                        'type_line': face_data.get('type_line', ''),
-                                        'oracle_text': face_data.get('oracle_text', ''),
-                                        'colors': face_data.get('colors', []),
-                                        'power': face_data.get('power', ''),
-                                        'toughness': face_data.get('toughness', ''),
-                                        'artist': face_data.get('artist', ''),
-                                        'image_uris': face_data.get('image_uris', {}),
-                                    }
-                                )
-                                card.card_faces.add(face)
+    def progress(self, batch, metrics):
+        self.stdout.write(f'{batch.label}: {metrics.rows} cards processed')
 
-                        if 'all_parts' in card_data:
-                            for part_data in card_data['all_parts']:
-                                part, _ = MTGRelatedCard.objects.update_or_create(
-                                    id=part_data['id'],
-                                    defaults={
-                                        'component': part_data.get('component', ''),
-                                        'name': part_data['name'],
-                                        'type_line': part_data.get('type_line', ''),
-                                        'uri': part_data.get('uri', '')
-                                    }
-                                )
-                                card.all_parts.add(part)
+    def load_bulk_file(self, path, batch_size, resume=False, archive=None):
+        """
+        Stream a bulk-data array through a read-only memory map and write it in large batches.
+        The checkpoint counts committed items, so a resumed run parses past them without writing.
+        Downloaded exports are archived; a --bulk-file given by hand already is its own copy.
+        """
+        checkpoint = start_checkpoint(SOURCE, {'mode': 'bulk', 'file': Path(path).name}, resume=resume)
+        if checkpoint.cursor.get('items'):
+            self.stdout.write(f"Resuming from batch {checkpoint.batch_id}: skipping {checkpoint.cursor['items']} committed cards")
 
-                if not data.get('has_more'):
-                    break
-                page += 1
+        source = FileSource(path, batch_size=batch_size, cursor=checkpoint.cursor)
+        if archive is not None:
+            source = archive.record(source)
+        source = recorded(source, self.options['record'])
+        return run_pipeline(source, DatabaseSink(game_writer(SOURCE), checkpoint), self.progress)
 
-            return JsonResponse({'message': 'Cards fetched successfully'}, status=200)
+    def load_search_pages(self, resume=False):
+        checkpoint = start_checkpoint(SOURCE, {'mode': 'search'}, resume=resume)
+        if checkpoint.cursor.get('page', 1) > 1:
+            self.stdout.write(f"Resuming from batch {checkpoint.batch_id}: starting at page {checkpoint.cursor['page']}")
 
-        except requests.HTTPError as http_err:
-            return JsonResponse({'error': str(http_err)}, status=http_err.response.status_code)
-        except requests.RequestException as req_err:
-            return JsonResponse({'error': str(req_err)}, status=500)
-        except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        with self.session() as session, self.archive(PARTIAL if checkpoint.cursor.get('page', 1) > 1 else FULL) as archive:
+            source = HttpNextPageSource(session, MTG_SEARCH_URL, params={'q': ''}, cursor=checkpoint.cursor)
+            source = recorded(archive.record(source), self.options['record'])
+            return run_pipeline(source, DatabaseSink(game_writer(SOURCE), checkpoint), self.progress)
@@ -1,156 +1,97 @@
-from django.utils import timezone
-import datetime
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from api.models import (
-    PokemonCardData, PokemonAttack, PokemonWeakness, PokemonCardSet,
-    PokemonAbility, PokemonTcgplayer, PokemonCardmarket
+from django.core.management.base import BaseCommand, CommandError
+from api.ingestion.archive import RunArchive, FULL, PARTIAL
+from api.ingestion.checkpoints import start_checkpoint
+from api.ingestion.http import build_session, http_cache_dir, PageFetchError
+from api.ingestion.pipeline import game_writer, run_pipeline, DatabaseSink, IngestionMetrics
+from api.ingestion.sources import HttpPageSource, FixtureSource, recorded
+from api.ingestion.upstream import (
+    POKEMON_CARDS_URL, POKEMON_SETS_URL, changed_pokemon_sets, pokemon_headers, pokemon_set_params,
+    pokemon_set_updates, sync_pokemon_set,
 )
+from api.ingestion.watermarks import save_watermarks
+from api.models import PokemonCardSet
 import requests
-from pathlib import Path
-from decouple import Config, RepositoryEnv
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
-env_file = BASE_DIR / '.env'
-config = Config(RepositoryEnv(env_file))
-
-# Helper function to convert date format
-def convert_date_format(date_str, is_datetime=False):
-    if date_str:
-        try:
-            if is_datetime:
-                aware_datetime = timezone.make_aware(
-                    datetime.datetime.strptime(date_str, '%Y/%m/%d %H:%M:%S'),
-                    timezone.get_default_timezone()
-                )
-                return aware_datetime.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                return datetime.datetime.strptime(date_str, '%Y/%m/%d').strftime('%Y-%m-%d')
-        except ValueError:
-            return None
-    return None
+SOURCE = 'pokemon'
 
 class Command(BaseCommand):
     help = 'Fetch and update Pokemon card data from the API'
 
-    def handle(self, *args, **options):
-        api_url = "https://api.pokemontcg.io/v2/cards"
-        headers = {'X-Api-Key': config('REACT_APP_POKEMON_TCG_API_KEY')}
-        page = 1
-        cards_per_page = 250
-
-        while True:
-            params = {'page': page, 'pageSize': cards_per_page}
-            response = requests.get(api_url, headers=headers, params=params)
-            if response.status_code != 200:
-                self.stdout.write(self.style.ERROR('Failed to fetch data from the API'))
-                break
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=250, help='Cards requested per API page; each page is written as one batch')
+        parser.add_argument('--workers', type=int, default=4, help='Pages fetched concurrently')
+        parser.add_argument('--rate', type=float, default=4.0, help='Maximum API requests per second')
+        parser.add_argument('--incremental', action='store_true', help='Only refetch cards of sets whose updatedAt moved since the last sync')
+        parser.add_argument('--resume', action='store_true', help='Continue an interrupted full sync from its last committed page')
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the conditional-request HTTP cache and refetch everything')
+        parser.add_argument('--no-archive', action='store_true', help='Do not save the raw pages of this run to the payload archive')
+        parser.add_argument('--record', help='Also save the fetched batches to this gzip fixture file')
+        parser.add_argument('--replay', help='Load a fixture saved with --record instead of fetching')
 
-            data = response.json()
-            for card_data in data.get('data', []):
-                with transaction.atomic():
-                    card_set_data = card_data.get('set', {})
-                    card_set, _ = PokemonCardSet.objects.update_or_create(
-                        id=card_set_data.get('id', ''),
-                        defaults={
-                            'name': card_set_data.get('name', ''),
-                            'series': card_set_data.get('series', ''),
-                            'printedTotal': card_set_data.get('printedTotal', 0),
-                            'total': card_set_data.get('total', 0),
-                            'legalities': card_set_data.get('legalities', {}),
-                            'ptcgoCode': card_set_data.get('ptcgoCode', ''),
-                            'releaseDate': convert_date_format(card_set_data.get('releaseDate', '')),
-                            'updatedAt': convert_date_format(card_set_data.get('updatedAt', ''), is_datetime=True),
-                            'images': card_set_data.get('images', {})
-                        }
-                    )
+    def handle(self, *args, **options):
+        self.options = options
+        self.session = build_session(pokemon_headers(), pool_size=options['workers'], cache_dir=None if options['no_cache'] else http_cache_dir())
+        # One writer per run, so abilities, attacks and weaknesses stay interned across pages
+        self.write = game_writer(SOURCE)
 
-                    tcgplayer_data = card_data.get('tcgplayer', {})
-                    if tcgplayer_data:
-                        tcgplayer, _ = PokemonTcgplayer.objects.update_or_create(
-                            url=tcgplayer_data.get('url', ''),
-                            defaults={
-                                'updatedAt': convert_date_format(tcgplayer_data.get('updatedAt', None), is_datetime=True),
-                                'prices': tcgplayer_data.get('prices', {})
-                            }
-                        )
-                    else:
-                        tcgplayer = None
+        try:
+            if options['replay']:
+                metrics = run_pipeline(FixtureSource(options['replay']), DatabaseSink(self.write), self.progress)
+            elif options['incremental']:
+                metrics = self.sync_changed_sets()
+            else:
+                metrics = self.sync_all_pages(options['resume'])
+                # A full run refreshed every set, so later incremental runs can start from here
+                save_watermarks(SOURCE, dict(PokemonCardSet.objects.values_list('id', 'updatedAt')))
+        except (PageFetchError, requests.RequestException) as e:
+            raise CommandError(f'Failed to fetch data from the API: {e}')
+        finally:
+            self.session.close()
 
-                    cardmarket_data = card_data.get('cardmarket', {})
-                    if cardmarket_data:
-                        cardmarket, _ = PokemonCardmarket.objects.update_or_create(
-                            url=cardmarket_data.get('url', ''),
-                            defaults={
-                                'updatedAt': convert_date_format(tcgplayer_data.get('updatedAt', None), is_datetime=True),
-                                'prices': cardmarket_data.get('prices', {})
-                            }
-                        )
-                    else:
-                        cardmarket = None
+        self.stdout.write(self.style.SUCCESS(f'Successfully updated Pokemon cards ({metrics})'))
 
-                    card, created = PokemonCardData.objects.update_or_create(
-                        id=card_data['id'],
-                        defaults={
-                            'name': card_data.get('name', ''),
-                            'supertype': card_data.get('supertype', ''),
-                            'subtypes': card_data.get('subtypes', []),
-                            'level': card_data.get('level', ''),
-                            'hp': card_data.get('hp', ''),
-                            'types': card_data.get('types', []),
-                            'evolvesFrom': card_data.get('evolvesFrom', ''),
-                            'retreatCost': card_data.get('retreatCost', []),
-                            'convertedRetreatCost': card_data.get('convertedRetreatCost', 0),
-                            'number': card_data.get('number', ''),
-                            'artist': card_data.get('artist', ''),
-                            'rarity': card_data.get('rarity', ''),
-                            'flavorText': card_data.get('flavorText', ''),
-                            'nationalPokedexNumbers': card_data.get('nationalPokedexNumbers', []),
-                            'legalities': card_data.get('legalities', {}),
-                            'images': card_data.get('images', {}),
-                            'set': card_set,
-                            'rules': card_data.get('rules', []),
-                            'tcgplayer': tcgplayer,
-                            'cardmarket': cardmarket,
-                        }
-                    )
+    def source(self, url, params=None, cursor=None):
+        return HttpPageSource(
+            self.session,
+            url,
+            params=params,
+            cursor=cursor,
+            page_size=self.options['page_size'],
+            workers=self.options['workers'],
+            rate=self.options['rate'],
+        )
 
-                    abilities_data = card_data.get('abilities', [])
-                    for ability_data in abilities_data:
-                        ability, _ = PokemonAbility.objects.get_or_create(
-                            name=ability_data['name'],
-                            defaults={
-                                'text': ability_data.get('text', ''),
-                                'type': ability_data.get('type', '')
-                            }
-                        )
-                        card.abilities.add(ability)
+    def progress(self, batch, metrics):
+        self.stdout.write(f'{batch.label}: {metrics.rows} cards processed')
 
-                    attacks_data = card_data.get('attacks', [])
-                    for attack_data in attacks_data:
-                        attack, _ = PokemonAttack.objects.get_or_create(
-                            name=attack_data['name'],
-                            defaults={
-                                'cost': attack_data.get('cost', []),
-                                'convertedEnergyCost': attack_data.get('convertedEnergyCost', 0),
-                                'damage': attack_data.get('damage', ''),
-                                'text': attack_data.get('text', '')
-                            }
-                        )
-                        card.attacks.add(attack)
+    def sync_all_pages(self, resume):
+        """
+        Full sync that checkpoints every committed page, so --resume only fetches the pages still missing.
+        """
+        checkpoint = start_checkpoint(SOURCE, {'page_size': self.options['page_size']}, resume=resume)
+        if checkpoint.cursor.get('pages'):
+            self.stdout.write(f"Resuming from batch {checkpoint.batch_id}: {len(checkpoint.cursor['pages'])} pages already committed")
 
-                    weaknesses_data = card_data.get('weaknesses', [])
-                    for weakness_data in weaknesses_data:
-                        weakness, _ = PokemonWeakness.objects.get_or_create(
-                            type=weakness_data['type'],
-                            defaults={'value': weakness_data.get('value', '')}
-                        )
-                        card.weaknesses.add(weakness)
+        # A resumed run only fetches the missing pages, so its archive cannot stand in for the whole catalog
+        with self.archive(PARTIAL if checkpoint.cursor.get('pages') else FULL) as archive:
+            source = recorded(archive.record(self.source(POKEMON_CARDS_URL, cursor=checkpoint.cursor)), self.options['record'])
+            return run_pipeline(source, DatabaseSink(self.write, checkpoint), self.progress)
 
-                    card.save()
+    def archive(self, kind):
+        return RunArchive(SOURCE, kind, enabled=not self.options['no_archive'])
 
-            if page >= 100:
-                break
-            page += 1
+    def sync_changed_sets(self):
+        """
+        Fetch /sets, then pull cards only for sets that are new or whose updatedAt moved past the stored watermark.
+        """
+        upstream = pokemon_set_updates(self.source(POKEMON_SETS_URL))
+        changed = changed_pokemon_sets(upstream)
+        self.stdout.write(f'{len(changed)} of {len(upstream)} sets changed since the last sync')
 
-        self.stdout.write(self.style.SUCCESS('Successfully updated Pokemon cards'))
+        metrics = IngestionMetrics()
+        with self.archive(PARTIAL) as archive:
+            for set_id in changed:
+                self.stdout.write(f'Syncing set {set_id}')
+                source = self.source(POKEMON_CARDS_URL, pokemon_set_params(set_id))
+                metrics += sync_pokemon_set(source, set_id, upstream[set_id], self.write, archive, self.progress)
+        return metrics
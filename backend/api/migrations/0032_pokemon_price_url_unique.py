@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0031_listcard_card_type"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pokemoncardmarket",
+            name="url",
+            field=models.URLField(max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="pokemontcgplayer",
+            name="url",
+            field=models.URLField(max_length=255, unique=True),
+        ),
+    ]
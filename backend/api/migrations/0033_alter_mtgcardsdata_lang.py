@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0032_pokemon_price_url_unique"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="mtgcardsdata",
+            name="lang",
+            field=models.CharField(max_length=10),
+        ),
+    ]
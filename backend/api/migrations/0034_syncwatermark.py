@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0033_alter_mtgcardsdata_lang"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=50)),
+                ("key", models.CharField(max_length=100)),
+                ("watermark", models.DateTimeField()),
+                ("synced_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("source", "key"), name="unique_sync_watermark"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0034_syncwatermark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lorcanacarddata",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="mtgcardsdata",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="pokemoncarddata",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="yugiohcard",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
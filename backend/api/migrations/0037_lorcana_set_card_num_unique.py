@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:21
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_cards(apps, schema_editor):
+    # Cards were keyed by name before, so reprints could share a (set_id, card_num); keep the oldest row
+    LorcanaCardData = apps.get_model("api", "LorcanaCardData")
+    ListCard = apps.get_model("api", "ListCard")
+    duplicates = (
+        LorcanaCardData.objects.values("set_id", "card_num")
+        .annotate(rows=Count("id"), keep=Min("id"))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        extra = LorcanaCardData.objects.filter(
+            set_id=duplicate["set_id"], card_num=duplicate["card_num"]
+        ).exclude(id=duplicate["keep"])
+        ListCard.objects.filter(lorcana_card__in=extra).update(lorcana_card_id=duplicate["keep"])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0036_ingestioncheckpoint"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cards, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="lorcanacarddata",
+            constraint=models.UniqueConstraint(
+                fields=("set_id", "card_num"), name="unique_lorcana_set_card_num"
+            ),
+        ),
+    ]
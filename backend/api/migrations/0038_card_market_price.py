@@ -0,0 +1,153 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:39
+
+from decimal import Decimal, InvalidOperation
+from django.db import migrations, models
+from django.utils import timezone
+
+# The pricing rules as they stood when market_price was added, frozen here so later changes to
+# api.ingestion.prices don't change what this migration does
+CENT = Decimal("0.01")
+YUGIOH_PRICE_COLUMNS = ["cardmarket_price", "ebay_price", "amazon_price", "tcgplayer_price", "coolstuffinc_price"]
+# market_price is numeric(10, 2)
+MAX_STORED_PRICE = Decimal("99999999.99")
+
+
+def calculate_average_price(prices):
+    # Average of the prices left after an IQR outlier filter; 0.00 without usable prices
+    prices = sorted(Decimal(str(price)) for price in prices if price)
+    if not prices:
+        return Decimal("0.00")
+    mid_index = len(prices) // 2
+    q1 = prices[mid_index // 2] if len(prices) % 2 else (prices[mid_index // 2 - 1] + prices[mid_index // 2]) / 2
+    q3 = prices[-(mid_index // 2) - 1] if len(prices) % 2 else (prices[-(mid_index // 2) - 1] + prices[-(mid_index // 2)]) / 2
+    iqr = q3 - q1
+    lower_bound = q1 - (Decimal("1.5") * iqr)
+    upper_bound = q3 + (Decimal("1.5") * iqr)
+    filtered_prices = [price for price in prices if lower_bound <= price <= upper_bound]
+    try:
+        return sum(filtered_prices) / Decimal(len(filtered_prices))
+    except (InvalidOperation, ZeroDivisionError, TypeError):
+        return Decimal("0.00")
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value)) if value not in (None, "") else None
+    except InvalidOperation:
+        return None
+
+
+def pokemon_market_price(card):
+    price_values = []
+    tcgplayer_prices = card.tcgplayer.prices if card.tcgplayer else None
+    cardmarket_prices = card.cardmarket.prices if card.cardmarket else None
+    if tcgplayer_prices:
+        price_values.append(tcgplayer_prices.get("trendPrice", 0))
+        price_values.append(tcgplayer_prices.get("reverseHoloTrend", 0))
+    if cardmarket_prices:
+        price_values.append(cardmarket_prices.get("averageSellPrice", 0))
+    return calculate_average_price([price for price in map(to_decimal, price_values) if price is not None])
+
+
+def yugioh_market_price(card):
+    price_values = [
+        to_decimal(getattr(price, column))
+        for price in card.card_prices.all()
+        for column in YUGIOH_PRICE_COLUMNS
+    ]
+    return calculate_average_price([price for price in price_values if price])
+
+
+def mtg_market_price(card):
+    return to_decimal((card.prices or {}).get("usd")) or Decimal("0.00")
+
+
+def lorcana_market_price(card):
+    return to_decimal(card.cost) or Decimal("0.00")
+
+
+def stored_price(price):
+    # Prices the column can't hold count as unpriced
+    if not price.is_finite():
+        return Decimal("0.00")
+    price = price.quantize(CENT)
+    return price if abs(price) <= MAX_STORED_PRICE else Decimal("0.00")
+
+
+def backfill_market_prices(apps, schema_editor):
+    now = timezone.now()
+    games = [
+        (apps.get_model("api", "PokemonCardData").objects.select_related("tcgplayer", "cardmarket"), pokemon_market_price),
+        (apps.get_model("api", "YugiohCard").objects.prefetch_related("card_prices"), yugioh_market_price),
+        (apps.get_model("api", "MTGCardsData").objects.all(), mtg_market_price),
+        (apps.get_model("api", "LorcanaCardData").objects.all(), lorcana_market_price),
+    ]
+    for queryset, market_price in games:
+        cards = []
+        for card in queryset.iterator(chunk_size=2000):
+            card.market_price = stored_price(market_price(card))
+            card.price_updated_at = now
+            cards.append(card)
+            if len(cards) == 2000:
+                queryset.model.objects.bulk_update(cards, ["market_price", "price_updated_at"])
+                cards = []
+        queryset.model.objects.bulk_update(cards, ["market_price", "price_updated_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0037_lorcana_set_card_num_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lorcanacarddata",
+            name="market_price",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="lorcanacarddata",
+            name="price_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="mtgcardsdata",
+            name="market_price",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="mtgcardsdata",
+            name="price_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="pokemoncarddata",
+            name="market_price",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="pokemoncarddata",
+            name="price_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="yugiohcard",
+            name="market_price",
+            field=models.DecimalField(
+                decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.AddField(
+            model_name="yugiohcard",
+            name="price_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_market_prices, migrations.RunPython.noop),
+    ]
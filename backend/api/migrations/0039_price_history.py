@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:02
+
+from datetime import date
+from django.db import migrations
+
+# Partitions created up front, counted from the current month; api.tasks.create_price_history_partitions
+# keeps creating them monthly
+PARTITIONS_AHEAD = 3
+
+
+def create_partitions(apps, schema_editor):
+    month = date.today().replace(day=1)
+    for _ in range(PARTITIONS_AHEAD):
+        following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS api_pricehistory_p{month:%Y%m} PARTITION OF api_pricehistory "
+            f"FOR VALUES FROM ('{month}') TO ('{following}')"
+        )
+        month = following
+
+
+class Migration(migrations.Migration):
+    # Range-partitioned by month, which the ORM can't declare, so the table has no model;
+    # api.ingestion.history writes and reads it. Monthly partitions are created ahead of time, and
+    # on first use when one is missing.
+
+    dependencies = [
+        ("api", "0038_card_market_price"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE api_pricehistory (
+                    game varchar(16) NOT NULL,
+                    card_id varchar(100) NOT NULL,
+                    source varchar(64) NOT NULL,
+                    day date NOT NULL,
+                    price numeric(12, 2) NOT NULL,
+                    PRIMARY KEY (game, card_id, source, day)
+                ) PARTITION BY RANGE (day)
+            """,
+            reverse_sql="DROP TABLE api_pricehistory",
+        ),
+        migrations.RunPython(create_partitions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+PRICE_COLUMNS = ["cardmarket_price", "tcgplayer_price", "ebay_price", "amazon_price", "coolstuffinc_price"]
+
+# Keep the strings that cast cleanly into numeric(10, 2); blanks and junk become NULL
+CLEAN_PRICES = "UPDATE api_cardprice SET " + ", ".join(
+    f"""{column} = CASE
+        WHEN btrim({column}) ~ '^-?[0-9]+(\\.[0-9]+)?$' AND abs(round(btrim({column})::numeric, 2)) < 100000000
+        THEN btrim({column})
+    END"""
+    for column in PRICE_COLUMNS
+)
+
+
+def price_field():
+    return models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0039_price_history"),
+    ]
+
+    operations = [
+        *(
+            migrations.AlterField(
+                model_name="cardprice",
+                name=column,
+                field=models.CharField(blank=True, max_length=100, null=True),
+            )
+            for column in PRICE_COLUMNS
+        ),
+        migrations.RunSQL(CLEAN_PRICES, migrations.RunSQL.noop),
+        *(
+            migrations.AlterField(
+                model_name="cardprice",
+                name=column,
+                field=price_field(),
+            )
+            for column in PRICE_COLUMNS
+        ),
+        migrations.AlterField(
+            model_name="yugiohcard",
+            name="market_price",
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,141 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:05
+
+import django.db.models.fields.json
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0040_yugioh_numeric_prices"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mtgcardsdata",
+            name="price_eur",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        models.Q(
+                            ("prices__eur__regex", "^[0-9]{1,8}(\\.[0-9]{1,2})?$")
+                        ),
+                        then=django.db.models.functions.comparison.Cast(
+                            django.db.models.fields.json.KeyTextTransform(
+                                "eur", "prices"
+                            ),
+                            models.DecimalField(decimal_places=2, max_digits=10),
+                        ),
+                    )
+                ),
+                output_field=models.DecimalField(
+                    blank=True, decimal_places=2, max_digits=10, null=True
+                ),
+            ),
+        ),
+        migrations.AddField(
+            model_name="mtgcardsdata",
+            name="price_tix",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        models.Q(
+                            ("prices__tix__regex", "^[0-9]{1,8}(\\.[0-9]{1,2})?$")
+                        ),
+                        then=django.db.models.functions.comparison.Cast(
+                            django.db.models.fields.json.KeyTextTransform(
+                                "tix", "prices"
+                            ),
+                            models.DecimalField(decimal_places=2, max_digits=10),
+                        ),
+                    )
+                ),
+                output_field=models.DecimalField(
+                    blank=True, decimal_places=2, max_digits=10, null=True
+                ),
+            ),
+        ),
+        migrations.AddField(
+            model_name="mtgcardsdata",
+            name="price_usd",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        models.Q(
+                            ("prices__usd__regex", "^[0-9]{1,8}(\\.[0-9]{1,2})?$")
+                        ),
+                        then=django.db.models.functions.comparison.Cast(
+                            django.db.models.fields.json.KeyTextTransform(
+                                "usd", "prices"
+                            ),
+                            models.DecimalField(decimal_places=2, max_digits=10),
+                        ),
+                    )
+                ),
+                output_field=models.DecimalField(
+                    blank=True, decimal_places=2, max_digits=10, null=True
+                ),
+            ),
+        ),
+        migrations.AddField(
+            model_name="mtgcardsdata",
+            name="price_usd_foil",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=models.Case(
+                    models.When(
+                        models.Q(
+                            ("prices__usd_foil__regex", "^[0-9]{1,8}(\\.[0-9]{1,2})?$")
+                        ),
+                        then=django.db.models.functions.comparison.Cast(
+                            django.db.models.fields.json.KeyTextTransform(
+                                "usd_foil", "prices"
+                            ),
+                            models.DecimalField(decimal_places=2, max_digits=10),
+                        ),
+                    )
+                ),
+                output_field=models.DecimalField(
+                    blank=True, decimal_places=2, max_digits=10, null=True
+                ),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mtgcardsdata",
+            index=models.Index(
+                models.OrderBy(models.F("price_usd"), descending=True, nulls_last=True),
+                name="mtg_price_usd_desc_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mtgcardsdata",
+            index=models.Index(
+                models.OrderBy(
+                    models.F("price_usd_foil"), descending=True, nulls_last=True
+                ),
+                name="mtg_price_usd_foil_desc_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mtgcardsdata",
+            index=models.Index(
+                models.OrderBy(models.F("price_eur"), descending=True, nulls_last=True),
+                name="mtg_price_eur_desc_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mtgcardsdata",
+            index=models.Index(
+                models.OrderBy(models.F("price_tix"), descending=True, nulls_last=True),
+                name="mtg_price_tix_desc_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:40
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def numeric(text):
+    return f"CASE WHEN {text} ~ '^-?[0-9]+(\\.[0-9]+)?$' THEN round(({text})::numeric, 2) END"
+
+
+# The sum the catalog views used to compute per request, through the price rows each card links to
+BACKFILL = f"""
+    UPDATE api_pokemoncarddata AS card
+    SET combined_average_price = LEAST(
+        COALESCE((
+            SELECT COALESCE({numeric("prices #>> '{holofoil,market}'")}, {numeric("prices #>> '{normal,market}'")})
+            FROM api_pokemontcgplayer WHERE id = card.tcgplayer_id
+        ), 0)
+        + COALESCE((
+            SELECT COALESCE({numeric("prices ->> 'reverseHoloTrend'")}, {numeric("prices ->> 'trendPrice'")})
+            FROM api_pokemoncardmarket WHERE id = card.cardmarket_id
+        ), 0),
+        99999999.99
+    )
+    WHERE card.tcgplayer_id IS NOT NULL OR card.cardmarket_id IS NOT NULL
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0041_mtg_price_columns"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pokemoncarddata",
+            name="combined_average_price",
+            field=models.DecimalField(
+                db_index=True, decimal_places=2, default=Decimal("0.00"), max_digits=10
+            ),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+    ]
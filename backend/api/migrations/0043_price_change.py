@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0042_pokemon_combined_average_price"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("game", models.CharField(max_length=16)),
+                ("card_id", models.CharField(max_length=100)),
+                ("old_price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("new_price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("recorded_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
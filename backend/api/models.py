@@ -1,6 +1,9 @@
 from decimal import Decimal
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.db.models import Case, Q, When
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast
 
 ####################################################
 # Lists
@@ -36,6 +39,9 @@ class YugiohCard(models.Model):
     level = models.IntegerField()
     race = models.CharField(max_length=100)
     attribute = models.CharField(max_length=100)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    market_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), db_index=True)
+    price_updated_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.name} (Type: {self.card_type}, ATK: {self.attack}, DEF: {self.defense}, Level: {self.level}, Race: {self.race}, Attribute: {self.attribute})"
@@ -62,16 +68,15 @@ class CardImage(models.Model):
 
 class CardPrice(models.Model):
     yugioh_card = models.ForeignKey(YugiohCard, related_name='card_prices', on_delete=models.CASCADE)
-    cardmarket_price = models.CharField(max_length=100)
-    tcgplayer_price = models.CharField(max_length=100)
-    ebay_price = models.CharField(max_length=100)
-    amazon_price = models.CharField(max_length=100)
-    coolstuffinc_price = models.CharField(max_length=100)
+    cardmarket_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    tcgplayer_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    ebay_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    amazon_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    coolstuffinc_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
     def get_average_price(self):
         # Calculate average price from available prices
-        prices = [self.cardmarket_price, self.ebay_price, self.amazon_price]
-        prices = [Decimal(price) for price in prices if price]
+        prices = [price for price in (self.cardmarket_price, self.ebay_price, self.amazon_price) if price]
         return sum(prices) / len(prices) if prices else Decimal('0.00')
 
     def __str__(self):
@@ -121,7 +126,7 @@ class PokemonCardSet(models.Model):
         return f'ID: {self.id}, Name: {self.name}, Series: {self.series}, PrintedTotal: {self.printedTotal}, Total: {self.total}, Legalities: {self.legalities}, PtcgoCode: {self.ptcgoCode}, ReleaseDate: {self.releaseDate}, UpdatedAt: {self.updatedAt}, Images: {self.images}'
 
 class PokemonTcgplayer(models.Model):
-    url = models.URLField(max_length=255)
+    url = models.URLField(max_length=255, unique=True)
     updatedAt = models.DateTimeField(null=True)
     prices = models.JSONField()
 
@@ -129,7 +134,7 @@ class PokemonTcgplayer(models.Model):
         return f'URL: {self.url}, UpdatedAt: {self.updatedAt}, Prices: {self.prices}'
 
 class PokemonCardmarket(models.Model):
-    url = models.URLField(max_length=255)
+    url = models.URLField(max_length=255, unique=True)
     updatedAt = models.DateTimeField(null=True)
     prices = models.JSONField()
 
@@ -161,6 +166,11 @@ class PokemonCardData(models.Model):
     images = models.JSONField()
     tcgplayer = models.ForeignKey(PokemonTcgplayer, on_delete=models.SET_NULL, null=True, blank=True)
     cardmarket = models.ForeignKey(PokemonCardmarket, on_delete=models.SET_NULL, null=True, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    market_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    price_updated_at = models.DateTimeField(null=True, blank=True)
+    # The catalog's price sort key, computed at ingestion (see prices.combined_average_price)
+    combined_average_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'), db_index=True)
 
     def __str__(self):
         return (f'ID: {self.id}, Name: {self.name}, Supertype: {self.supertype}, Subtypes: {self.subtypes}, '
@@ -191,6 +201,14 @@ class LorcanaCardData(models.Model):
     card_num = models.PositiveIntegerField()
     body_text = models.TextField(blank=True)
     set_id = models.CharField(max_length=200)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    market_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    price_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['set_id', 'card_num'], name='unique_lorcana_set_card_num'),
+        ]
 
     def __str__(self):
         return f"Artist: {self.artist}, Set Name: {self.set_name}, Set Num: {self.set_num}, Color: {self.color}, Image: {self.image}, Cost: {self.cost}, Inkable: {self.inkable}, Name: {self.name}, Type: {self.type}, Rarity: {self.rarity}, Flavor Text: {self.flavor_text}, Card Num: {self.card_num}, Body Text: {self.body_text}, Set ID: {self.set_id}"
@@ -208,11 +226,26 @@ class MTGRelatedCard(models.Model):
     def __str__(self):
         return f"ID: {self.id}, Component: {self.component}, Name: {self.name}, Type Line: {self.type_line}, URI: {self.uri}"
 
+def scryfall_price(key):
+    """
+    A numeric column Postgres keeps in sync with prices[key]. Scryfall sends prices as decimal
+    strings or null; anything else (or anything too large for the column) reads as NULL.
+    """
+    return models.GeneratedField(
+        expression=Case(When(
+            Q(**{f'prices__{key}__regex': r'^[0-9]{1,8}(\.[0-9]{1,2})?$'}),
+            then=Cast(KeyTextTransform(key, 'prices'), models.DecimalField(max_digits=10, decimal_places=2)),
+        )),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True),
+        db_persist=True,
+        db_index=True,
+    )
+
 class MTGCardsData(models.Model):
     id = models.CharField(max_length=100, primary_key=True)
     oracle_id = models.UUIDField()
     name = models.CharField(max_length=200)
-    lang = models.CharField(max_length=2)
+    lang = models.CharField(max_length=10)
     released_at = models.DateField()
     uri = models.URLField()
     layout = models.CharField(max_length=100)
@@ -229,8 +262,22 @@ class MTGCardsData(models.Model):
     rarity = models.CharField(max_length=50)
     artist = models.CharField(max_length=200)
     prices = models.JSONField()
+    price_usd = scryfall_price('usd')
+    price_usd_foil = scryfall_price('usd_foil')
+    price_eur = scryfall_price('eur')
+    price_tix = scryfall_price('tix')
     related_uris = models.JSONField()
     all_parts = models.ManyToManyField(MTGRelatedCard, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    market_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    price_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # db_index covers ascending price sorts; descending ones keep unpriced cards last
+        indexes = [
+            models.Index(models.F(field).desc(nulls_last=True), name=f'mtg_{field}_desc_idx')
+            for field in ('price_usd', 'price_usd_foil', 'price_eur', 'price_tix')
+        ]
 
     def __str__(self):
         return f"ID: {self.id}, Oracle ID: {self.oracle_id}, Name: {self.name}, Language: {self.lang}, Released At: {self.released_at}, URI: {self.uri}, Layout: {self.layout}, CMC: {self.cmc}, Type Line: {self.type_line}, Color Identity: {self.color_identity}, Keywords: {self.keywords}, Legalities: {self.legalities}, Games: {self.games}, Set: {self.set}, Set Name: {self.set_name}, Set Type: {self.set_type}, Rarity: {self.rarity}, Artist: {self.artist}, Prices: {self.prices}, Related URIs: {self.related_uris}"
@@ -252,6 +299,45 @@ class MTGCardFace(models.Model):
     def __str__(self):
         return f"ID: {self.id}, Oracle ID: {self.oracle_id}, Name: {self.name}, Mana Cost: {self.mana_cost}, Type Line: {self.type_line}, Oracle Text: {self.oracle_text}, Colors: {self.colors}, Power: {self.power}, Toughness: {self.toughness}, Artist: {self.artist}"
 
+####################################################
+# Ingestion bookkeeping
+####################################################
+class SyncWatermark(models.Model):
+    source = models.CharField(max_length=50)
+    key = models.CharField(max_length=100)
+    watermark = models.DateTimeField()
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'key'], name='unique_sync_watermark'),
+        ]
+
+    def __str__(self):
+        return f"Source: {self.source}, Key: {self.key}, Watermark: {self.watermark}, Synced At: {self.synced_at}"
+
+class IngestionCheckpoint(models.Model):
+    source = models.CharField(max_length=50, unique=True)
+    cursor = models.JSONField(default=dict)
+    batch_id = models.IntegerField(default=0)
+    started_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Source: {self.source}, Cursor: {self.cursor}, Batch: {self.batch_id}, Started At: {self.started_at}, Completed At: {self.completed_at}"
+
+class PriceChange(models.Model):
+    # A stored market price moved by ingestion, waiting to be applied to the lists holding the card
+    game = models.CharField(max_length=16)
+    card_id = models.CharField(max_length=100)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Game: {self.game}, Card: {self.card_id}, Old Price: {self.old_price}, New Price: {self.new_price}, Recorded At: {self.recorded_at}"
+
 ####################################################
 # Setup for many-to-many tables with lists and cards
 ####################################################
@@ -270,11 +356,9 @@ class ListCard(models.Model):
     
     @property
     def card_market_value(self):
-        # Return the market value from the relevant card data if available
-        if self.pokemon_card and self.pokemon_card.cardmarket:
-            price = self.pokemon_card.cardmarket.prices.get('averageSellPrice')
-            return Decimal(price) if price is not None else Decimal('0.00')
-        return Decimal('0.00')
+        # Priced like everywhere else; api.pricing imports the models, hence the late import
+        from .pricing import list_card_item, price_of
+        return price_of(*list_card_item(self))
 
     @property
     def card_instance(self):
@@ -282,7 +366,7 @@ class ListCard(models.Model):
         return self.pokemon_card or self.yugioh_card or self.mtg_card or self.lorcana_card
 
     def save(self, *args, **kwargs):
-        self.market_value = self.card_market_value or Decimal('0.00')
+        self.market_value = self.card_market_value
         super().save(*args, **kwargs)
 
 # Many-to-many relationship setup for CardList with different card types
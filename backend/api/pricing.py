@@ -0,0 +1,177 @@
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from decimal import Decimal
+from django.db import connection, transaction
+from .models import CardList, ListCard, LorcanaCardData, MTGCardsData, PokemonCardData, PriceChange, YugiohCard
+
+ZERO = Decimal('0.00')
+
+class StoredMarketPrice:
+    """
+    Price a game's cards by the market_price column the ingestion writers keep up to date
+    (see ingestion.prices for how each game's upstream prices are averaged).
+    """
+
+    def __init__(self, model, relation):
+        self.model = model
+        # The ListCard foreign key pointing at this game's cards
+        self.relation = relation
+
+    def price(self, card):
+        return card.market_price
+
+    def load(self, card_ids):
+        return dict(self.model.objects.filter(pk__in=card_ids).values_list('pk', 'market_price'))
+
+STRATEGIES = {
+    'pokemon': StoredMarketPrice(PokemonCardData, 'pokemon_card'),
+    'yugioh': StoredMarketPrice(YugiohCard, 'yugioh_card'),
+    'mtg': StoredMarketPrice(MTGCardsData, 'mtg_card'),
+    'lorcana': StoredMarketPrice(LorcanaCardData, 'lorcana_card'),
+}
+
+_memo = ContextVar('pricing_memo', default=None)
+
+class memoized_prices(ContextDecorator):
+    """
+    Remember every price looked up inside the block (or decorated view or task), so a card is
+    loaded and priced once however many lists or rows refer to it. Nested scopes share the
+    outermost memo.
+    """
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call, so concurrent calls don't share a token
+        return type(self)()
+
+    def __enter__(self):
+        self.token = _memo.set({}) if _memo.get() is None else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.token is not None:
+            _memo.reset(self.token)
+        return False
+
+class PricingMiddleware:
+    """
+    Give each request its own price memo.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with memoized_prices():
+            return self.get_response(request)
+
+def card_model(game):
+    strategy = STRATEGIES.get(game)
+    return strategy.model if strategy else None
+
+def list_card_item(list_card):
+    """
+    The (game, card_id) a ListCard points at, read from its foreign keys without loading the
+    card; (None, None) when the card is gone.
+    """
+    for game, strategy in STRATEGIES.items():
+        card_id = getattr(list_card, f'{strategy.relation}_id')
+        if card_id is not None:
+            return game, card_id
+    return None, None
+
+def price_many(items):
+    """
+    Price a batch of (game, card) pairs, where card is a card instance or its primary key.
+    Returns one Decimal per pair, in order. Instances are priced from their own fields; bare
+    keys are loaded with one query per game for the keys not already memoized. Unknown games
+    and missing cards price at 0.00.
+    """
+    memo = _memo.get()
+    memo = {} if memo is None else memo
+
+    keys = []
+    missing = {}
+    for game, card in items:
+        strategy = STRATEGIES.get(game)
+        if strategy is None or card is None:
+            keys.append(None)
+        elif isinstance(card, strategy.model):
+            keys.append((game, card.pk))
+            memo.setdefault((game, card.pk), strategy.price(card))
+        else:
+            card_id = strategy.model._meta.pk.to_python(card)
+            keys.append((game, card_id))
+            if (game, card_id) not in memo:
+                missing.setdefault(game, set()).add(card_id)
+    for game, card_ids in missing.items():
+        loaded = STRATEGIES[game].load(card_ids)
+        for card_id in card_ids:
+            memo[(game, card_id)] = loaded.get(card_id, ZERO)
+
+    return [ZERO if key is None else memo[key] for key in keys]
+
+def price_of(game, card):
+    return price_many([(game, card)])[0]
+
+def list_values(list_cards):
+    """
+    (market_value, collection_value) of a list from its ListCard rows: every row adds its card's
+    price to the market value, and collected rows to the collection value as well.
+    """
+    list_cards = list(list_cards)
+    prices = price_many(list_card_item(list_card) for list_card in list_cards)
+    market_value = sum(prices, ZERO)
+    collection_value = sum((price for list_card, price in zip(list_cards, prices) if list_card.collected), ZERO)
+    return market_value, collection_value
+
+@transaction.atomic(savepoint=False)
+def apply_price_changes():
+    """
+    Fold the PriceChange rows recorded by ingestion into the lists holding those cards, in one
+    statement: the pending changes are consumed, netted per card, joined through ListCard (one
+    branch per game, so each is a plain equi-join) and summed per list, and only those lists get
+    their market and collection values moved by the difference. Lists without a changed card are
+    never read. Returns the number of lists updated.
+
+    The ingestion writers call this in the transaction that moves the prices, so a list valued
+    from current prices in between (e.g. by update_list) can never get a change added twice.
+    Concurrent writers lock the affected lists in id order, so they queue instead of deadlocking.
+    """
+    # card_id is cast to the foreign key's type (not the other way round) so the ListCard index is
+    # used; the CASE keeps other games' ids from being cast
+    per_game = ' UNION ALL '.join(
+        f"SELECT list_card.card_list_id, list_card.collected, card.delta "
+        f"FROM card_deltas AS card JOIN {ListCard._meta.db_table} AS list_card "
+        f"ON list_card.{field.column} = (CASE WHEN card.game = %s THEN card.card_id END)::{field.db_type(connection)} "
+        f"WHERE card.game = %s"
+        for field in (ListCard._meta.get_field(strategy.relation) for strategy in STRATEGIES.values())
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH consumed AS (
+                DELETE FROM {PriceChange._meta.db_table} RETURNING game, card_id, new_price - old_price AS delta
+            ),
+            card_deltas AS (
+                SELECT game, card_id, sum(delta) AS delta FROM consumed GROUP BY game, card_id
+            ),
+            list_deltas AS (
+                SELECT card_list_id,
+                       sum(delta) AS market_delta,
+                       coalesce(sum(delta) FILTER (WHERE collected), 0) AS collection_delta
+                FROM ({per_game}) AS held
+                GROUP BY card_list_id
+            ),
+            locked AS (
+                SELECT id FROM {CardList._meta.db_table}
+                WHERE id IN (SELECT card_list_id FROM list_deltas)
+                ORDER BY id
+                FOR UPDATE
+            )
+            UPDATE {CardList._meta.db_table} AS card_list
+            SET market_value = card_list.market_value + list_deltas.market_delta,
+                collection_value = card_list.collection_value + list_deltas.collection_delta
+            FROM list_deltas JOIN locked ON locked.id = list_deltas.card_list_id
+            WHERE card_list.id = list_deltas.card_list_id
+              AND (list_deltas.market_delta <> 0 OR list_deltas.collection_delta <> 0)
+        """, [game for game in STRATEGIES for _ in range(2)])
+        return cursor.rowcount
@@ -1,115 +1,111 @@
-from celery import shared_task
+import logging
+from celery import chord, shared_task
+from django.db import DatabaseError, OperationalError
+import requests
+from .ingestion.history import create_upcoming_partitions
+from .ingestion.http import PageFetchError
+from .ingestion.shards import GAMES, plan_shards, run_shard, shard_label
 from .models import CardList, ListCard
-from decimal import Decimal, InvalidOperation
+from .pricing import list_values, memoized_prices
 
-def calculate_average_price(prices):
-    if not prices:
-        return Decimal('0.00')
+logger = logging.getLogger(__name__)
 
-    # Sort prices and calculate Q1, Q3, and IQR to filter outliers
-    prices = sorted(Decimal(str(price)) for price in prices if price)
-    mid_index = len(prices) // 2
-    Q1 = prices[mid_index // 2] if len(prices) % 2 else (prices[mid_index // 2 - 1] + prices[mid_index // 2]) / 2
-    Q3 = prices[-(mid_index // 2) - 1] if len(prices) % 2 else (prices[-(mid_index // 2) - 1] + prices[-(mid_index // 2)]) / 2
-    IQR = Q3 - Q1
-
-    # Filter prices based on IQR range
-    lower_bound = Q1 - (Decimal('1.5') * IQR)
-    upper_bound = Q3 + (Decimal('1.5') * IQR)
-    filtered_prices = [price for price in prices if lower_bound <= price <= upper_bound]
+def revalue_flagged_lists():
+    """
+    Recompute the market and collection values of every list flagged needs_update, in one pass
+    per list. The price memo is shared by all lists, so each card is priced once per run.
+    """
+    card_lists = CardList.objects.filter(needs_update=True)
+    with memoized_prices():
+        for card_list in card_lists:
+            card_list.market_value, card_list.collection_value = list_values(ListCard.objects.filter(card_list=card_list))
+            card_list.needs_update = False
+            card_list.save(update_fields=['market_value', 'collection_value', 'needs_update'])
+    return len(card_lists)
 
+# Both values are refreshed together: each task clears needs_update, so valuing them
+# separately left the second task nothing to do. Only bulk_update_market_values is scheduled;
+# bulk_update_collection_values stays as an alias for callers that still queue it.
+@shared_task
+def bulk_update_market_values():
     try:
-        average = sum(filtered_prices) / Decimal(len(filtered_prices))
-    except (InvalidOperation, ZeroDivisionError, TypeError):
-        average = Decimal('0.00')
+        revalue_flagged_lists()
+    except Exception as e:
+        print(e)
 
-    return average
+@shared_task
+def bulk_update_collection_values():
+    revalue_flagged_lists()
 
-def get_card_market_price(card, card_type):
+@shared_task
+def create_price_history_partitions():
     """
-    Calculate the market price of a card based on its type.
+    Create the price history partitions of the coming months ahead of the writers, so the
+    ingestion write path never has to take the partition lock.
     """
-    if card_type == 'pokemon':
-        price_values = []
-        if card.tcgplayer and card.tcgplayer.prices:
-            price_values.append(card.tcgplayer.prices.get('trendPrice', 0))
-            price_values.append(card.tcgplayer.prices.get('reverseHoloTrend', 0))
-        if card.cardmarket and card.cardmarket.prices:
-            price_values.append(card.cardmarket.prices.get('averageSellPrice', 0))
-        return calculate_average_price([Decimal(str(price)) for price in price_values])
+    months = create_upcoming_partitions()
+    logger.info(f"Price history partitions ready through {months[-1]:%Y-%m}")
 
-    elif card_type == 'yugioh':
-        price_values = []
-        prices = card.card_prices.all()
-        for price in prices:
-            if price.cardmarket_price:
-                price_values.append(Decimal(price.cardmarket_price))
-            if price.ebay_price:
-                price_values.append(Decimal(price.ebay_price))
-            if price.amazon_price:
-                price_values.append(Decimal(price.amazon_price))
-            if price.tcgplayer_price:
-                price_values.append(Decimal(price.tcgplayer_price))
-            if price.coolstuffinc_price:
-                price_values.append(Decimal(price.coolstuffinc_price))
-        return calculate_average_price(price_values)
+####################################################
+# Catalog ingestion
+####################################################
+@shared_task
+def refresh_catalogs(games=None, incremental=False, shard_size=None):
+    """
+    Fan a catalog refresh out over the workers: each game is split into shards that run in
+    parallel under a chord, and reconcile_catalog_sync runs once they have all finished.
+    """
+    games = games or GAMES
+    shards = [shard for game in games for shard in plan_shards(game, shard_size, incremental)]
+    logger.info(f"Queueing {len(shards)} catalog shards for {', '.join(games)}")
+    result = chord(sync_catalog_shard.s(shard) for shard in shards)(reconcile_catalog_sync.s(games))
+    return result.id
 
-    elif card_type == 'mtg':
-        return Decimal(card.prices.get('usd', 0)) if card.prices and 'usd' in card.prices else Decimal('0.00')
+@shared_task(bind=True, max_retries=3)
+def sync_catalog_shard(self, shard):
+    """
+    Sync one shard. Fetch errors and transient database errors (deadlocks, serialization
+    failures) are retried with backoff; a shard that still fails, or hits any other database
+    error, reports the error instead of raising, so the rest of the chord still reconciles.
+    """
+    try:
+        metrics = run_shard(shard)
+    except (requests.RequestException, PageFetchError, OperationalError) as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=30 * 2 ** self.request.retries)
+        return shard_failed(shard, e)
+    except DatabaseError as e:
+        return shard_failed(shard, e)
 
-    elif card_type == 'lorcana':
-        return Decimal(card.cost) if card.cost else Decimal('0.00')
+    return {
+        'shard': shard,
+        'rows': metrics.rows,
+        'inserted': metrics.stats.inserted,
+        'changed': metrics.stats.changed,
+        'unchanged': metrics.stats.unchanged,
+        'skipped': metrics.stats.skipped,
+        'seconds': metrics.elapsed,
+    }
 
-    return Decimal('0.00')
+def shard_failed(shard, error):
+    logger.error(f'Catalog shard {shard_label(shard)} failed: {error}')
+    return {'shard': shard, 'error': str(error)}
 
-def get_card_type_and_instance(list_card):
+@shared_task
+def reconcile_catalog_sync(results, games):
     """
-    Determine the card's type and retrieve its instance from a ListCard object.
+    Total the shard results and report failed shards. The shards' writers already moved the
+    values of the lists holding cards whose price changed.
     """
-    if list_card.pokemon_card:
-        return 'pokemon', list_card.pokemon_card
-    elif list_card.yugioh_card:
-        return 'yugioh', list_card.yugioh_card
-    elif list_card.mtg_card:
-        return 'mtg', list_card.mtg_card
-    elif list_card.lorcana_card:
-        return 'lorcana', list_card.lorcana_card
-    else:
-        return None, None
+    failed = [result for result in results if 'error' in result]
+    totals = {'rows': 0, 'inserted': 0, 'changed': 0, 'unchanged': 0, 'skipped': 0}
+    for result in results:
+        if 'error' in result:
+            continue
+        for key in totals:
+            totals[key] += result[key]
 
-@shared_task
-def bulk_update_market_values():
-    try:
-        card_lists = CardList.objects.filter(needs_update=True)
-        for card_list in card_lists:
-            new_market_value = Decimal('0.00')
-            list_cards = ListCard.objects.filter(card_list=card_list)
-            
-            for list_card in list_cards:
-                card_type, card_instance = get_card_type_and_instance(list_card)
-                if card_instance:
-                    card_price = get_card_market_price(card_instance, card_type)
-                    new_market_value += card_price
-            print(new_market_value)
-            card_list.market_value = new_market_value
-            card_list.needs_update = False
-            card_list.save()
-    except Exception as e:
-        print(e)
-
-@shared_task
-def bulk_update_collection_values():
-    card_lists = CardList.objects.filter(needs_update=True)
-    for card_list in card_lists:
-        new_collection_value = Decimal('0.00')
-        collected_cards = ListCard.objects.filter(card_list=card_list, collected=True)
-        
-        for list_card in collected_cards:
-            card_type, card_instance = get_card_type_and_instance(list_card)
-            if card_instance:
-                card_price = get_card_market_price(card_instance, card_type)
-                new_collection_value += card_price
-        
-        card_list.collection_value = new_collection_value
-        card_list.needs_update = False
-        card_list.save()
+    for result in failed:
+        logger.error(f"Catalog shard {shard_label(result['shard'])} failed: {result['error']}")
+    logger.info(f"Catalog sync of {', '.join(games)} finished: {totals}, {len(failed)} failed shards")
+    return {'totals': totals, 'failed': [result['shard'] for result in failed]}
@@ -7,7 +7,8 @@ from .views import (CardListViewSet,
                     get_list_by_id, 
                     update_list, 
                     card_collection, 
-                    set_card_quantity)
+                    set_card_quantity,
+                    price_history)
 from .viewsOrganized.pokemon import (get_pokemon_cards_by_list, 
                                      pokemon_cards_api, 
                                      get_filter_options)
@@ -47,4 +48,5 @@ urlpatterns = [
     path('lorcana-filter-options/', get_lorcana_filter_options, name='lorcana-filter-options'),
     path('card-collection/', card_collection, name='card-collection'),
     path('set-card-quantity/', set_card_quantity, name='set-card-quantity'),
+    path('price-history/<str:game>/<str:card_id>/', price_history, name='price-history'),
 ]
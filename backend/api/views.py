@@ -1,8 +1,11 @@
-from decimal import Decimal, InvalidOperation
+from datetime import date, timedelta
+from decimal import Decimal
 from pathlib import Path
 from rest_framework import viewsets
-from .models import CardList, LorcanaCardData, MTGCardsData, YugiohCard, PokemonCardData, ListCard
+from .models import CardList, ListCard
 from .serializers import CardListSerializer, ListCardSerializer
+from .ingestion.history import GAME_SOURCES, price_series
+from .pricing import card_model, list_card_item, list_values, price_many, price_of
 from decouple import Config, RepositoryEnv
 import logging
 from rest_framework.decorators import api_view
@@ -12,115 +15,13 @@ from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.pagination import PageNumberPagination
 from django.db.models import Count, DecimalField
 from django.db.models.functions import Cast
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-def calculate_average_price(prices):
-    """
-    Calculate the average price of a card by filtering outliers based on IQR (Interquartile Range).
-    Returns Decimal('0.00') if no valid prices are available.
-    """
-    if not prices:
-        return Decimal('0.00')
-
-    # Sort prices to calculate Q1 (first quartile) and Q3 (third quartile)
-    prices = sorted(Decimal(str(price)) for price in prices if price)
-    mid_index = len(prices) // 2
-    Q1 = prices[mid_index // 2] if len(prices) % 2 else (prices[mid_index // 2 - 1] + prices[mid_index // 2]) / 2
-    Q3 = prices[-(mid_index // 2) - 1] if len(prices) % 2 else (prices[-(mid_index // 2) - 1] + prices[-(mid_index // 2)]) / 2
-    IQR = Q3 - Q1  # Interquartile Range
-
-    # Define lower and upper bounds for filtering prices
-    lower_bound = Q1 - (Decimal('1.5') * IQR)
-    upper_bound = Q3 + (Decimal('1.5') * IQR)
-    filtered_prices = [price for price in prices if lower_bound <= price <= upper_bound]
-
-    # Calculate average price
-    try:
-        average = sum(filtered_prices) / Decimal(len(filtered_prices))
-    except (InvalidOperation, ZeroDivisionError, TypeError):
-        average = Decimal('0.00')
-
-    return average
-
-def get_card_market_price(card, card_type):
-    """
-    Get the market price of a card based on its type (Pokemon, Yu-Gi-Oh!, MTG, or Lorcana).
-    Uses prices from external sources like TCGPlayer or CardMarket.
-    """
-    logger.info(f"Getting market price for {card_type} card: {card.id}")
-    
-    if card_type == 'pokemon':
-        price_values = []
-        # Collect prices from TCGPlayer and CardMarket if available
-        if card.tcgplayer and card.tcgplayer.prices:
-            price_values.append(card.tcgplayer.prices.get('trendPrice', 0))
-            price_values.append(card.tcgplayer.prices.get('reverseHoloTrend', 0))
-        if card.cardmarket and card.cardmarket.prices:
-            price_values.append(card.cardmarket.prices.get('averageSellPrice', 0))
-        price = calculate_average_price([Decimal(str(price)) for price in price_values if price is not None])
-        logger.info(f"Pokemon card price: {price}")
-        return price
-
-    elif card_type == 'yugioh':
-        price_values = []
-        # Collect prices from various sources like eBay, Amazon, and TCGPlayer
-        prices = card.card_prices.all()
-        for price in prices:
-            if price.cardmarket_price:
-                price_values.append(Decimal(price.cardmarket_price))
-            if price.ebay_price:
-                price_values.append(Decimal(price.ebay_price))
-            if price.amazon_price:
-                price_values.append(Decimal(price.amazon_price))
-            if price.tcgplayer_price:
-                price_values.append(Decimal(price.tcgplayer_price))
-            if price.coolstuffinc_price:
-                price_values.append(Decimal(price.coolstuffinc_price))
-        price = calculate_average_price(price_values)
-        logger.info(f"Yu-Gi-Oh! card price: {price}")
-        return price
-
-    elif card_type == 'mtg':
-        # Use the USD price from the card's price data if available
-        if card.prices and 'usd' in card.prices:
-            try:
-                price = Decimal(card.prices['usd'])
-                logger.info(f"MTG card price: {price}")
-                return price
-            except (TypeError, ValueError) as e:
-                logger.error(f"Error converting MTG card price: {e}")
-                return Decimal('0.00')
-        logger.warning("No price found for MTG card")
-        return Decimal('0.00')
-
-    elif card_type == 'lorcana':
-        # Use the cost value from Lorcana cards if available
-        try:
-            price = Decimal(card.cost) if card.cost else Decimal('0.00')
-            logger.info(f"Lorcana card price: {price}")
-            return price
-        except (TypeError, ValueError) as e:
-            logger.error(f"Error converting Lorcana card price: {e}")
-            return Decimal('0.00')
-
-    logger.warning(f"Unknown card type: {card_type}")
-    return Decimal('0.00')
-
-def get_card_type_and_instance(list_card):
-    """
-    Determine the card type and return the corresponding card instance from a ListCard object.
-    """
-    if list_card.pokemon_card:
-        return 'pokemon', list_card.pokemon_card
-    elif list_card.yugioh_card:
-        return 'yugioh', list_card.yugioh_card
-    elif list_card.mtg_card:
-        return 'mtg', list_card.mtg_card
-    elif list_card.lorcana_card:
-        return 'lorcana', list_card.lorcana_card
-    else:
-        return None, None
+PRICE_HISTORY_DAYS = 365
+PRICE_HISTORY_POINTS = 120
+MAX_PRICE_HISTORY_POINTS = 1000
 
 # Load environment variables from .env file for configuration
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -202,33 +103,12 @@ def add_card_to_list(request):
         updated_list = CardList.objects.get(id=list_id)
 
         # Determine card type and add to list
-        if card_type == 'pokemon':
-            card = PokemonCardData.objects.get(id=card_id)
-            list_card = ListCard(card_list_id=list_id, pokemon_card=card)
-            price_values = [
-                card.tcgplayer.prices.get('trendPrice', 0) if card.tcgplayer else None,
-                card.tcgplayer.prices.get('reverseHoloTrend', 0) if card.tcgplayer else None,
-                card.cardmarket.prices.get('averageSellPrice', 0) if card.cardmarket else None
-            ]
-            average_market_price = calculate_average_price([Decimal(str(price)) for price in price_values if price])
-            updated_list.market_value += average_market_price
-        elif card_type == 'yugioh':
-            card = YugiohCard.objects.get(id=card_id)
-            list_card = ListCard(card_list_id=list_id, yugioh_card=card)
-            prices = [Decimal(price.cardmarket_price or 0) for price in card.card_prices.all()]
-            average_market_price = calculate_average_price(prices)
-            updated_list.market_value += average_market_price
-        elif card_type == 'mtg':
-            card = MTGCardsData.objects.get(id=card_id)
-            list_card = ListCard(card_list_id=list_id, mtg_card=card)
-            market_value_increase = Decimal(card.prices.get('usd', 0)) if card.prices else Decimal('0.00')
-            updated_list.market_value += market_value_increase
-        elif card_type == 'lorcana':
-            card = LorcanaCardData.objects.get(id=card_id)
-            list_card = ListCard(card_list_id=list_id, lorcana_card=card)
-            updated_list.market_value += Decimal(card.cost or '0.00')
-        else:
+        model = card_model(card_type)
+        if model is None:
             return Response({'error': 'Invalid card type'}, status=400)
+        card = model.objects.get(id=card_id)
+        list_card = ListCard(card_list_id=list_id, **{f'{card_type}_card': card})
+        updated_list.market_value += price_of(card_type, card)
 
         # Save the new card to the list and update the list's market value
         list_card.save()
@@ -267,22 +147,16 @@ def update_card_quantity(request):
         card_key = f"{card_type}_card_id"
         list_cards = ListCard.objects.filter(card_list_id=list_id, **{card_key: card_id})
 
-        card_model = {
-            'pokemon': PokemonCardData,
-            'yugioh': YugiohCard,
-            'mtg': MTGCardsData,
-            'lorcana': LorcanaCardData
-        }.get(card_type)
-
-        if not card_model:
+        model = card_model(card_type)
+        if not model:
             return Response({'error': 'Invalid card type'}, status=400)
 
         try:
-            card = card_model.objects.get(id=card_id)
-        except card_model.DoesNotExist:
+            card = model.objects.get(id=card_id)
+        except model.DoesNotExist:
             return Response({'error': f'{card_type.capitalize()} card not found'}, status=404)
 
-        price_change = get_card_market_price(card, card_type)
+        price_change = price_of(card_type, card)
 
         if operation == 'increment':
             # Add a new card instance to the list
@@ -328,26 +202,7 @@ def delete_card_from_list(request):
         if list_card:
             updated_list = CardList.objects.get(id=list_id)
             
-            market_value_decrease = Decimal(0)
-            if card_type == 'pokemon':
-                card = PokemonCardData.objects.get(id=card_id)
-                if card.cardmarket and card.cardmarket.prices:
-                    market_value_decrease = Decimal(card.cardmarket.prices.get('averageSellPrice', 0))
-            elif card_type == 'yugioh':
-                card = YugiohCard.objects.get(id=card_id)
-                prices = card.card_prices.all()
-                if prices.exists():
-                    total_market_price = sum(Decimal(price.cardmarket_price or 0) for price in prices)
-                    average_market_price = total_market_price / len(prices)
-                    market_value_decrease = average_market_price
-            elif card_type == 'mtg':
-                card = MTGCardsData.objects.get(id=card_id)
-                if card.prices:
-                    market_value_decrease = Decimal(card.prices.get('usd', 0))
-            elif card_type == 'lorcana':
-                card = LorcanaCardData.objects.get(id=card_id)
-                if card.cost:
-                    market_value_decrease = Decimal(card.cost)
+            market_value_decrease = price_of(*list_card_item(list_card))
 
             updated_list.market_value -= market_value_decrease
             updated_list.save()
@@ -368,20 +223,19 @@ def get_list_by_id(request, list_id):
     Also calculates the total market value and collection value of the list.
     """
     try:
-        card_list = CardList.objects.prefetch_related('list_cards').get(id=list_id)
+        card_list = CardList.objects.get(id=list_id)
 
-        list_cards = card_list.list_cards.all()
+        list_cards = list(card_list.list_cards.all())
+        items = [list_card_item(list_card) for list_card in list_cards]
         list_card_data = []
         collection_value = Decimal('0.00')
         market_value = Decimal('0.00')
 
-        # Loop through each card in the list and calculate its market and collection values
-        for list_card in list_cards:
-            card_type, card_instance = get_card_type_and_instance(list_card)
-            if card_instance is None:
+        # Price every card of the list in one batch, then add up the market and collection values
+        for list_card, (card_type, card_id), card_price in zip(list_cards, items, price_many(items)):
+            if card_type is None:
                 continue
 
-            card_price = get_card_market_price(card_instance, card_type)
             market_value += card_price
 
             if list_card.collected:
@@ -390,7 +244,7 @@ def get_list_by_id(request, list_id):
             list_card_data.append({
                 'id': list_card.id,
                 'card_type': card_type,
-                'card_id': card_instance.id,
+                'card_id': card_id,
                 'market_value': str(card_price),
                 'collected': list_card.collected,
                 'card_type_rarity': getattr(list_card, 'card_type', None),
@@ -429,6 +283,7 @@ def get_list_by_id(request, list_id):
 def update_list(request, list_id):
     """
     API endpoint to update the details of a card list, including adding or removing cards.
+    The list's market and collection values are recomputed when its cards change.
     """
     try:
         try:
@@ -452,22 +307,16 @@ def update_list(request, list_id):
                 for card_data in add_cards:
                     card_id = card_data.get('card_id')
                     card_type = card_data.get('card_type')
-                    if card_type == 'pokemon':
-                        card = PokemonCardData.objects.get(id=card_id)
-                        list_card = ListCard(card_list=card_list, pokemon_card=card)
-                    elif card_type == 'yugioh':
-                        card = YugiohCard.objects.get(id=card_id)
-                        list_card = ListCard(card_list=card_list, yugioh_card=card)
-                    elif card_type == 'mtg':
-                        card = MTGCardsData.objects.get(id=card_id)
-                        list_card = ListCard(card_list=card_list, mtg_card=card)
-                    elif card_type == 'lorcana':
-                        card = LorcanaCardData.objects.get(id=card_id)
-                        list_card = ListCard(card_list=card_list, lorcana_card=card)
-                    list_card.save()
+                    model = card_model(card_type)
+                    if model is None:
+                        raise ValueError(f'Invalid card type: {card_type}')
+                    card = model.objects.get(id=card_id)
+                    ListCard(card_list=card_list, **{f'{card_type}_card': card}).save()
             if remove_cards:
                 for card_id in remove_cards:
                     ListCard.objects.filter(card_list=card_list, id=card_id).delete()
+            if add_cards or remove_cards:
+                card_list.market_value, card_list.collection_value = list_values(card_list.list_cards.all())
             card_list.save()
         return Response({'message': 'List updated successfully'})
     except CardList.DoesNotExist:
@@ -509,24 +358,18 @@ def card_collection(request):
                 logger.error(f"Card not found in the list: card_id={card_id}, card_type={card_type}")
                 return Response({'error': 'Card not found in the list'}, status=404)
 
-            card_model = {
-                'pokemon': PokemonCardData,
-                'yugioh': YugiohCard,
-                'mtg': MTGCardsData,
-                'lorcana': LorcanaCardData
-            }.get(card_type)
-
-            if not card_model:
+            model = card_model(card_type)
+            if not model:
                 logger.error(f"Invalid card type: {card_type}")
                 return Response({'error': 'Invalid card type'}, status=400)
 
             try:
-                card = card_model.objects.get(id=card_id)
-            except card_model.DoesNotExist:
+                card = model.objects.get(id=card_id)
+            except model.DoesNotExist:
                 logger.error(f"{card_type.capitalize()} card not found: card_id={card_id}")
                 return Response({'error': f'{card_type.capitalize()} card not found'}, status=404)
 
-            card_price = get_card_market_price(card, card_type)
+            card_price = price_of(card_type, card)
             logger.info(f"Card price: {card_price}")
 
             if operation == 'add':
@@ -599,3 +442,39 @@ def set_card_quantity(request):
         except Exception as e:
             logger.error(f"Error setting card quantity: {e}")
             return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+def price_history(request, game, card_id):
+    """
+    API endpoint to retrieve the downsampled price history of a card, one series per price source.
+    Query parameters: start and end (ISO dates, default the last year), points (buckets per series)
+    and source (comma-separated sources to include).
+    """
+    if game not in GAME_SOURCES:
+        return Response({'error': f'No price history for {game}'}, status=404)
+
+    try:
+        end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else timezone.localdate()
+        start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') else end - timedelta(days=PRICE_HISTORY_DAYS - 1)
+        points = min(int(request.query_params.get('points', PRICE_HISTORY_POINTS)), MAX_PRICE_HISTORY_POINTS)
+    except ValueError:
+        return Response({'error': 'start and end must be YYYY-MM-DD dates and points a number'}, status=400)
+    if start > end or points < 1:
+        return Response({'error': 'start must not be after end and points must be positive'}, status=400)
+    sources = [source for source in request.query_params.get('source', '').split(',') if source]
+
+    interval, series = price_series(game, card_id, start, end, points, sources or None)
+    return Response({
+        'game': game,
+        'card_id': card_id,
+        'start': start,
+        'end': end,
+        'interval_days': interval,
+        'series': {
+            source: [
+                {'date': bucket, 'price': str(price), 'low': str(low), 'high': str(high)}
+                for bucket, price, low, high in buckets
+            ]
+            for source, buckets in series.items()
+        },
+    })
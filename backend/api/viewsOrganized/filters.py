@@ -0,0 +1,16 @@
+from decimal import Decimal, InvalidOperation
+from django.db.models import Q
+
+def price_range(request, field):
+    """
+    Q filtering the numeric price column `field` by the min_price/max_price query parameters.
+    """
+    query = Q()
+    for param, lookup in (('min_price', 'gte'), ('max_price', 'lte')):
+        value = request.GET.get(param)
+        if value:
+            price = Decimal(value)
+            if not price.is_finite():
+                raise InvalidOperation(value)
+            query &= Q(**{f'{field}__{lookup}': price})
+    return query
@@ -1,9 +1,23 @@
+from decimal import InvalidOperation
 from rest_framework.decorators import api_view
 from ..models import MTGCardsData, ListCard
 from django.core.paginator import Paginator, EmptyPage
 from rest_framework.response import Response
 from django.http import JsonResponse
-from django.db.models import Q, Count
+from django.db.models import F, Q, Count
+from .filters import price_range
+
+# Generated numeric columns extracted from the prices JSON, selected with ?currency=
+PRICE_FIELDS = {
+    'usd': 'price_usd',
+    'usd_foil': 'price_usd_foil',
+    'eur': 'price_eur',
+    'tix': 'price_tix',
+}
+
+def price_ordering(field, descending):
+    # Cards without a price in the chosen currency go last either way
+    return [F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)]
 
 @api_view(['GET'])
 def get_mtg_cards_by_list(request, list_id):
@@ -14,6 +28,7 @@ def get_mtg_cards_by_list(request, list_id):
     rarity_filter = request.GET.get('rarity', None)
     set_filter = request.GET.get('set', None)
     sort_option = request.GET.get('sort', None)
+    price_field = PRICE_FIELDS.get(request.GET.get('currency', 'usd'), 'price_usd')
 
     # Query to get cards related to a specific list and count how many of each card is in the list
     list_cards_query = ListCard.objects.filter(card_list_id=list_id, mtg_card__isnull=False).values('mtg_card').annotate(card_count=Count('id'))
@@ -26,20 +41,22 @@ def get_mtg_cards_by_list(request, list_id):
         query &= Q(mtg_card__rarity=rarity_filter)
     if set_filter:
         query &= Q(mtg_card__set_name__icontains=set_filter)
+    try:
+        query &= price_range(request, f'mtg_card__{price_field}')
+    except InvalidOperation:
+        return Response({'error': 'min_price and max_price must be numbers'}, status=400)
     list_cards_query = list_cards_query.filter(query)
 
     # Sorting based on card name or price
-    sort_by = '-card_count'
+    sort_by = ['-card_count']
     if sort_option == 'name_asc':
-        sort_by = 'mtg_card__name'
+        sort_by = ['mtg_card__name']
     elif sort_option == 'name_desc':
-        sort_by = '-mtg_card__name'
-    elif sort_option == 'price_asc':
-        sort_by = 'mtg_card__prices'
-    elif sort_option == 'price_desc':
-        sort_by = '-mtg_card__prices'
+        sort_by = ['-mtg_card__name']
+    elif sort_option in ('price_asc', 'price_desc'):
+        sort_by = price_ordering(f'mtg_card__{price_field}', sort_option == 'price_desc') + ['mtg_card']
 
-    list_cards_query = list_cards_query.order_by(sort_by)
+    list_cards_query = list_cards_query.order_by(*sort_by)
 
     paginator = Paginator(list_cards_query, page_size)
     try:
@@ -113,6 +130,7 @@ def fetch_mtg_cards(request):
     rarity_filter = request.GET.get('rarity', None)
     set_filter = request.GET.get('set', None)
     sort_option = request.GET.get('sort', None)
+    price_field = PRICE_FIELDS.get(request.GET.get('currency', 'usd'), 'price_usd')
 
     # Build query to search cards by name or type
     query = Q(name__icontains=search_term) | Q(type_line__icontains=search_term)
@@ -122,18 +140,20 @@ def fetch_mtg_cards(request):
         query &= Q(rarity=rarity_filter)
     if set_filter:
         query &= Q(set_name__icontains=set_filter)
+    try:
+        query &= price_range(request, price_field)
+    except InvalidOperation:
+        return Response({'error': 'min_price and max_price must be numbers'}, status=400)
 
-    # Sorting options for cards
-    sort_by = 'name'
+    # Sorting options for cards; prices sort on the indexed generated column of the chosen currency
+    sort_by = ['name']
     if sort_option == 'name_desc':
-        sort_by = '-name'
-    elif sort_option == 'price_asc':
-        sort_by = 'prices'
-    elif sort_option == 'price_desc':
-        sort_by = '-prices'
+        sort_by = ['-name']
+    elif sort_option in ('price_asc', 'price_desc'):
+        sort_by = price_ordering(price_field, sort_option == 'price_desc') + ['id']
 
     try:
-        cards_query = MTGCardsData.objects.filter(query).order_by(sort_by).prefetch_related('card_faces', 'all_parts')
+        cards_query = MTGCardsData.objects.filter(query).order_by(*sort_by).prefetch_related('card_faces', 'all_parts')
         paginator = Paginator(cards_query, 20)
 
         try:
@@ -3,14 +3,7 @@ from rest_framework.decorators import api_view
 from ..models import PokemonCardData
 from django.core.paginator import Paginator, EmptyPage
 from django.http import JsonResponse
-from django.db.models import FloatField, Value, ExpressionWrapper, F, Func, Count
-from django.db.models.functions import Coalesce
-
-# Custom Django ORM function to extract a numeric value from JSONB data
-class JsonbExtractPathCast(Func):
-    function = 'JSONB_EXTRACT_PATH_TEXT'
-    template = "(CAST(JSONB_EXTRACT_PATH_TEXT(%(expressions)s) AS NUMERIC))"
-    output_field = FloatField()
+from django.db.models import Count, F
 
 @api_view(['GET'])
 def get_pokemon_cards_by_list(request, list_id):
@@ -25,25 +18,8 @@ def get_pokemon_cards_by_list(request, list_id):
         set_filter = request.GET.get('set', '').strip()
         sort_by = request.GET.get('sort', None)
 
-        # Query for fetching cards with combined price from tcgplayer and cardmarket
+        # Prices sort on the combined_average_price stored with each card at ingestion
         cards_query = PokemonCardData.objects.filter(listcard__card_list_id=list_id).annotate(
-            tcgplayer_market=Coalesce(
-                JsonbExtractPathCast('tcgplayer__prices', Value('holofoil'), Value('market')),
-                JsonbExtractPathCast('tcgplayer__prices', Value('normal'), Value('market')),
-                Value(0.0),
-                output_field=FloatField()
-            ),
-            cardmarket_market=Coalesce(
-                JsonbExtractPathCast('cardmarket__prices', Value('reverseHoloTrend')),
-                JsonbExtractPathCast('cardmarket__prices', Value('trendPrice')),
-                Value(0.0),
-                output_field=FloatField()
-            )
-        ).annotate(
-            combined_average_price=ExpressionWrapper(
-                F('tcgplayer_market') + F('cardmarket_market'),
-                output_field=FloatField()
-            ),
             card_count=Count('id')
         )
 
@@ -68,9 +44,9 @@ def get_pokemon_cards_by_list(request, list_id):
             elif sort_by == 'name_desc':
                 cards_query = cards_query.order_by('-name')
             elif sort_by == 'price_asc':
-                cards_query = cards_query.order_by('combined_average_price')
+                cards_query = cards_query.order_by('combined_average_price', 'id')
             elif sort_by == 'price_desc':
-                cards_query = cards_query.order_by('-combined_average_price')
+                cards_query = cards_query.order_by('-combined_average_price', 'id')
         else:
             cards_query = cards_query.order_by('set__releaseDate')
 
@@ -200,25 +176,8 @@ def pokemon_cards_api(request):
         rarity_filter = request.GET.get('rarity', '').strip()
         set_filter = request.GET.get('set', '').strip()
 
-        cards_query = PokemonCardData.objects.annotate(
-            tcgplayer_market=Coalesce(
-                JsonbExtractPathCast('tcgplayer__prices', Value('holofoil'), Value('market')),
-                JsonbExtractPathCast('tcgplayer__prices', Value('normal'), Value('market')),
-                Value(0.0),
-                output_field=FloatField()
-            ),
-            cardmarket_market=Coalesce(
-                JsonbExtractPathCast('cardmarket__prices', Value('reverseHoloTrend')),
-                JsonbExtractPathCast('cardmarket__prices', Value('trendPrice')),
-                Value(0.0),
-                output_field=FloatField()
-            )
-        ).annotate(
-            combined_average_price=ExpressionWrapper(
-                F('tcgplayer_market') + F('cardmarket_market'),
-                output_field=FloatField()
-            )
-        )
+        # Prices sort on the indexed combined_average_price stored with each card at ingestion
+        cards_query = PokemonCardData.objects.select_related('tcgplayer', 'cardmarket')
 
         if list_id and not isInAddMode:
             cards_query = cards_query.filter(listcard__card_list_id=list_id)
@@ -242,9 +201,9 @@ def pokemon_cards_api(request):
             elif sort_by == 'name_desc':
                 cards_query = cards_query.order_by('-name')
             elif sort_by == 'price_asc':
-                cards_query = cards_query.order_by('combined_average_price')
+                cards_query = cards_query.order_by('combined_average_price', 'id')
             elif sort_by == 'price_desc':
-                cards_query = cards_query.order_by('-combined_average_price')
+                cards_query = cards_query.order_by('-combined_average_price', 'id')
 
         paginator = Paginator(cards_query, page_size)
         try:
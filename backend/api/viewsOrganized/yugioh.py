@@ -1,9 +1,11 @@
+from decimal import InvalidOperation
 from ..models import CardSet, YugiohCard, ListCard
 from django.core.paginator import Paginator, EmptyPage
 from django.http import JsonResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.db.models import Q, Count
+from .filters import price_range
 
 @api_view(['GET'])
 def fetch_yugioh_cards(request):
@@ -19,7 +21,10 @@ def fetch_yugioh_cards(request):
         rarity_filter = request.GET.get('rarity', None)
         sort_option = request.GET.get('sort', None)
 
-        query = Q(name__icontains=search_term)
+        try:
+            query = Q(name__icontains=search_term) & price_range(request, 'market_price')
+        except InvalidOperation:
+            return Response({'error': 'min_price and max_price must be numbers'}, status=400)
         if type_filter:
             query &= Q(card_type=type_filter)
         if frame_type_filter:
@@ -33,23 +38,15 @@ def fetch_yugioh_cards(request):
         if rarity_filter:
             query &= Q(card_sets__set_rarity=rarity_filter)
 
+        # Prices sort on the card's indexed market price, so no join through card_prices is needed
         sort_options = {
-            'name_asc': 'name',
-            'name_desc': '-name',
-            'price_asc': 'card_prices__cardmarket_price',
-            'price_desc': '-card_prices__cardmarket_price',
+            'name_asc': ['name'],
+            'name_desc': ['-name'],
+            'price_asc': ['market_price', 'id'],
+            'price_desc': ['-market_price', 'id'],
         }
 
-        sort_by = sort_options.get(sort_option, 'name')
-
-        # Handle sorting by multiple price fields
-        if sort_option and 'price' in sort_option:
-            additional_price_fields = ['card_prices__ebay_price', 'card_prices__amazon_price']
-            if sort_option.startswith('price_desc'):
-                additional_price_fields = ['-' + field for field in additional_price_fields]
-            sort_by = [sort_by] + additional_price_fields
-        else:
-            sort_by = [sort_by]
+        sort_by = sort_options.get(sort_option, ['name'])
 
         cards = YugiohCard.objects.filter(query).order_by(*sort_by).prefetch_related('card_sets', 'card_images', 'card_prices')
 
@@ -106,7 +103,10 @@ def get_yugioh_cards_by_list(request, list_id):
             yugioh_card__isnull=False
         )
 
-        query = Q(yugioh_card__name__icontains=search_term)
+        try:
+            query = Q(yugioh_card__name__icontains=search_term) & price_range(request, 'yugioh_card__market_price')
+        except InvalidOperation:
+            return Response({'error': 'min_price and max_price must be numbers'}, status=400)
         if type_filter:
             query &= Q(yugioh_card__card_type=type_filter)
         if frame_type_filter:
@@ -127,20 +127,13 @@ def get_yugioh_cards_by_list(request, list_id):
         )
 
         sort_options = {
-            'name_asc': 'yugioh_card__name',
-            'name_desc': '-yugioh_card__name',
-            'price_asc': 'yugioh_card__card_prices__cardmarket_price',
-            'price_desc': '-yugioh_card__card_prices__cardmarket_price',
+            'name_asc': ['yugioh_card__name'],
+            'name_desc': ['-yugioh_card__name'],
+            'price_asc': ['yugioh_card__market_price', 'yugioh_card_id'],
+            'price_desc': ['-yugioh_card__market_price', 'yugioh_card_id'],
         }
 
-        sort_by = sort_options.get(sort_option, 'yugioh_card__name')
-        sort_criteria = [sort_by]
-
-        if 'price' in sort_option:
-            additional_price_fields = ['yugioh_card__card_prices__ebay_price', 'yugioh_card__card_prices__amazon_price']
-            if sort_option.startswith('price_desc'):
-                additional_price_fields = ['-' + field for field in additional_price_fields]
-            sort_criteria.extend(additional_price_fields)
+        sort_criteria = sort_options.get(sort_option, ['yugioh_card__name'])
 
         list_cards_query = list_cards_query.order_by(*sort_criteria)
 
@@ -0,0 +1,83 @@
+import io
+from unittest.mock import patch
+import requests
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase
+from backend.celery import app
+from api.ingestion.pipeline import IngestionMetrics
+from api.ingestion.stats import WriteStats
+from api.tasks import refresh_catalogs, reconcile_catalog_sync
+
+def fake_metrics(inserted=0, unchanged=0):
+    metrics = IngestionMetrics()
+    metrics.stats = WriteStats(inserted=inserted, unchanged=unchanged)
+    metrics.rows = inserted + unchanged
+    return metrics
+
+class RefreshCatalogsTaskTest(TestCase):
+
+    def setUp(self):
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+    def test_fans_out_shards_and_reconciles(self):
+        shards = {
+            'yugioh': [{'game': 'yugioh', 'offset': 0, 'num': 2}, {'game': 'yugioh', 'offset': 2, 'num': 2}],
+            'lorcana': [{'game': 'lorcana'}],
+        }
+        ran = []
+
+        def run_shard(shard):
+            ran.append(shard)
+            if shard['game'] == 'lorcana':
+                raise requests.ConnectionError('down')
+            return fake_metrics(inserted=shard['offset'], unchanged=2 - shard['offset'])
+
+        with patch('api.tasks.plan_shards', side_effect=lambda game, *args: shards[game]), \
+                patch('api.tasks.run_shard', side_effect=run_shard), \
+                patch('api.tasks.sync_catalog_shard.max_retries', 0), \
+                self.assertLogs('api.tasks', 'INFO') as logs:
+            refresh_catalogs.delay(['yugioh', 'lorcana'])
+
+        self.assertEqual(len(ran), 3)
+        self.assertIn('1 failed shards', logs.output[-1])
+
+    def test_database_errors_fail_only_their_shard(self):
+        shards = [{'game': 'mtg', 'first_page': page, 'last_page': page} for page in (1, 2, 3)]
+        errors = {1: OperationalError('deadlock detected'), 2: IntegrityError('duplicate key')}
+
+        def run_shard(shard):
+            if shard['first_page'] in errors:
+                raise errors[shard['first_page']]
+            return fake_metrics(inserted=1)
+
+        with patch('api.tasks.plan_shards', return_value=shards), \
+                patch('api.tasks.run_shard', side_effect=run_shard), \
+                patch('api.tasks.sync_catalog_shard.max_retries', 0), \
+                self.assertLogs('api.tasks', 'INFO') as logs:
+            refresh_catalogs.delay(['mtg'])
+
+        self.assertIn("'inserted': 1", logs.output[-1])
+        self.assertIn('2 failed shards', logs.output[-1])
+
+    def test_reconcile_totals_results_and_reports_failures(self):
+        results = [
+            {'shard': {'game': 'mtg', 'first_page': 1, 'last_page': 2}, 'rows': 5, 'inserted': 1, 'changed': 1, 'unchanged': 3, 'skipped': 0, 'seconds': 1.0},
+            {'shard': {'game': 'mtg', 'first_page': 3, 'last_page': 3}, 'error': 'HTTP 503'},
+        ]
+
+        with self.assertLogs('api.tasks', 'INFO'):
+            summary = reconcile_catalog_sync(results, ['mtg'])
+
+        self.assertEqual(summary['totals'], {'rows': 5, 'inserted': 1, 'changed': 1, 'unchanged': 3, 'skipped': 0})
+        self.assertEqual(summary['failed'], [{'game': 'mtg', 'first_page': 3, 'last_page': 3}])
+
+    def test_command_queues_refresh(self):
+        out = io.StringIO()
+        with patch('api.management.commands.refresh_catalogs.refresh_catalogs.delay') as delay:
+            delay.return_value.id = 'abc'
+            call_command('refresh_catalogs', 'mtg', shard_size=5, stdout=out)
+
+        delay.assert_called_once_with(['mtg'], False, 5)
+        self.assertIn('task abc', out.getvalue())
@@ -0,0 +1,117 @@
+import io
+import json
+import tempfile
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from api.ingestion.copy import StagingTable
+from api.models import (
+    CardList, ListCard, CardImage, CardPrice, CardSet, MTGCardFace, MTGCardsData, MTGRelatedCard,
+    PokemonAttack, PokemonCardData, PokemonCardmarket, PokemonTcgplayer, PriceChange, YugiohCard
+)
+from tests.test_mtg_ingestion import make_card as make_mtg_card, TRANSFORM
+from tests.test_pokemon_ingestion import make_card as make_pokemon_card
+from tests.test_yugioh_ingestion import make_card as make_yugioh_card
+
+class LoadCatalogCommandTest(TestCase):
+
+    def run_command(self, game, payload, batch_size=2):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as dump:
+            json.dump(payload, dump)
+            dump.flush()
+            call_command('load_catalog', game, file=dump.name, batch_size=batch_size, stdout=out)
+        return out.getvalue()
+
+    def test_loads_yugioh_cards_and_children(self):
+        tricky = make_yugioh_card(2, name='Tab\tand\\newline\nÉ')
+        self.run_command('yugioh', {'data': [make_yugioh_card(1), tricky, make_yugioh_card(3)]})
+        deck = CardList.objects.create(created_by='tester', name='Deck', type='Yugioh', market_value=Decimal('3.10'))
+        ListCard.objects.create(card_list=deck, yugioh_card_id=3)
+
+        output = self.run_command('yugioh', {'data': [make_yugioh_card(1), tricky, make_yugioh_card(3, price='8.00')]})
+
+        self.assertIn('0 inserted, 1 changed, 2 unchanged', output)
+        self.assertEqual(YugiohCard.objects.get(id=2).name, 'Tab\tand\\newline\nÉ')
+        self.assertEqual(CardPrice.objects.get(yugioh_card_id=3).cardmarket_price, Decimal('8.00'))
+        self.assertEqual((CardSet.objects.count(), CardImage.objects.count(), CardPrice.objects.count()), (3, 3, 3))
+        # The moved price reaches the lists holding the card in the merge transaction
+        self.assertEqual(CardList.objects.get(id=deck.id).market_value, YugiohCard.objects.get(id=3).market_price)
+        self.assertFalse(PriceChange.objects.exists())
+
+    def test_card_staged_more_than_once_keeps_its_last_staged_row(self):
+        self.run_command('yugioh', {'data': [make_yugioh_card(5)]})
+        deck = CardList.objects.create(created_by='tester', name='Deck', type='Yugioh', market_value=Decimal('3.10'))
+        ListCard.objects.create(card_list=deck, yugioh_card_id=5)
+
+        # One card per batch, so each copy of the card is a separate staged row
+        prices = ['1.00', '2.50', '3.50', '4.50']
+        self.run_command('yugioh', {'data': [make_yugioh_card(5, price=price) for price in prices]}, batch_size=1)
+
+        card = YugiohCard.objects.get(id=5)
+        self.assertEqual(card.market_price, Decimal('3.70'))
+        # The recorded price change and the price history follow the row that was stored
+        self.assertEqual(CardList.objects.get(id=deck.id).market_value, card.market_price)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT price FROM api_pricehistory WHERE card_id = '5' AND source = 'market'")
+            self.assertEqual(cursor.fetchall(), [(card.market_price,)])
+
+    def test_staging_tables_are_private_to_the_session(self):
+        table = StagingTable(YugiohCard, ['id', 'name'])
+        with connection.cursor() as cursor:
+            table.create(cursor)
+            cursor.execute('SELECT relpersistence FROM pg_class WHERE oid = %s::regclass', [table.name])
+            self.assertEqual(cursor.fetchone()[0], 't')
+            table.drop(cursor)
+
+    def test_loads_mtg_cards_faces_and_parts(self):
+        output = self.run_command('mtg', [make_mtg_card('card-1'), TRANSFORM, make_mtg_card('no-oracle', oracle_id=None)])
+
+        self.assertIn('2 inserted, 0 changed, 0 unchanged, 1 skipped', output)
+        card = MTGCardsData.objects.get(id='dfc-1')
+        self.assertEqual([face.name for face in card.card_faces.order_by('id')], ['Front', 'Back'])
+        self.assertEqual([part.name for part in card.all_parts.all()], ['Wolf'])
+        self.assertEqual((MTGCardFace.objects.count(), MTGRelatedCard.objects.count()), (2, 1))
+
+    def test_loads_pokemon_cards_with_prices_and_links(self):
+        first = make_pokemon_card('base1-1')
+        first['rules'] = ['Say "hi"', 'Back\\slash']
+        self.run_command('pokemon', {'data': [first, make_pokemon_card('base1-2', attack_name='Scratch')]})
+
+        output = self.run_command('pokemon', {'data': [first, make_pokemon_card('base1-2', price=4.0)]})
+
+        self.assertIn('0 inserted, 1 changed, 1 unchanged', output)
+        card = PokemonCardData.objects.get(id='base1-1')
+        self.assertEqual(card.rules, ['Say "hi"', 'Back\\slash'])
+        self.assertEqual(card.tcgplayer.url, 'https://prices.pokemontcg.io/tcgplayer/base1-1')
+        self.assertEqual(PokemonCardData.objects.get(id='base1-2').cardmarket.prices, {'averageSellPrice': 4.0})
+        self.assertEqual([attack.name for attack in PokemonCardData.objects.get(id='base1-2').attacks.all()], ['Tackle'])
+        self.assertEqual((PokemonTcgplayer.objects.count(), PokemonCardmarket.objects.count()), (2, 2))
+        self.assertEqual(PokemonAttack.objects.count(), 2)
+
+    def test_swap_replaces_catalog_and_detaches_missing_cards(self):
+        self.run_command('mtg', [make_mtg_card('card-1'), make_mtg_card('gone-1'), TRANSFORM])
+        card_list = CardList.objects.create(name='Deck', type='mtg', created_by='tester', market_value=Decimal('2.00'), collection_value=Decimal('1.00'))
+        kept = ListCard.objects.create(card_list=card_list, mtg_card_id='card-1', collected=True)
+        detached = ListCard.objects.create(card_list=card_list, mtg_card_id='gone-1')
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as dump:
+            json.dump([make_mtg_card('card-1', usd='2.00'), TRANSFORM], dump)
+            dump.flush()
+            call_command('load_catalog', 'mtg', file=dump.name, swap=True, stdout=io.StringIO())
+
+        self.assertEqual(sorted(MTGCardsData.objects.values_list('id', flat=True)), ['card-1', 'dfc-1'])
+        self.assertEqual(MTGCardsData.objects.get(id='card-1').prices, {'usd': '2.00'})
+        self.assertEqual(MTGCardFace.objects.count(), 2)
+        self.assertEqual(ListCard.objects.get(id=kept.id).mtg_card_id, 'card-1')
+        self.assertIsNone(ListCard.objects.get(id=detached.id).mtg_card_id)
+        # card-1 went from 1.00 to 2.00 and gone-1 is worth nothing once detached
+        card_list.refresh_from_db()
+        self.assertEqual((card_list.market_value, card_list.collection_value), (Decimal('2.00'), Decimal('2.00')))
+        self.assertFalse(PriceChange.objects.exists())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relname FROM pg_class WHERE relname LIKE 'shadow%%' OR relname LIKE 'retired%%'")
+            self.assertEqual(cursor.fetchall(), [])
+            cursor.execute("SELECT count(*) FROM pg_constraint WHERE contype = 'f' AND confrelid = 'api_mtgcardsdata'::regclass")
+            self.assertEqual(cursor.fetchone()[0], 3)
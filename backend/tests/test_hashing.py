@@ -0,0 +1,32 @@
+from django.test import TestCase
+from api.ingestion.hashing import content_hash, split_unchanged
+from api.models import LorcanaCardData
+
+class ContentHashTest(TestCase):
+
+    def test_hash_ignores_key_order(self):
+        self.assertEqual(content_hash({'a': 1, 'b': [1, {'c': 2, 'd': 3}]}), content_hash({'b': [1, {'d': 3, 'c': 2}], 'a': 1}))
+        self.assertNotEqual(content_hash({'a': 1}), content_hash({'a': 2}))
+
+    def test_split_unchanged(self):
+        record = {'Name': 'Ariel', 'Cost': 3}
+        LorcanaCardData.objects.create(
+            name='Ariel', artist='A', set_name='S', set_num=1, color='Amber', image='https://example.com/a.png',
+            cost=3, inkable=True, type='Character', rarity='Rare', card_num=1, set_id='TFC',
+            content_hash=content_hash(record),
+        )
+        LorcanaCardData.objects.create(
+            name='Belle', artist='A', set_name='S', set_num=1, color='Amber', image='https://example.com/b.png',
+            cost=3, inkable=True, type='Character', rarity='Rare', card_num=2, set_id='TFC',
+        )
+
+        pending, hashes, stats = split_unchanged(
+            LorcanaCardData,
+            [record, {'Name': 'Belle'}, {'Name': 'Cinderella'}, {'Name': 'Cinderella'}],
+            key=lambda card: card['Name'],
+            key_field='name',
+        )
+
+        self.assertEqual(sorted(pending), ['Belle', 'Cinderella'])
+        self.assertEqual(len(hashes), 3)
+        self.assertEqual((stats.inserted, stats.changed, stats.unchanged), (1, 1, 1))
@@ -0,0 +1,112 @@
+import io
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+import requests
+from django.test import SimpleTestCase
+from api.ingestion.http import ConcurrentPageFetcher, PageFetchError, TokenBucket, build_session, is_unchanged, mark_ingested
+
+class FakeSession:
+    """
+    Serves `total` numbered items in pages, the way pokemontcg.io does.
+    """
+
+    def __init__(self, total, fail_page=None):
+        self.total = total
+        self.fail_page = fail_page
+        self.requested = []
+
+    def get(self, url, params=None):
+        page, page_size = params['page'], params['pageSize']
+        self.requested.append(page)
+        response = MagicMock()
+        response.status_code = 500 if page == self.fail_page else 200
+        start = (page - 1) * page_size
+        response.json.return_value = {
+            'data': list(range(start, min(start + page_size, self.total))),
+            'totalCount': self.total,
+        }
+        return response
+
+class ConcurrentPageFetcherTest(SimpleTestCase):
+
+    def test_plans_pages_from_total_count(self):
+        session = FakeSession(total=23)
+        fetcher = ConcurrentPageFetcher(session, 'https://example.com', page_size=5, workers=3, rate=1000, queue_size=2)
+
+        pages = dict(fetcher)
+
+        self.assertEqual(sorted(pages), [1, 2, 3, 4, 5])
+        self.assertEqual(sorted(item for payload in pages.values() for item in payload['data']), list(range(23)))
+        self.assertEqual(fetcher.total_count, 23)
+
+    def test_single_page(self):
+        fetcher = ConcurrentPageFetcher(FakeSession(total=3), 'https://example.com', page_size=5, rate=1000)
+
+        self.assertEqual([page for page, _ in fetcher], [1])
+
+    def test_failed_page_raises(self):
+        fetcher = ConcurrentPageFetcher(FakeSession(total=20, fail_page=3), 'https://example.com', page_size=5, rate=1000)
+
+        with self.assertRaises(PageFetchError):
+            list(fetcher)
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_limits_rate_after_burst(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+class CachingAdapterTest(SimpleTestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.session = build_session(cache_dir=cache_dir.name, retries=0)
+        self.sent = []
+
+    def upstream(self, request, **kwargs):
+        self.sent.append(dict(request.headers))
+        response = requests.Response()
+        response.request = request
+        if request.headers.get('If-Modified-Since') == 'Wed, 01 May 2024 00:00:00 GMT':
+            response.status_code = 304
+            response.raw = io.BytesIO(b'')
+        else:
+            response.status_code = 200
+            response.headers['Last-Modified'] = 'Wed, 01 May 2024 00:00:00 GMT'
+            response.raw = io.BytesIO(b'{"data": [1, 2]}')
+        return response
+
+    def test_not_modified_is_served_from_cache_and_unchanged_once_ingested(self):
+        with patch('requests.adapters.HTTPAdapter.send', lambda adapter, request, **kwargs: self.upstream(request)):
+            first = self.session.get('https://example.com/cards')
+            second = self.session.get('https://example.com/cards')
+            mark_ingested(self.session, second)
+            third = self.session.get('https://example.com/cards')
+
+        self.assertFalse(is_unchanged(first))
+        self.assertEqual(second.json(), {'data': [1, 2]})
+        # The cached body's file is closed once requests has read it
+        self.assertTrue(second.raw.file.closed)
+        self.assertFalse(is_unchanged(second))
+        self.assertTrue(is_unchanged(third))
+        self.assertNotIn('If-Modified-Since', self.sent[0])
+        self.assertEqual(self.sent[1]['If-Modified-Since'], 'Wed, 01 May 2024 00:00:00 GMT')
+
+    def test_streamed_body_is_cached_as_it_is_read(self):
+        with patch('requests.adapters.HTTPAdapter.send', lambda adapter, request, **kwargs: self.upstream(request)):
+            first = self.session.get('https://example.com/cards', stream=True)
+            self.assertEqual(first.raw.read(5), b'{"dat')
+            # Nothing is cached until the whole body went through
+            self.assertIsNone(self.session.http_cache.load(first.cache_key))
+            mark_ingested(self.session, first)
+            second = self.session.get('https://example.com/cards', stream=True)
+
+        self.assertTrue(is_unchanged(second))
+        self.assertEqual(second.raw.read(), b'{"data": [1, 2]}')
+        second.close()
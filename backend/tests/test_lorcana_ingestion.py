@@ -0,0 +1,110 @@
+import io
+import json
+import tempfile
+from unittest.mock import patch
+import requests
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from api.models import LorcanaCardData
+
+def make_card(name, card_num=1, cost=3, set_id='TFC'):
+    return {
+        'Artist': 'Test Artist',
+        'Set_Name': 'The First Chapter',
+        'Set_Num': 1,
+        'Color': 'Amber',
+        'Image': f'https://example.com/{card_num}.png',
+        'Cost': cost,
+        'Inkable': True,
+        'Name': name,
+        'Type': 'Character',
+        'Rarity': 'Rare',
+        'Flavor_Text': '',
+        'Card_Num': card_num,
+        'Body_Text': '',
+        'Set_ID': set_id,
+    }
+
+class FetchLorcanaCardsCommandTest(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(INGESTION_CACHE_DIR=cache_dir.name, INGESTION_ARCHIVE_DIR=cache_dir.name + '/archive')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.requests = []
+
+    def respond(self, cards, etag=None):
+        def send(adapter, request, **kwargs):
+            self.requests.append(request)
+            response = requests.Response()
+            response.request = request
+            if etag and request.headers.get('If-None-Match') == etag:
+                response.status_code = 304
+                response.raw = io.BytesIO(b'')
+            else:
+                response.status_code = 200
+                response.raw = io.BytesIO(json.dumps(cards).encode())
+                if etag:
+                    response.headers['ETag'] = etag
+            return response
+        return patch('requests.adapters.HTTPAdapter.send', send)
+
+    def run_command(self, cards, etag=None):
+        out = io.StringIO()
+        with self.respond(cards, etag):
+            call_command('fetch_lorcana_cards', stdout=out)
+        return out.getvalue()
+
+    def test_inserts_updates_and_reports_summary(self):
+        self.run_command([make_card('Ariel - On Human Legs', 1), make_card('Belle - Bookworm', 2)])
+        output = self.run_command([make_card('Ariel - On Human Legs', 1, cost=4), make_card('Belle - Bookworm', 2)])
+
+        self.assertEqual(LorcanaCardData.objects.count(), 2)
+        self.assertEqual(LorcanaCardData.objects.get(card_num=1).cost, 4)
+        self.assertIn('0 inserted, 1 changed, 1 unchanged', output)
+
+    def test_keys_cards_by_set_and_number(self):
+        self.run_command([make_card('Ariel - On Human Legs', 1)])
+        self.run_command([make_card('Ariel - On Human Legs', 1, set_id='ROF'), make_card('Ariel - Spectacular Singer', 1)])
+
+        self.assertEqual(LorcanaCardData.objects.count(), 2)
+        self.assertEqual(LorcanaCardData.objects.get(set_id='TFC', card_num=1).name, 'Ariel - Spectacular Singer')
+
+    def test_full_refresh_is_a_few_statements(self):
+        cards = [make_card(f'Card {number}', number) for number in range(1, 51)]
+        self.run_command(cards)
+        cards[0]['Cost'] = 7
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self.run_command(cards)
+
+        # Includes recording the changed card's price move and applying it to the lists
+        self.assertLessEqual(len(queries), 8)
+        self.assertIn('0 inserted, 1 changed, 49 unchanged', output)
+        self.assertEqual(output.count('\n'), 1)
+
+    def test_not_modified_response_skips_ingestion(self):
+        cards = [make_card('Ariel - On Human Legs', 1)]
+        self.run_command(cards, etag='"v1"')
+
+        with patch('api.management.commands.fetch_lorcana_cards.run_pipeline') as run_pipeline:
+            output = self.run_command(cards, etag='"v1"')
+
+        run_pipeline.assert_not_called()
+        self.assertIn('unchanged upstream', output)
+        self.assertEqual(self.requests[-1].headers['If-None-Match'], '"v1"')
+
+    def test_not_modified_body_is_ingested_when_last_run_failed(self):
+        cards = [make_card('Ariel - On Human Legs', 1)]
+        with patch('api.management.commands.fetch_lorcana_cards.run_pipeline', side_effect=ValueError('bad batch')):
+            with self.assertRaises(CommandError):
+                self.run_command(cards, etag='"v1"')
+
+        self.run_command(cards, etag='"v1"')
+
+        self.assertEqual(LorcanaCardData.objects.count(), 1)
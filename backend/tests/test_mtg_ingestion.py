@@ -0,0 +1,108 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase
+from api.ingestion.checkpoints import start_checkpoint
+from api.ingestion.mtg import write_chunk
+from api.models import MTGCardsData, MTGCardFace, MTGRelatedCard, IngestionCheckpoint
+
+def make_card(card_id, usd='1.00', **extra):
+    card = {
+        'id': card_id,
+        'oracle_id': '5f6f6a1b-25d4-4d13-8f52-0b9a2b4c1f11',
+        'name': f'Card {card_id}',
+        'lang': 'en',
+        'released_at': '2023-01-01',
+        'uri': f'https://api.scryfall.com/cards/{card_id}',
+        'layout': 'normal',
+        'cmc': 2.0,
+        'type_line': 'Creature — Elf',
+        'color_identity': ['G'],
+        'keywords': [],
+        'legalities': {'modern': 'legal'},
+        'games': ['paper'],
+        'set': 'tst',
+        'set_name': 'Test Set',
+        'set_type': 'expansion',
+        'rarity': 'common',
+        'artist': 'Test Artist',
+        'prices': {'usd': usd},
+        'related_uris': {},
+    }
+    card.update(extra)
+    return card
+
+TRANSFORM = make_card(
+    'dfc-1',
+    layout='transform',
+    card_faces=[
+        {'name': 'Front', 'mana_cost': '{G}', 'type_line': 'Creature', 'oracle_text': 'Day', 'colors': ['G']},
+        {'name': 'Back', 'mana_cost': '', 'type_line': 'Creature', 'oracle_text': 'Night', 'colors': ['G']},
+    ],
+    all_parts=[{'id': 'token-1', 'component': 'token', 'name': 'Wolf', 'type_line': 'Token Creature — Wolf', 'uri': 'https://api.scryfall.com/cards/token-1'}],
+)
+
+class MTGBulkFileTest(TestCase):
+
+    def run_command(self, cards, batch_size=2):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as bulk_file:
+            json.dump(cards, bulk_file)
+            bulk_file.flush()
+            call_command('update_mtg_cards', bulk_file=bulk_file.name, batch_size=batch_size, stdout=io.StringIO())
+
+    def test_loads_cards_faces_and_parts(self):
+        self.run_command([make_card('card-1'), make_card('card-2'), TRANSFORM])
+
+        self.assertEqual(MTGCardsData.objects.count(), 3)
+        card = MTGCardsData.objects.get(id='dfc-1')
+        self.assertEqual([face.name for face in card.card_faces.order_by('id')], ['Front', 'Back'])
+        self.assertEqual([part.name for part in card.all_parts.all()], ['Wolf'])
+
+    def test_reload_updates_in_place(self):
+        self.run_command([make_card('card-1'), TRANSFORM])
+        self.run_command([make_card('card-1', usd='3.50'), TRANSFORM])
+
+        self.assertEqual(MTGCardsData.objects.get(id='card-1').prices, {'usd': '3.50'})
+        self.assertEqual(MTGCardFace.objects.count(), 2)
+        self.assertEqual(MTGRelatedCard.objects.count(), 1)
+
+    def test_resume_continues_after_last_committed_batch(self):
+        cards = [make_card('card-1'), make_card('card-2'), make_card('card-3')]
+        calls = []
+        failures = [RuntimeError('connection lost')]
+
+        def flaky_write_chunk(chunk):
+            calls.append([card['id'] for card in chunk])
+            if len(calls) == 2 and failures:
+                raise failures.pop()
+            return write_chunk(chunk)
+
+        with patch('api.ingestion.mtg.write_chunk', side_effect=flaky_write_chunk):
+            with self.assertRaises(RuntimeError):
+                self.run_command(cards, batch_size=1)
+            checkpoint = IngestionCheckpoint.objects.get(source='mtg')
+            self.assertEqual((checkpoint.batch_id, checkpoint.cursor['items']), (1, 1))
+
+            calls.clear()
+            with tempfile.NamedTemporaryFile('w', suffix='.json') as bulk_file:
+                json.dump(cards, bulk_file)
+                bulk_file.flush()
+                # The checkpoint is tied to the file name, so resume against a copy with the same name
+                checkpoint.cursor['run']['file'] = Path(bulk_file.name).name
+                checkpoint.save()
+                call_command('update_mtg_cards', bulk_file=bulk_file.name, batch_size=1, resume=True, stdout=io.StringIO())
+
+        self.assertEqual(calls, [['card-2'], ['card-3']])
+        self.assertEqual(MTGCardsData.objects.count(), 3)
+        self.assertIsNotNone(IngestionCheckpoint.objects.get(source='mtg').completed_at)
+
+    def test_resume_without_matching_checkpoint_starts_over(self):
+        start_checkpoint('mtg', {'mode': 'bulk', 'file': 'other.json'})
+
+        self.run_command([make_card('card-1')], batch_size=1)
+
+        checkpoint = IngestionCheckpoint.objects.get(source='mtg')
+        self.assertEqual(checkpoint.batch_id, 1)
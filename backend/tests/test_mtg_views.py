@@ -122,6 +122,28 @@ class MTGViewsTest(TestCase):
         data = response.json()['data']
         self.assertEqual(len(data), 1)
 
+    def test_price_sort_and_filters_use_numeric_price_columns(self):
+        for card_id, prices in (('cheap', {'usd': '9.90'}), ('dear', {'usd': '10.50', 'eur': '8.00'}), ('unpriced', {'usd': None})):
+            MTGCardsData.objects.create(
+                id=card_id, oracle_id=uuid.uuid4(), name=f'Priced {card_id}', lang='en', released_at='2023-01-01',
+                uri='https://test-mtg.com', layout='normal', type_line='Instant', color_identity=[], keywords=[],
+                legalities={}, games=[], set='tst', set_name='Priced Set', set_type='expansion', rarity='Common',
+                artist='', prices=prices, related_uris={},
+            )
+        self.assertEqual(MTGCardsData.objects.get(id='dear').price_usd, Decimal('10.50'))
+        self.assertIsNone(MTGCardsData.objects.get(id='unpriced').price_usd)
+
+        url = reverse('fetch_mtg_cards')
+        for sort, expected in (('price_asc', ['cheap', 'dear', 'unpriced']), ('price_desc', ['dear', 'cheap', 'unpriced'])):
+            response = self.client.get(url, {'search': 'Priced', 'sort': sort})
+            self.assertEqual([card['id'] for card in response.json()['data']], expected)
+
+        response = self.client.get(url, {'min_price': '5', 'max_price': '10'})
+        self.assertEqual([card['id'] for card in response.json()['data']], ['cheap'])
+        response = self.client.get(url, {'currency': 'eur', 'min_price': '1'})
+        self.assertEqual([card['id'] for card in response.json()['data']], ['dear'])
+        self.assertEqual(self.client.get(url, {'max_price': 'lots'}).status_code, 400)
+
     def test_get_mtg_cards_by_list(self):
         url = reverse('mtg-cards-by-list', kwargs={'list_id': self.card_list.id})
         response = self.client.get(url)
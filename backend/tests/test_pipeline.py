@@ -0,0 +1,155 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from api.ingestion.archive import RunArchive, archive_runs, FULL, PARTIAL
+from api.ingestion.checkpoints import start_checkpoint
+from api.ingestion.pipeline import game_writer, run_pipeline, DatabaseSink
+from api.ingestion.sources import StreamSource, FixtureSource, RecordingSource
+from api.ingestion.stats import WriteStats
+from api.models import IngestionCheckpoint, LorcanaCardData
+from tests.test_lorcana_ingestion import make_card as make_lorcana_card
+
+class SourcesTest(SimpleTestCase):
+
+    def test_stream_source_batches_and_resumes_by_item_count(self):
+        payload = json.dumps({'data': list(range(7))}).encode()
+
+        batches = list(StreamSource(io.BytesIO(payload), key='data', batch_size=3, cursor={'items': 2}))
+
+        self.assertEqual([batch.records for batch in batches], [[2, 3, 4], [5, 6]])
+        self.assertEqual([batch.cursor for batch in batches], [{'items': 5}, {'items': 7}])
+
+    def test_fixture_source_replays_recorded_pages(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pages.jsonl.gz')
+            with gzip.open(path, 'wt', encoding='utf-8') as fixture:
+                for page in ([1, 2], [3], [4, 5]):
+                    fixture.write(json.dumps({'data': page}) + '\n')
+
+            batches = list(FixtureSource(path, cursor={'pages': [2]}))
+
+        self.assertEqual([batch.records for batch in batches], [[1, 2], [4, 5]])
+        self.assertEqual(batches[-1].cursor, {'pages': [1, 2, 3]})
+
+    def test_unknown_game_is_rejected(self):
+        with self.assertRaises(ValueError):
+            game_writer('hearthstone')
+
+class RunPipelineTest(TestCase):
+
+    def test_collects_metrics_and_checkpoints_each_batch(self):
+        checkpoint = start_checkpoint('test', {'mode': 'test'})
+        source = StreamSource(io.BytesIO(b'[1, 2, 3, 4, 5]'), batch_size=2)
+
+        metrics = run_pipeline(source, DatabaseSink(lambda records: WriteStats(inserted=len(records)), checkpoint))
+
+        checkpoint.refresh_from_db()
+        self.assertEqual((metrics.rows, metrics.batches, metrics.errors), (5, 3, 0))
+        self.assertEqual(metrics.stats.inserted, 5)
+        self.assertEqual((checkpoint.batch_id, checkpoint.cursor['items']), (3, 5))
+        self.assertIsNotNone(checkpoint.completed_at)
+        self.assertIn('5 rows in 3 batches', str(metrics))
+
+    def test_failed_batch_rolls_back_its_checkpoint(self):
+        checkpoint = start_checkpoint('test', {'mode': 'test'})
+        source = StreamSource(io.BytesIO(b'[1, 2, 3]'), batch_size=1)
+
+        def write(records):
+            if records == [2]:
+                raise RuntimeError('boom')
+            return WriteStats(inserted=1)
+
+        with self.assertRaises(RuntimeError), self.assertLogs('api.ingestion.pipeline', 'ERROR'):
+            run_pipeline(source, DatabaseSink(write, checkpoint))
+
+        checkpoint = IngestionCheckpoint.objects.get(source='test')
+        self.assertEqual(checkpoint.cursor['items'], 1)
+        self.assertIsNone(checkpoint.completed_at)
+
+class RecordReplayTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.fixtures_dir = directory.name
+
+    def test_recorded_batches_replay_through_command(self):
+        path = os.path.join(self.fixtures_dir, 'lorcana.jsonl.gz')
+        cards = [make_lorcana_card('Ariel - On Human Legs', 1), make_lorcana_card('Belle - Bookworm', 2)]
+
+        recorded = list(RecordingSource(StreamSource(io.BytesIO(json.dumps(cards).encode()), batch_size=1), path))
+        call_command('fetch_lorcana_cards', replay=path, stdout=io.StringIO())
+
+        self.assertEqual(len(recorded), 2)
+        self.assertEqual(LorcanaCardData.objects.count(), 2)
+
+    def test_benchmark_reports_each_game_and_rolls_back(self):
+        path = os.path.join(self.fixtures_dir, 'lorcana.jsonl.gz')
+        with gzip.open(path, 'wt', encoding='utf-8') as fixture:
+            fixture.write(json.dumps({'data': [make_lorcana_card('Ariel - On Human Legs', 1)]}) + '\n')
+        out = io.StringIO()
+
+        call_command('benchmark_ingestion', fixtures_dir=self.fixtures_dir, stdout=out)
+
+        self.assertRegex(out.getvalue(), r'lorcana: 1 rows in 1 batches, \d+ rows/s, \d+ statements, peak [\d.]+ MiB')
+        self.assertFalse(LorcanaCardData.objects.exists())
+
+    def test_benchmark_without_fixtures_fails(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_ingestion', fixtures_dir=self.fixtures_dir, stdout=io.StringIO())
+
+class ArchiveTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(INGESTION_ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def sync(self, cards, kind=FULL, write=None):
+        with RunArchive('lorcana', kind) as archive:
+            source = archive.record(StreamSource(io.BytesIO(json.dumps(cards).encode()), batch_size=1))
+            return run_pipeline(source, DatabaseSink(write or game_writer('lorcana')))
+
+    def test_rebuild_replays_latest_full_run_and_later_partial_runs(self):
+        self.sync([make_lorcana_card('Ariel - On Human Legs', 1)])
+        self.sync([make_lorcana_card('Belle - Bookworm', 2), make_lorcana_card('Cinderella - Ballroom Sensation', 3)])
+        self.sync([make_lorcana_card('Dumbo - Ninth Wonder', 4)], kind=PARTIAL)
+        LorcanaCardData.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('rebuild_catalog', 'lorcana', '--from-archive', stdout=out)
+
+        self.assertEqual(len(archive_runs('lorcana')), 2)
+        self.assertIn('from 2 archived runs', out.getvalue())
+        self.assertEqual(sorted(LorcanaCardData.objects.values_list('card_num', flat=True)), [2, 3, 4])
+
+    def test_rebuild_rewrites_unchanged_payloads_only_when_asked(self):
+        self.sync([make_lorcana_card('Ariel - On Human Legs', 1)])
+        # A row written by an older, buggy transform of the same payload
+        LorcanaCardData.objects.update(name='Ariel')
+
+        call_command('rebuild_catalog', 'lorcana', '--from-archive', stdout=io.StringIO())
+        self.assertEqual(LorcanaCardData.objects.get().name, 'Ariel')
+
+        out = io.StringIO()
+        call_command('rebuild_catalog', 'lorcana', '--from-archive', '--rewrite', stdout=out)
+        self.assertEqual(LorcanaCardData.objects.get().name, 'Ariel - On Human Legs')
+        self.assertIn('1 changed', out.getvalue())
+
+    def test_failed_run_is_not_replayable(self):
+        def write(records):
+            raise RuntimeError('transform bug')
+
+        with self.assertRaises(RuntimeError), self.assertLogs('api.ingestion.pipeline', 'ERROR'):
+            self.sync([make_lorcana_card('Ariel - On Human Legs', 1)], write=write)
+
+        self.assertEqual(archive_runs('lorcana'), [])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_catalog', 'lorcana', '--from-archive', stdout=io.StringIO())
@@ -0,0 +1,209 @@
+import datetime
+import io
+import tempfile
+from unittest.mock import MagicMock, patch
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from api.ingestion.archive import archive_runs
+from api.ingestion.checkpoints import start_checkpoint, advance_checkpoint
+from api.ingestion.pokemon import write_page, PokemonDimensions
+from api.ingestion.watermarks import load_watermarks, save_watermarks
+from api.models import PokemonCardData, PokemonCardSet, PokemonTcgplayer, PokemonAbility, PokemonAttack
+
+def make_card(card_id, set_id='base1', price=1.5, attack_name='Tackle'):
+    return {
+        'id': card_id,
+        'name': f'Card {card_id}',
+        'supertype': 'Pokémon',
+        'subtypes': ['Basic'],
+        'hp': '60',
+        'types': ['Colorless'],
+        'retreatCost': ['Colorless'],
+        'convertedRetreatCost': 1,
+        'number': card_id.split('-')[-1],
+        'artist': 'Test Artist',
+        'rarity': 'Common',
+        'nationalPokedexNumbers': [1],
+        'legalities': {'unlimited': 'Legal'},
+        'images': {'small': 'https://example.com/small.png'},
+        'set': {
+            'id': set_id,
+            'name': 'Base',
+            'series': 'Base',
+            'printedTotal': 102,
+            'total': 102,
+            'legalities': {'unlimited': 'Legal'},
+            'ptcgoCode': 'BS',
+            'releaseDate': '1999/01/09',
+            'updatedAt': '2022/10/10 15:12:00',
+            'images': {'symbol': 'https://example.com/symbol.png'},
+        },
+        'abilities': [{'name': 'Static', 'text': 'Paralyze', 'type': 'Ability'}],
+        'attacks': [{'name': attack_name, 'cost': ['Colorless'], 'convertedEnergyCost': 1, 'damage': '10', 'text': ''}],
+        'weaknesses': [{'type': 'Fighting', 'value': '×2'}],
+        'tcgplayer': {
+            'url': f'https://prices.pokemontcg.io/tcgplayer/{card_id}',
+            'updatedAt': '2024/01/01',
+            'prices': {'normal': {'market': price}},
+        },
+        'cardmarket': {
+            'url': f'https://prices.pokemontcg.io/cardmarket/{card_id}',
+            'updatedAt': '2024/01/01',
+            'prices': {'averageSellPrice': price},
+        },
+    }
+
+class PokemonWritePageTest(TestCase):
+
+    def test_write_page_creates_cards_and_relations(self):
+        stats = write_page([make_card('base1-1'), make_card('base1-2', attack_name='Scratch')])
+
+        self.assertEqual(stats.inserted, 2)
+        self.assertEqual(PokemonCardData.objects.count(), 2)
+        self.assertEqual(PokemonCardSet.objects.count(), 1)
+        self.assertEqual(PokemonAbility.objects.count(), 1)
+        card = PokemonCardData.objects.get(id='base1-2')
+        self.assertEqual([attack.name for attack in card.attacks.all()], ['Scratch'])
+        self.assertEqual(card.tcgplayer.prices, {'normal': {'market': 1.5}})
+        self.assertEqual(card.cardmarket.prices, {'averageSellPrice': 1.5})
+
+    def test_write_page_updates_existing_rows(self):
+        write_page([make_card('base1-1')])
+        write_page([make_card('base1-1', price=4.0, attack_name='Scratch')])
+
+        card = PokemonCardData.objects.get(id='base1-1')
+        self.assertEqual(PokemonTcgplayer.objects.count(), 1)
+        self.assertEqual(card.tcgplayer.prices, {'normal': {'market': 4.0}})
+        self.assertEqual([attack.name for attack in card.attacks.all()], ['Scratch'])
+        self.assertEqual(PokemonAttack.objects.count(), 2)
+
+    def test_write_page_skips_unchanged_cards(self):
+        write_page([make_card('base1-1'), make_card('base1-2')])
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = write_page([make_card('base1-1'), make_card('base1-2', price=2.0), make_card('base1-3')])
+
+        self.assertEqual((stats.inserted, stats.changed, stats.unchanged), (1, 1, 1))
+        card_upsert = next(query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "api_pokemoncarddata"'))
+        self.assertNotIn("'base1-1'", card_upsert)
+        self.assertEqual(PokemonCardData.objects.get(id='base1-2').cardmarket.prices, {'averageSellPrice': 2.0})
+
+    def test_write_page_query_count_is_independent_of_page_size(self):
+        write_page([make_card('base1-1')])
+        with CaptureQueriesContext(connection) as small_page:
+            write_page([make_card('base1-2')])
+        with CaptureQueriesContext(connection) as large_page:
+            write_page([make_card(f'base1-{number}') for number in range(3, 53)])
+
+        self.assertEqual(len(small_page), len(large_page))
+
+class UpdatePokemonCardsCommandTest(TestCase):
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(INGESTION_ARCHIVE_DIR=archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    @patch('api.management.commands.update_pokemon_cards.build_session')
+    def test_fetches_every_page_reported_by_total_count(self, mock_build_session):
+        cards = [make_card(f'base1-{number}') for number in range(1, 6)]
+
+        def get(url, params=None):
+            start = (params['page'] - 1) * params['pageSize']
+            response = MagicMock(status_code=200)
+            response.json.return_value = {'data': cards[start:start + params['pageSize']], 'totalCount': len(cards)}
+            return response
+
+        mock_build_session.return_value.get.side_effect = get
+        call_command('update_pokemon_cards', page_size=2, workers=2, rate=1000, stdout=io.StringIO())
+
+        self.assertEqual(PokemonCardData.objects.count(), 5)
+        self.assertEqual(len(archive_runs('pokemon')), 1)
+
+    @patch('api.management.commands.update_pokemon_cards.build_session')
+    def test_incremental_sync_only_fetches_changed_sets(self, mock_build_session):
+        save_watermarks('pokemon', {
+            'base1': timezone.make_aware(datetime.datetime(2022, 10, 10, 15, 12)),
+            'base2': timezone.make_aware(datetime.datetime(2020, 1, 1)),
+        })
+        sets = [
+            {'id': 'base1', 'updatedAt': '2022/10/10 15:12:00'},
+            {'id': 'base2', 'updatedAt': '2022/10/10 15:12:00'},
+        ]
+        queries = []
+
+        def get(url, params=None):
+            response = MagicMock(status_code=200)
+            if url.endswith('/sets'):
+                response.json.return_value = {'data': sets, 'totalCount': len(sets)}
+            else:
+                queries.append(params['q'])
+                response.json.return_value = {'data': [make_card('base2-1', set_id='base2')], 'totalCount': 1}
+            return response
+
+        mock_build_session.return_value.get.side_effect = get
+        call_command('update_pokemon_cards', incremental=True, rate=1000, stdout=io.StringIO())
+
+        self.assertEqual(queries, ['set.id:base2'])
+        self.assertEqual(list(PokemonCardData.objects.values_list('id', flat=True)), ['base2-1'])
+        self.assertEqual(
+            load_watermarks('pokemon')['base2'],
+            timezone.make_aware(datetime.datetime(2022, 10, 10, 15, 12)),
+        )
+
+    @patch('api.management.commands.update_pokemon_cards.build_session')
+    def test_resume_skips_committed_pages(self, mock_build_session):
+        cards = [make_card(f'base1-{number}') for number in range(1, 7)]
+        checkpoint = start_checkpoint('pokemon', {'page_size': 2})
+        advance_checkpoint(checkpoint, pages=[1, 3])
+        requested = []
+
+        def get(url, params=None):
+            requested.append(params['page'])
+            start = (params['page'] - 1) * params['pageSize']
+            response = MagicMock(status_code=200)
+            response.json.return_value = {'data': cards[start:start + params['pageSize']], 'totalCount': len(cards)}
+            return response
+
+        mock_build_session.return_value.get.side_effect = get
+        call_command('update_pokemon_cards', page_size=2, rate=1000, resume=True, stdout=io.StringIO())
+
+        self.assertEqual(sorted(requested), [1, 2])
+        self.assertEqual(sorted(PokemonCardData.objects.values_list('id', flat=True)), ['base1-3', 'base1-4'])
+        checkpoint.refresh_from_db()
+        self.assertEqual(checkpoint.cursor['pages'], [1, 2, 3])
+        self.assertIsNotNone(checkpoint.completed_at)
+
+class PokemonDimensionsTest(TestCase):
+
+    def test_attacks_are_interned_by_content_not_name(self):
+        dimensions = PokemonDimensions()
+        first = make_card('base1-1')
+        second = make_card('base1-2')
+        second['attacks'][0]['damage'] = '30'
+        third = make_card('base1-3')
+
+        write_page([first, second], dimensions)
+        with CaptureQueriesContext(connection) as queries:
+            write_page([third], dimensions)
+
+        self.assertEqual(PokemonAttack.objects.filter(name='Tackle').count(), 2)
+        self.assertEqual(
+            PokemonCardData.objects.get(id='base1-3').attacks.get().id,
+            PokemonCardData.objects.get(id='base1-1').attacks.get().id,
+        )
+        self.assertFalse(any('"api_pokemonattack"' in query['sql'] and 'SELECT' in query['sql'] for query in queries))
+
+    def test_cache_loads_existing_rows(self):
+        write_page([make_card('base1-1')])
+
+        dimensions = PokemonDimensions()
+
+        self.assertEqual(len(dimensions.abilities.ids), 1)
+        self.assertEqual(len(dimensions.attacks.ids), 1)
+        self.assertEqual(len(dimensions.weaknesses.ids), 1)
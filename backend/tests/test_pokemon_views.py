@@ -130,6 +130,18 @@ class PokemonViewsTest(TestCase):
         self.assertEqual(len(response_data['data']), 1)
         self.assertEqual(response_data['data'][0]['name'], 'Test Pokemon')
 
+    def test_pokemon_cards_api_sorts_on_stored_combined_price(self):
+        PokemonCardData.objects.filter(id=self.pokemon_card.id).update(combined_average_price=Decimal('19.50'))
+        for card_id, price in (('test-pokemon-2', '25.00'), ('test-pokemon-3', '3.00')):
+            PokemonCardData.objects.create(
+                id=card_id, name='Test Pokemon', supertype='Pokémon', subtypes=[], level='', hp='', types=[],
+                retreatCost=[], convertedRetreatCost=0, number='2', artist='', rarity='Common', nationalPokedexNumbers=[],
+                legalities={}, images={}, set=self.card_set, combined_average_price=Decimal(price)
+            )
+
+        response = self.client.get(reverse('pokemon-cards-api'), {'search': 'Test', 'sort': 'price_desc'})
+        self.assertEqual([card['id'] for card in response.json()['data']], ['test-pokemon-2', 'test-pokemon-1', 'test-pokemon-3'])
+
     def test_pokemon_cards_api_pagination(self):
         url = reverse('pokemon-cards-api')
         response = self.client.get(url, {'page': 1, 'page_size': 1})
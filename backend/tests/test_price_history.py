@@ -0,0 +1,111 @@
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from api.ingestion import yugioh
+from api.ingestion.history import create_upcoming_partitions, ensure_partitions, known_partitions, partition_name, record_price_history
+from api.ingestion.mtg import write_chunk
+from api.ingestion.sources import Batch
+from api.models import YugiohCard
+from tests.test_mtg_ingestion import make_card as make_mtg_card
+from tests.test_yugioh_ingestion import make_card as make_yugioh_card
+
+def history(game, card_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT source, day, price FROM api_pricehistory WHERE game = %s AND card_id = %s ORDER BY source, day',
+            [game, card_id],
+        )
+        return cursor.fetchall()
+
+def record_yugioh(card_id, day, price):
+    card = YugiohCard(id=card_id, market_price=Decimal(price))
+    record_price_history('yugioh', [card], [make_yugioh_card(card_id, price=price)], day=day)
+
+class PriceHistoryTest(TestCase):
+
+    def test_writers_append_the_prices_of_written_cards(self):
+        card = make_mtg_card('a', prices={'usd': '1.25', 'usd_foil': None, 'eur': '0.90'})
+        write_chunk([card])
+
+        sources = {source: price for source, _, price in history('mtg', 'a')}
+        self.assertEqual(sources, {'market': Decimal('1.25'), 'usd': Decimal('1.25'), 'eur': Decimal('0.90')})
+
+        # An unchanged card is skipped by the writer and adds no history
+        write_chunk([card])
+        self.assertEqual(len(history('mtg', 'a')), 3)
+
+    def test_copy_loads_write_history_with_the_merge(self):
+        batches = [Batch([make_yugioh_card(1), make_yugioh_card(2)], {})]
+        with patch('api.ingestion.copy.StagingTable.replace_children', side_effect=DatabaseError('merge failed')), \
+                self.assertRaises(DatabaseError):
+            yugioh.copy_load(batches)
+
+        # Nothing was stored, so nothing is in the history
+        self.assertEqual(history('yugioh', '1'), [])
+
+        yugioh.copy_load(batches)
+        self.assertEqual({source for source, _, _ in history('yugioh', '1')}, {'market', 'cardmarket', 'ebay', 'amazon', 'tcgplayer', 'coolstuffinc'})
+
+    def test_rows_are_routed_to_monthly_partitions(self):
+        record_yugioh(1, date(2026, 1, 31), '1.00')
+        record_yugioh(1, date(2026, 2, 1), '2.00')
+        record_yugioh(1, date(2026, 2, 1), '2.50')
+
+        with connection.cursor() as cursor:
+            for month, expected in ((date(2026, 1, 1), Decimal('1.00')), (date(2026, 2, 1), Decimal('2.50'))):
+                cursor.execute(f"SELECT price FROM {partition_name(month)} WHERE card_id = '1' AND source = 'market'")
+                self.assertEqual(cursor.fetchall(), [(expected,)])
+
+    def test_existing_partitions_are_written_without_the_partition_lock(self):
+        self.addCleanup(known_partitions.clear)
+        # The migration and the monthly task create the coming months' partitions
+        months = create_upcoming_partitions()
+        self.assertEqual(months[0], timezone.localdate().replace(day=1))
+
+        with CaptureQueriesContext(connection) as queries, connection.cursor() as cursor, \
+                self.captureOnCommitCallbacks(execute=True):
+            ensure_partitions(cursor, [timezone.localdate()])
+        self.assertFalse(any('pg_advisory_xact_lock' in query['sql'] for query in queries))
+
+        # Once committed, a known partition isn't looked up again
+        with CaptureQueriesContext(connection) as queries, connection.cursor() as cursor:
+            ensure_partitions(cursor, [timezone.localdate()])
+        self.assertEqual(len(queries), 0)
+
+    def test_endpoint_serves_downsampled_series(self):
+        record_yugioh(7, date(2025, 12, 20), '0.50')
+        for day, price in ((3, '3.00'), (4, '1.00'), (9, '4.00')):
+            record_yugioh(7, date(2026, 1, day), price)
+
+        response = APIClient().get(
+            reverse('price-history', args=['yugioh', '7']),
+            {'start': '2026-01-01', 'end': '2026-01-10', 'points': 5, 'source': 'market'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['interval_days'], 2)
+        self.assertEqual(list(response.data['series']), ['market'])
+        self.assertEqual(
+            [(point['date'], point['price'], point['low'], point['high']) for point in response.data['series']['market']],
+            [
+                # The price recorded before the range opens the series
+                (date(2026, 1, 1), '0.50', '0.50', '0.50'),
+                (date(2026, 1, 3), '2.00', '1.00', '3.00'),
+                (date(2026, 1, 9), '4.00', '4.00', '4.00'),
+            ],
+        )
+
+    def test_endpoint_rejects_unknown_games_and_bad_ranges(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('price-history', args=['lorcana', '1'])).status_code, 404)
+        self.assertEqual(client.get(reverse('price-history', args=['mtg', 'a']), {'start': 'soon'}).status_code, 400)
+        self.assertEqual(
+            client.get(reverse('price-history', args=['mtg', 'a']), {'start': '2026-02-01', 'end': '2026-01-01'}).status_code,
+            400,
+        )
@@ -0,0 +1,55 @@
+import random
+from decimal import Decimal
+from django.test import SimpleTestCase
+from api.ingestion.prices import (
+    average_prices, calculate_average_price, combined_average_price, exact_average_price, market_prices, with_market_prices
+)
+from api.models import YugiohCard
+
+class AveragePricesTest(SimpleTestCase):
+
+    def test_matches_per_card_average(self):
+        generator = random.Random(7)
+        price_lists = [
+            [Decimal(generator.randint(0, 5000)) / 100 for _ in range(generator.randint(0, 9))]
+            for _ in range(500)
+        ]
+        # Outliers, ties and the short lists that exercise the quartile edge cases
+        price_lists += [[Decimal('1.00'), Decimal('1.00'), Decimal('90.00')], [Decimal('2.5')], [Decimal('1.1'), Decimal('3.25')], [0, None, ''], []]
+
+        self.assertEqual(average_prices(price_lists), [calculate_average_price(prices) for prices in price_lists])
+
+    def test_prices_finer_than_a_cent_fall_back_to_exact_decimals(self):
+        price_lists = [
+            ['0.10', 0.2, 3], ['1.005', '2'], ['0.3300000000001', '1'], ['12345678901234567.89', '1'],
+            [Decimal('0.125'), Decimal('4')], ['not a price', '2.50'], ['0.00', '2.50'],
+        ]
+
+        self.assertEqual(average_prices(price_lists), [exact_average_price(prices) for prices in price_lists])
+        self.assertEqual(average_prices([['1.005', '2', '3.5']]), [Decimal('2.168333333333333333333333333')])
+
+    def test_market_prices_are_rounded_per_game(self):
+        cards = [
+            {'card_prices': [{'cardmarket_price': '1.50', 'tcgplayer_price': '2.00', 'ebay_price': '3.00', 'amazon_price': '4.00', 'coolstuffinc_price': '5.00'}]},
+            {'card_prices': [{'cardmarket_price': '0.333'}]},
+            {'card_prices': []},
+        ]
+
+        self.assertEqual(market_prices('yugioh', cards), [Decimal('3.10'), Decimal('0.33'), Decimal('0.00')])
+
+    def test_market_prices_too_large_for_the_column_are_dropped(self):
+        cards = [{'card_prices': [{'cardmarket_price': '123456789.99'}]}, {'card_prices': [{'cardmarket_price': '99999999.99'}]}]
+
+        self.assertEqual(market_prices('yugioh', cards), [None, Decimal('99999999.99')])
+        # The column isn't nullable, so the card is stored as unpriced
+        self.assertEqual(with_market_prices('yugioh', [YugiohCard()], cards[:1])[0].market_price, Decimal('0.00'))
+
+    def test_combined_average_price_adds_tcgplayer_market_and_cardmarket_trend(self):
+        card = {
+            'tcgplayer': {'prices': {'normal': {'market': 1.25}, 'holofoil': {'market': '4.10'}}},
+            'cardmarket': {'prices': {'trendPrice': 2.5, 'reverseHoloTrend': None, 'averageSellPrice': 9}},
+        }
+
+        self.assertEqual(combined_average_price(card), Decimal('6.60'))
+        self.assertEqual(combined_average_price({'tcgplayer': {'prices': {'normal': {'market': 1.25}}}}), Decimal('1.25'))
+        self.assertEqual(combined_average_price({}), Decimal('0.00'))
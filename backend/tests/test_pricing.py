@@ -0,0 +1,80 @@
+from decimal import Decimal
+from django.test import TestCase
+from api.ingestion import yugioh
+from api.models import CardList, ListCard, PriceChange, YugiohCard
+from api.pricing import apply_price_changes, list_values, memoized_prices, price_many
+from api.serializers import ListCardSerializer
+from api.tasks import bulk_update_market_values
+from tests.test_yugioh_ingestion import make_card as make_yugioh_card
+
+def make_card(card_id, price):
+    return YugiohCard.objects.create(
+        id=card_id, name=f'Card {card_id}', card_type='Monster', frame_type='normal', description='',
+        attack=0, defense=0, level=1, race='Dragon', attribute='DARK', market_price=Decimal(price)
+    )
+
+class PricingTest(TestCase):
+
+    def setUp(self):
+        self.cheap = make_card(1, '1.50')
+        self.dear = make_card(2, '10.00')
+
+    def test_price_many_prices_instances_and_keys_in_order(self):
+        with self.assertNumQueries(1):
+            prices = price_many([('yugioh', self.cheap), ('yugioh', 2), ('yugioh', '2'), ('yugioh', 99), ('chess', 1), (None, None)])
+
+        self.assertEqual(prices, [Decimal('1.50'), Decimal('10.00'), Decimal('10.00'), Decimal('0.00'), Decimal('0.00'), Decimal('0.00')])
+
+    def test_memoized_scope_loads_each_card_once(self):
+        with memoized_prices():
+            price_many([('yugioh', 1), ('yugioh', 2)])
+            with self.assertNumQueries(0):
+                self.assertEqual(price_many([('yugioh', 2), ('yugioh', 1)]), [Decimal('10.00'), Decimal('1.50')])
+
+        # Outside a scope nothing is remembered
+        with self.assertNumQueries(1):
+            price_many([('yugioh', 1)])
+
+    def test_list_values_and_revaluation_task(self):
+        card_list = CardList.objects.create(created_by='tester', name='Deck', type='Yugioh', needs_update=True)
+        for card, collected in ((self.cheap, True), (self.dear, False), (self.dear, True)):
+            ListCard.objects.create(card_list=card_list, yugioh_card=card, collected=collected)
+
+        self.assertEqual(list_values(card_list.list_cards.all()), (Decimal('21.50'), Decimal('11.50')))
+
+        bulk_update_market_values()
+        card_list.refresh_from_db()
+        self.assertEqual((card_list.market_value, card_list.collection_value), (Decimal('21.50'), Decimal('11.50')))
+        self.assertFalse(card_list.needs_update)
+
+    def test_list_cards_store_the_price_of_their_card(self):
+        card_list = CardList.objects.create(created_by='tester', name='Deck', type='Yugioh')
+        list_card = ListCard.objects.create(card_list=card_list, yugioh_card=self.dear)
+
+        self.assertEqual(list_card.market_value, Decimal('10.00'))
+        self.assertEqual(ListCardSerializer(list_card).data['market_value'], '10.00')
+
+    def test_price_changes_move_only_the_lists_holding_the_cards(self):
+        yugioh.write_chunk([make_yugioh_card(11), make_yugioh_card(13)])
+        self.assertEqual(YugiohCard.objects.get(id=11).market_price, Decimal('3.10'))
+        deck = CardList.objects.create(created_by='tester', name='Deck', type='Yugioh', market_value=Decimal('6.20'), collection_value=Decimal('3.10'))
+        ListCard.objects.create(card_list=deck, yugioh_card_id=11, collected=True)
+        ListCard.objects.create(card_list=deck, yugioh_card_id=11, collected=False)
+        other = CardList.objects.create(created_by='tester', name='Other', type='Yugioh', market_value=Decimal('7.00'))
+        ListCard.objects.create(card_list=other, yugioh_card=self.dear)
+
+        # Card 11 moves twice, through both write paths; each write moves the deck as it commits,
+        # so the deck always matches a recompute from the current prices
+        for write, card_data, values in (
+            (yugioh.write_chunk, make_yugioh_card(11, name='Dark Magician (new art)', price='4.00'), (Decimal('7.20'), Decimal('3.60'))),
+            (yugioh.refresh_prices, make_yugioh_card(11, price='2.00'), (Decimal('6.40'), Decimal('3.20'))),
+        ):
+            write([card_data])
+            deck.refresh_from_db()
+            self.assertEqual((deck.market_value, deck.collection_value), values)
+            self.assertEqual(list_values(deck.list_cards.all()), values)
+
+        other.refresh_from_db()
+        self.assertEqual((other.market_value, other.collection_value), (Decimal('7.00'), Decimal('0.00')))
+        self.assertFalse(PriceChange.objects.exists())
+        self.assertEqual(apply_price_changes(), 0)
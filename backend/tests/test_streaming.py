@@ -0,0 +1,30 @@
+import io
+import json
+from django.test import SimpleTestCase
+from api.ingestion.streaming import iter_json_array, chunked
+
+class IterJsonArrayTest(SimpleTestCase):
+
+    def test_reads_items_under_key_across_chunk_boundaries(self):
+        items = [{'id': number, 'name': f'Card é {number}', 'price': number * 1.25} for number in range(50)]
+        payload = json.dumps({'meta': {'total': 50}, 'data': items, 'after': [1, 2]}).encode('utf-8')
+
+        result = list(iter_json_array(io.BytesIO(payload), key='data', read_size=7))
+
+        self.assertEqual(result, items)
+
+    def test_reads_top_level_array(self):
+        payload = io.StringIO('[ 1, 22 , {"a": [3]}, "x" ]')
+
+        self.assertEqual(list(iter_json_array(payload, read_size=2)), [1, 22, {'a': [3]}, 'x'])
+
+    def test_missing_key_and_empty_array_yield_nothing(self):
+        self.assertEqual(list(iter_json_array(io.StringIO('{"other": []}'), key='data')), [])
+        self.assertEqual(list(iter_json_array(io.StringIO('{"data": []}'), key='data')), [])
+
+    def test_truncated_stream_raises(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"data": [{"id": 1}, {"id"'), key='data'))
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
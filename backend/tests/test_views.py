@@ -127,6 +127,19 @@ class ViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['card_list']['name'], self.card_list.name)
 
+    def test_list_values_use_stored_market_price(self):
+        PokemonCardData.objects.filter(id=self.pokemon_card.id).update(market_price=Decimal("2.50"))
+
+        response = self.client.get(reverse('get-list-by-id', kwargs={'list_id': self.card_list.id}))
+
+        self.assertEqual(response.data['card_list']['market_value'], '5.00')
+        self.assertEqual(response.data['card_list']['collection_value'], '2.50')
+
+        data = {'list_id': self.card_list.id, 'card_id': self.pokemon_card.id, 'card_type': 'pokemon'}
+        self.client.post(reverse('add-card-to-list'), data=json.dumps(data), content_type='application/json')
+
+        self.assertEqual(CardList.objects.get(id=self.card_list.id).market_value, Decimal("7.50"))
+
     def test_set_card_quantity(self):
         url = reverse('set-card-quantity')
         data = {
@@ -0,0 +1,98 @@
+import io
+import json
+import tempfile
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase
+from api.models import YugiohCard, CardSet, CardImage, CardPrice
+
+def make_card(card_id, name='Dark Magician', price='1.50'):
+    return {
+        'id': card_id,
+        'name': name,
+        'type': 'Normal Monster',
+        'frameType': 'normal',
+        'desc': 'The ultimate wizard.',
+        'atk': 2500,
+        'def': 2100,
+        'level': 7,
+        'race': 'Spellcaster',
+        'attribute': 'DARK',
+        'card_sets': [{'set_name': 'Legend of Blue Eyes', 'set_code': 'LOB-005', 'set_rarity': 'Ultra Rare', 'set_rarity_code': '(UR)', 'set_price': '10.00'}],
+        'card_images': [{'image_url': 'https://example.com/a.jpg', 'image_url_small': 'https://example.com/b.jpg', 'image_url_cropped': 'https://example.com/c.jpg'}],
+        'card_prices': [{'cardmarket_price': price, 'tcgplayer_price': '2.00', 'ebay_price': '3.00', 'amazon_price': '4.00', 'coolstuffinc_price': '5.00'}],
+    }
+
+class YugiohCommandTest(TestCase):
+
+    def run_command(self, cards, chunk_size=2, **options):
+        out = io.StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as dump:
+            json.dump({'data': cards}, dump)
+            dump.flush()
+            call_command('command', file=dump.name, chunk_size=chunk_size, stdout=out, **options)
+        return out.getvalue()
+
+    def test_streams_file_in_chunks(self):
+        self.run_command([make_card(card_id) for card_id in range(1, 6)])
+
+        self.assertEqual(YugiohCard.objects.count(), 5)
+        self.assertEqual(CardSet.objects.count(), 5)
+        self.assertEqual(CardImage.objects.count(), 5)
+        self.assertEqual(CardPrice.objects.count(), 5)
+        self.assertEqual(YugiohCard.objects.get(id=1).frame_type, 'normal')
+
+    def test_rerun_updates_cards_without_duplicating_children(self):
+        self.run_command([make_card(1)])
+        self.run_command([make_card(1, name='Dark Magician (Arkana)'), make_card(2)])
+
+        self.assertEqual(YugiohCard.objects.get(id=1).name, 'Dark Magician (Arkana)')
+        self.assertEqual(CardSet.objects.filter(yugioh_card_id=1).count(), 1)
+        self.assertEqual(CardPrice.objects.count(), 2)
+
+    def test_changed_card_replaces_children_and_unchanged_card_is_skipped(self):
+        self.run_command([make_card(1), make_card(2)])
+        first_price_id = CardPrice.objects.get(yugioh_card_id=1).id
+
+        self.run_command([make_card(1), make_card(2, price='9.99')])
+
+        self.assertEqual(CardPrice.objects.get(yugioh_card_id=1).id, first_price_id)
+        self.assertEqual(CardPrice.objects.get(yugioh_card_id=2).cardmarket_price, Decimal('9.99'))
+        self.assertEqual(CardPrice.objects.count(), 2)
+
+    def test_prices_only_refreshes_prices_of_existing_cards(self):
+        self.run_command([make_card(1), make_card(2)])
+        price_ids = set(CardPrice.objects.values_list('id', flat=True))
+        image_ids = set(CardImage.objects.values_list('id', flat=True))
+        updated = make_card(1, name='Renamed', price='7.25')
+        updated['card_sets'][0]['set_price'] = '12.00'
+
+        output = self.run_command([updated, make_card(2), make_card(3)], prices_only=True)
+
+        self.assertIn('0 inserted, 1 changed, 1 unchanged, 1 skipped', output)
+        self.assertEqual(CardPrice.objects.get(yugioh_card_id=1).cardmarket_price, Decimal('7.25'))
+        self.assertEqual(CardSet.objects.get(yugioh_card_id=1).set_price, '12.00')
+        self.assertEqual(YugiohCard.objects.get(id=1).name, 'Dark Magician')
+        self.assertFalse(YugiohCard.objects.filter(id=3).exists())
+        self.assertEqual(set(CardPrice.objects.values_list('id', flat=True)), price_ids)
+        self.assertEqual(set(CardImage.objects.values_list('id', flat=True)), image_ids)
+
+    def test_prices_only_adds_missing_price_row(self):
+        card = make_card(1)
+        card['card_prices'] = []
+        self.run_command([card])
+
+        self.run_command([make_card(1)], prices_only=True)
+
+        self.assertEqual(CardPrice.objects.get(yugioh_card_id=1).tcgplayer_price, Decimal('2.00'))
+
+    def test_market_price_is_stored_and_refreshed_by_prices_only_runs(self):
+        self.run_command([make_card(1)])
+        card = YugiohCard.objects.get(id=1)
+        self.assertEqual(card.market_price, Decimal('3.10'))
+        self.assertIsNotNone(card.price_updated_at)
+
+        # 9.99 falls outside the interquartile range and is filtered out of the average
+        self.run_command([make_card(1, price='9.99')], prices_only=True)
+
+        self.assertEqual(YugiohCard.objects.get(id=1).market_price, Decimal('3.50'))
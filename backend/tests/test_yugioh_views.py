@@ -73,6 +73,24 @@ class YugiohViewsTest(TestCase):
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]['name'], 'Test Yugioh Card')
 
+    def test_fetch_yugioh_cards_sorts_and_filters_prices_numerically(self):
+        for card_id, price in ((2, '9.90'), (3, '10.50')):
+            YugiohCard.objects.create(
+                id=card_id, name=f'Priced {card_id}', card_type='Monster', frame_type='Effect', description='',
+                attack=0, defense=0, level=1, race='Dragon', attribute='Dark', market_price=Decimal(price)
+            )
+
+        response = self.client.get('/api/fetch-yugioh-cards/', {'search': 'Priced', 'sort': 'price_desc'})
+        self.assertEqual([card['id'] for card in response.json()['data']], [3, 2])
+
+        response = self.client.get('/api/fetch-yugioh-cards/', {'min_price': '9.95', 'max_price': '20'})
+        self.assertEqual([card['id'] for card in response.json()['data']], [3])
+        self.assertEqual(self.client.get('/api/fetch-yugioh-cards/', {'min_price': 'cheap'}).status_code, 400)
+
+        # Prices come back as the stored decimals
+        response = self.client.get('/api/fetch-yugioh-cards/', {'search': 'Test'})
+        self.assertEqual(response.json()['data'][0]['card_prices'][0]['cardmarket_price'], '10.00')
+
     def test_fetch_yugioh_cards_pagination(self):
         url = '/api/fetch-yugioh-cards/?page=1&page_size=1'
         response = self.client.get(url)